@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Benchmark attribute access through lazily imported modules once they have loaded.
+
+Copies of zazu/util.py are imported eagerly and through zazu.imports.lazy_import(), then scantree() and module
+attribute lookups are timed on each, a loaded lazy module should be as fast as an eagerly imported one.
+
+Usage: python benchmarks/bench_imports.py [--files N] [--repeat N]
+"""
+import click
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import zazu.imports
+import zazu.util
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+INCLUDES = ('*.py', '*.cpp', '*.h')
+EXCLUDES = ('build', 'dependencies')
+EXTENSIONS = ['.py', '.cpp', '.h', '.txt', '.md']
+
+
+def make_tree(root, file_count):
+    """Make a directory tree with file_count files."""
+    for i in range(file_count):
+        path = os.path.join(root, 'd{}'.format(i % 37), 'e{}'.format(i % 11),
+                            'file{}{}'.format(i, EXTENSIONS[i % len(EXTENSIONS)]))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('x\n')
+
+
+def copy_module(module_dir, name):
+    """Copy zazu/util.py to a module called name."""
+    shutil.copy(zazu.util.__file__, os.path.join(module_dir, name + '.py'))
+
+
+@click.command()
+@click.option('--files', default=20000, help='number of files to scan')
+@click.option('--repeat', default=5, help='number of timing repetitions')
+def main(files, repeat):
+    """Time scantree() and attribute access on eagerly and lazily imported modules."""
+    root = tempfile.mkdtemp()
+    module_dir = os.path.join(root, 'modules')
+    tree_dir = os.path.join(root, 'tree')
+    try:
+        os.mkdir(module_dir)
+        make_tree(tree_dir, files)
+        copy_module(module_dir, 'bench_eager_util')
+        copy_module(module_dir, 'bench_lazy_util')
+        sys.path.insert(0, module_dir)
+        modules = {'eager': importlib.import_module('bench_eager_util')}
+        scope = {}
+        zazu.imports.lazy_import(scope, ['bench_lazy_util'])
+        modules['lazy'] = scope['bench_lazy_util']
+        modules['lazy'].scantree  # Load it.
+        for name, module in sorted(modules.items()):
+            scan = lambda: module.scantree(tree_dir, INCLUDES, EXCLUDES, exclude_hidden=True)  # NOQA
+            lookup = lambda: module.scantree  # NOQA
+            scan_best = min(timeit.repeat(scan, number=1, repeat=repeat))
+            lookup_best = min(timeit.repeat(lookup, number=100000, repeat=repeat)) / 100000
+            click.echo('{:6} scantree {:8.3f}s  attribute lookup {:6.1f}ns  ({})'.format(
+                name, scan_best, lookup_best * 1e9, type(module).__name__))
+    finally:
+        sys.path.remove(module_dir)
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Benchmark scantree() with the compiled PathMatcher against the original per-pattern fnmatch implementation.
+
+Usage: python benchmarks/bench_matcher.py [--files N]
+"""
+import click
+import fnmatch
+import os
+import shutil
+import tempfile
+import timeit
+import zazu.util
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+INCLUDES = ('src/**.cpp', 'src/**.h', 'tools/**.py', '*.proto')
+EXCLUDES = ('**/generated/**', 'third_party', '*_pb2.py')
+EXTENSIONS = ['.cpp', '.h', '.py', '.proto', '.txt']
+
+
+def legacy_scantree(base_path, include_patterns, exclude_patterns, exclude_hidden=False):
+    """The original scantree() implementation, for comparison."""
+    files = []
+    exclude_dirs = set([os.path.normpath(e) for e in exclude_patterns])
+    for dirName, subdirList, fileList in os.walk(base_path):
+        for i in range(len(subdirList) - 1, -1, -1):
+            sub = os.path.relpath(os.path.join(dirName, subdirList[i]), base_path)
+            if sub in exclude_dirs or (exclude_hidden and sub[0] == '.'):
+                del subdirList[i]
+        for f in fileList:
+            if (not exclude_hidden) or (f[0] != '.'):
+                file = os.path.relpath(os.path.join(dirName, f), base_path)
+                if any(fnmatch.fnmatch(file, i) for i in include_patterns):
+                    if all(not fnmatch.fnmatch(file, e) for e in exclude_patterns):
+                        files.append(file)
+    return files
+
+
+def make_tree(root, file_count):
+    """Make a tree of file_count files, a third of which are in generated directories and a tenth in docs."""
+    for i in range(file_count):
+        if i % 3 == 0:
+            top = os.path.join('src', 'm{}'.format(i % 53), 'generated', 'g{}'.format(i % 7))
+        elif i % 10 == 1:
+            top = os.path.join('docs', 'd{}'.format(i % 13))
+        else:
+            top = os.path.join('src', 'm{}'.format(i % 53), 's{}'.format(i % 17))
+        path = os.path.join(root, top, 'file{}{}'.format(i, EXTENSIONS[i % len(EXTENSIONS)]))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w'):
+            pass
+
+
+@click.command()
+@click.option('--files', default=100000, help='number of files in the tree')
+@click.option('--repeat', default=3, help='number of timing repetitions')
+def main(files, repeat):
+    """Time both scantree implementations on a synthetic tree."""
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root, files)
+        legacy = lambda: legacy_scantree(root, INCLUDES, EXCLUDES, exclude_hidden=True)  # NOQA
+        compiled = lambda: zazu.util.scantree(root, INCLUDES, EXCLUDES, exclude_hidden=True)  # NOQA
+        assert sorted(legacy()) == sorted(compiled())
+        for name, fn in [('fnmatch', legacy), ('compiled', compiled)]:
+            best = min(timeit.repeat(fn, number=1, repeat=repeat))
+            click.echo('{:9} {:8.3f}s ({} files found)'.format(name, best, len(fn())))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Benchmark file discovery: os.walk based scantree() vs. git index listing + filter_paths().
+
+Usage: python benchmarks/bench_scantree.py [--files N] [--ignored N]
+"""
+import click
+import git
+import os
+import shutil
+import tempfile
+import timeit
+import zazu.git_helper
+import zazu.util
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+INCLUDES = ('*.py', '*.cpp', '*.h')
+EXCLUDES = ('build', 'dependencies')
+EXTENSIONS = ['.py', '.cpp', '.h', '.txt', '.md']
+
+
+def make_tree(root, file_count, ignored_count):
+    """Make a git repo with file_count tracked files and ignored_count files under an ignored node_modules dir."""
+    repo = git.Repo.init(root)
+    for i in range(file_count):
+        path = os.path.join(root, 'src', 'd{}'.format(i % 37), 'e{}'.format(i % 11),
+                            'file{}{}'.format(i, EXTENSIONS[i % len(EXTENSIONS)]))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('x\n')
+    for i in range(ignored_count):
+        path = os.path.join(root, 'node_modules', 'pkg{}'.format(i % 97), 'file{}.h'.format(i))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('x\n')
+    with open(os.path.join(root, '.gitignore'), 'w') as f:
+        f.write('node_modules/\n')
+    repo.git.add('-A')
+    return repo
+
+
+@click.command()
+@click.option('--files', default=20000, help='number of tracked files')
+@click.option('--ignored', default=20000, help='number of git ignored files')
+@click.option('--repeat', default=5, help='number of timing repetitions')
+def main(files, ignored, repeat):
+    """Time each discovery mode on a synthetic tree."""
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root, files, ignored)
+        walk = lambda: zazu.util.scantree(root, INCLUDES, EXCLUDES, exclude_hidden=True)  # NOQA
+        index = lambda: zazu.util.filter_paths(zazu.git_helper.ls_files(root), INCLUDES, EXCLUDES, exclude_hidden=True)  # NOQA
+        index_all = lambda: zazu.util.filter_paths(zazu.git_helper.ls_files(root, untracked=True),  # NOQA
+                                                   INCLUDES, EXCLUDES, exclude_hidden=True)
+        assert sorted(index()) == sorted(f for f in walk() if not f.startswith('node_modules'))
+        for name, fn in [('walk', walk), ('git', index), ('git-all', index_all)]:
+            best = min(timeit.repeat(fn, number=1, repeat=repeat))
+            click.echo('{:8} {:8.3f}s ({} files found)'.format(name, best, len(fn())))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
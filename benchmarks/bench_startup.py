@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of zazu start up latency, which git hooks and shell completion pay on every invocation.
+
+Each case runs zazu in a fresh python process (with the daemon disabled) in a small repo, so the timings include
+interpreter start up, imports and config parsing.
+
+Usage: python benchmarks/bench_startup.py [--repeat N] [--json PATH]
+"""
+import click
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+STYLE_CONFIG = """style:
+  - stylers:
+      - type: autopep8
+      - type: clang-format
+"""
+
+# Each case is a list of zazu arguments and the environment variables that click's shell completion uses, if any.
+CASES = [
+    ('python', None, {}),
+    ('zazu --help', ['--help'], {}),
+    ('zazu style --cached (nothing staged)', ['style', '--cached'], {}),
+    ('complete commands', [], {'_ZAZU_COMPLETE': 'complete', 'COMP_WORDS': 'zazu s', 'COMP_CWORD': '1'}),
+    ('complete config param', [], {'_ZAZU_COMPLETE': 'complete', 'COMP_WORDS': 'zazu config ', 'COMP_CWORD': '2'}),
+    ('complete dev checkout', [], {'_ZAZU_COMPLETE': 'complete', 'COMP_WORDS': 'zazu dev checkout ',
+                                   'COMP_CWORD': '3'}),
+]
+
+
+def make_repo(root):
+    """Make a small git repo with a style config."""
+    subprocess.check_call(['git', 'init', '-q', root])
+    with open(os.path.join(root, 'zazu.yaml'), 'w') as f:
+        f.write(STYLE_CONFIG)
+    # Config files that have just been modified aren't cached, date it like one that has been around for a while.
+    mtime = time.time() - 60
+    os.utime(os.path.join(root, 'zazu.yaml'), (mtime, mtime))
+    with open(os.path.join(root, 'main.py'), 'w') as f:
+        f.write('x = 1\n')
+    subprocess.check_call(['git', 'add', '-A'], cwd=root)
+    subprocess.check_call(['git', '-c', 'user.name=zazu', '-c', 'user.email=zazu@example.com', 'commit', '-q', '-m',
+                           'initial'], cwd=root)
+
+
+def run_case(root, args, env):
+    """Run zazu (or just python when args is None) in a new process and return the elapsed time.
+
+    Raises:
+        click.ClickException: if the process failed, so that a crash isn't timed as a fast run.
+
+    """
+    code = 'pass' if args is None else 'import sys, zazu.cli; sys.argv[0] = "zazu"; zazu.cli.main()'
+    process_env = dict(os.environ, ZAZU_NO_DAEMON='1', **env)
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', code] + ([] if args is None else args), cwd=root, env=process_env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    # Click exits with 1 after printing shell completions, so those runs must not print errors either.
+    ok_return_codes = [0, 1] if env else [0]
+    if process.returncode not in ok_return_codes or process.stderr:
+        command = 'python' if args is None else ' '.join(['zazu'] + args)
+        if env:
+            command += ' ({})'.format(' '.join('{}={}'.format(k, v) for k, v in sorted(env.items())))
+        raise click.ClickException('"{}" failed with exit code {}:\n{}'.format(command, process.returncode,
+                                                                              process.stderr.rstrip()))
+    return elapsed
+
+
+@click.command()
+@click.option('--repeat', default=10, show_default=True, help='number of timing repetitions')
+@click.option('--json', 'json_path', type=click.Path(dir_okay=False, writable=True),
+              help='also write the results to a json file')
+def main(repeat, json_path):
+    """Time zazu start up for common short lived invocations."""
+    root = tempfile.mkdtemp()
+    results = {}
+    try:
+        make_repo(root)
+        for name, args, env in CASES:
+            run_case(root, args, env)  # Warm up the file system cache and byte code.
+            times = sorted(run_case(root, args, env) for _ in range(repeat))
+            results[name] = {'best': times[0], 'median': times[len(times) // 2]}
+            click.echo('{:40} best {:6.3f}s  median {:6.3f}s'.format(name, times[0], times[len(times) // 2]))
+    finally:
+        shutil.rmtree(root)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""End to end benchmark of zazu style on synthetic repositories.
+
+A stand-in styler that runs in process is used, so the timings show the overhead of zazu itself (file discovery,
+dispatch, reading, caching and writing back) rather than the speed of any formatter.
+
+Usage: python benchmarks/bench_style.py [--sizes 1000,10000,100000] [--repeat N] [--jobs N] [--json PATH]
+"""
+import click
+import click.testing
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zazu.cli
+import zazu.util
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synthetic_repo  # NOQA
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+
+def run_style(args):
+    """Run zazu style in the current directory and return the elapsed time."""
+    runner = click.testing.CliRunner()
+    start = time.perf_counter()
+    result = runner.invoke(zazu.cli.cli, ['style'] + args)
+    elapsed = time.perf_counter() - start
+    if result.exception is not None and not isinstance(result.exception, SystemExit):
+        raise result.exception
+    return elapsed
+
+
+def best_of(repeat, fn):
+    """Get the fastest of repeat calls to fn, which returns its own elapsed time."""
+    return min(fn() for _ in range(repeat))
+
+
+def time_call(fn):
+    """Time a single call to fn."""
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_size(file_count, repeat, jobs):
+    """Run every benchmark on a synthetic repo with file_count files.
+
+    Returns:
+        dict of benchmark name to seconds.
+
+    """
+    root = tempfile.mkdtemp()
+    results = {}
+    try:
+        results['generate'] = time_call(lambda: synthetic_repo.make_repo(root, file_count))
+        jobs_args = [] if jobs is None else ['-j', str(jobs)]
+        with zazu.util.cd(root):
+            results['scantree'] = best_of(repeat, lambda: time_call(
+                lambda: zazu.util.scantree(root, ('*.py',), ('build', '**/generated/**'), exclude_hidden=True)))
+            work = [lambda: None] * file_count
+            results['dispatch'] = best_of(repeat, lambda: time_call(
+                lambda: list(zazu.util.dispatch(work, max_workers=jobs))))
+            results['check (no cache)'] = best_of(repeat, lambda: run_style(['--check', '--no-cache'] + jobs_args))
+            run_style(['--check'] + jobs_args)
+            results['check (warm cache)'] = best_of(repeat, lambda: run_style(['--check'] + jobs_args))
+            results['check --git'] = best_of(repeat, lambda: run_style(['--check', '--discover', 'git'] + jobs_args))
+            results['check --cached'] = best_of(repeat, lambda: run_style(['--check', '--cached', '--no-cache'] +
+                                                                          jobs_args))
+            # Fixing changes the repo so it is only timed once, the staged fix runs first so its input is unchanged.
+            results['fix --cached'] = run_style(['--cached', '--no-cache'] + jobs_args)
+            results['fix'] = run_style(['--no-cache'] + jobs_args)
+    finally:
+        shutil.rmtree(root)
+    return results
+
+
+@click.command()
+@click.option('--sizes', default='1000,10000,100000', show_default=True,
+              help='comma separated numbers of files in each synthetic repo')
+@click.option('--repeat', default=3, show_default=True, help='number of timing repetitions')
+@click.option('--jobs', type=int, help='number of style jobs, defaults to the number of CPUs')
+@click.option('--json', 'json_path', type=click.Path(dir_okay=False, writable=True),
+              help='also write the results to a json file')
+def main(sizes, repeat, jobs, json_path):
+    """Time zazu style on synthetic repos of each size."""
+    synthetic_repo.register_standin_styler()
+    all_results = {}
+    for size in [int(s) for s in sizes.split(',')]:
+        results = bench_size(size, repeat, jobs)
+        all_results[size] = results
+        click.echo('{} files:'.format(size))
+        for name, seconds in results.items():
+            click.echo('  {:20} {:8.3f}s'.format(name, seconds))
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(all_results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Synthetic git repositories and stand-in stylers for benchmarking zazu style."""
+import git
+import os
+import random
+import sys
+import types
+import zazu.styler
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+EXTENSIONS = ['.py', '.cpp', '.h', '.js', '.c', '.md', '.txt', '.json']
+STANDIN_STYLER_TYPE = 'standin'
+
+STYLE_CONFIG = """style:
+  - exclude:
+      - build
+      - '**/generated/**'
+    include:
+      - '*.py'
+    stylers:
+      - type: standin
+      - type: standin
+        options: ['--second']
+  - include:
+      - '*.c'
+      - '*.cpp'
+      - '*.h'
+    stylers:
+      - type: standin
+  - include:
+      - '*.js'
+    stylers:
+      - type: standin
+"""
+
+
+class StandinStyler(zazu.styler.Styler):
+    """Styler that strips trailing whitespace in process, so benchmarks measure zazu's overhead and not a formatter."""
+
+    def style_string(self, string, filepath):
+        """Strip trailing whitespace from every line."""
+        return '\n'.join(line.rstrip() for line in string.split('\n'))
+
+    def version(self):
+        """Return a fixed version rather than running a tool."""
+        return '1.0'
+
+    @staticmethod
+    def default_extensions():
+        """Style everything by default."""
+        return ['*']
+
+    @staticmethod
+    def type():
+        """Return the name of this Styler."""
+        return STANDIN_STYLER_TYPE
+
+
+def register_standin_styler():
+    """Make the stand-in styler available as the "standin" styler type."""
+    module_name = 'zazu.plugins.{}_styler'.format(STANDIN_STYLER_TYPE)
+    if module_name not in sys.modules:
+        module = types.ModuleType(module_name)
+        module.Styler = StandinStyler
+        sys.modules[module_name] = module
+
+
+def file_contents(rng, clean):
+    """Make the contents of a source file, with trailing whitespace (a style violation) unless clean is True."""
+    lines = ['line {} {}'.format(i, 'x' * rng.randint(1, 60)) for i in range(rng.randint(5, 80))]
+    if not clean:
+        lines = [line + ' ' * rng.randint(0, 2) for line in lines]
+    return '\n'.join(lines) + '\n'
+
+
+def file_paths(rng, file_count):
+    """Make file_count relative paths with mixed extensions spread through a deep tree."""
+    paths = set()
+    while len(paths) < file_count:
+        depth = rng.randint(0, 8)
+        parts = ['d{}'.format(rng.randint(0, 9)) for _ in range(depth)]
+        if rng.random() < 0.05:
+            parts.insert(rng.randint(0, len(parts)), 'generated')
+        parts.append('f{}{}'.format(len(paths), rng.choice(EXTENSIONS)))
+        paths.add('/'.join(parts))
+    return sorted(paths)
+
+
+def make_repo(root, file_count, dirty_fraction=0.1, staged_fraction=0.01, seed=0):
+    """Make a synthetic git repo with style config for the stand-in styler.
+
+    Args:
+        root (str): the directory to create the repo in.
+        file_count (int): the number of files to commit.
+        dirty_fraction (float): the fraction of committed files that have style violations.
+        staged_fraction (float): the fraction of files that are modified and staged after the commit, half of which are
+            then modified again so that they are only partially staged.
+        seed (int): random seed, the same seed always produces the same repo.
+
+    Returns:
+        git.Repo: the repo.
+
+    """
+    rng = random.Random(seed)
+    repo = git.Repo.init(root)
+    paths = file_paths(rng, file_count)
+    for path in paths:
+        full_path = os.path.join(root, *path.split('/'))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as f:
+            f.write(file_contents(rng, rng.random() >= dirty_fraction))
+    with open(os.path.join(root, 'zazu.yaml'), 'w') as f:
+        f.write(STYLE_CONFIG)
+    repo.git.add('-A')
+    with repo.config_writer() as writer:
+        writer.set_value('user', 'name', 'zazu')
+        writer.set_value('user', 'email', 'zazu@example.com')
+    repo.git.commit('-q', '-m', 'synthetic repo')
+    staged = rng.sample(paths, int(file_count * staged_fraction))
+    for path in staged:
+        with open(os.path.join(root, *path.split('/')), 'w') as f:
+            f.write(file_contents(rng, False))
+    if staged:
+        repo.git.add(*staged)
+    for path in staged[:len(staged) // 2]:
+        with open(os.path.join(root, *path.split('/')), 'a') as f:
+            f.write('unstaged change\n')
+    return repo
@@ -76,7 +76,7 @@ setuptools.setup(
     },
     entry_points='''
         [console_scripts]
-        zazu=zazu.cli:cli
+        zazu=zazu.cli:main
         ''',
     setup_requires=[] + pytest_runner,
     tests_require=['pytest',
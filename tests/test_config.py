@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import click
 import click.testing
+import datetime
 import os
 import pytest
 import ruamel.yaml as yaml
+import time
 import zazu.cli
 import zazu.config
 import zazu.git_helper
@@ -310,3 +312,124 @@ def test_complete_param(mocker, temp_user_config):
     mocker.patch('zazu.config.user_config_filepath', return_value=temp_user_config)
     assert zazu.config.complete_param(None, [], '') == ['scm_host.gh.type', 'scm_host.gh.user']
     assert zazu.config.complete_param(None, ['--add'], '') == []
+
+
+def test_preload_group(mocker):
+    preload = mocker.patch('zazu.imports.preload')
+    # The config is only needed by functions that pick modules.
+    mocker.patch('zazu.config.Config', side_effect=AssertionError)
+
+    @click.group(cls=zazu.config.PreloadGroup)
+    def group():
+        pass
+
+    @zazu.config.preload('git', 'ruamel.yaml')
+    @group.command()
+    def with_modules():
+        pass
+
+    @group.command()
+    def without_modules():
+        pass
+
+    runner = click.testing.CliRunner()
+    assert runner.invoke(group, ['without-modules']).exit_code == 0
+    assert runner.invoke(group, ['with-modules', '--help']).exit_code == 0
+    preload.assert_not_called()
+    assert runner.invoke(group, ['with-modules']).exit_code == 0
+    preload.assert_called_once_with(('git', 'ruamel.yaml'))
+    ctx = group.make_context('group', [], resilient_parsing=True)
+    group.resolve_command(ctx, ['with-modules'])
+    assert preload.call_count == 1
+
+
+def test_cli_preloads(mocker):
+    preload = mocker.patch('zazu.imports.preload')
+    mocker.patch('zazu.config.Config.issue_tracker_config', return_value={'type': 'jira'})
+    runner = click.testing.CliRunner()
+    runner.invoke(zazu.cli.cli, ['dev', 'ticket', 'ZZ-1'])
+    preload.assert_called_once_with(['jira', 'webbrowser'])
+
+
+def test_issue_tracker_modules(mocker):
+    mocker.patch('zazu.config.Config.issue_tracker_config', return_value={'type': 'jira'})
+    config = zazu.config.Config('')
+    assert zazu.config.issue_tracker_modules(config) == ['jira']
+    zazu.config.Config.issue_tracker_config.return_value = {'type': 'unknown'}
+    assert zazu.config.issue_tracker_modules(config) == []
+    zazu.config.Config.issue_tracker_config.side_effect = click.ClickException('no issue_tracker config found')
+    assert zazu.config.issue_tracker_modules(config) == []
+
+
+def test_preload_shares_config(mocker, git_repo):
+    mocker.patch('zazu.imports.preload')
+    warn = mocker.patch('zazu.util.warn')
+    with zazu.util.cd(git_repo.working_tree_dir):
+        with open('zazu.yaml', 'w') as f:
+            f.write('zazu: 9.9.9\nissue_tracker:\n  type: github\n  owner: stopthatcow\n  repo: zazu\n')
+        runner = click.testing.CliRunner()
+        runner.invoke(zazu.cli.cli, ['repo', 'cleanup', '-y'])
+    zazu.imports.preload.assert_called_once_with(['github'])
+    assert warn.call_count == 1
+
+
+def write_old_file(path, contents):
+    """Write a file with a modification time that is old enough to be cached."""
+    with open(path, 'w') as f:
+        f.write(contents)
+    mtime = time.time() - 10
+    os.utime(path, (mtime, mtime))
+
+
+def test_parsed_config_cache(mocker, tmp_dir):
+    path = os.path.join(tmp_dir, 'zazu.yaml')
+    cache_path = os.path.join(tmp_dir, 'cache', 'config_cache.json')
+    write_old_file(path, 'style:\n  - stylers:\n      - type: autopep8\n')
+    expected = {'style': [{'stylers': [{'type': 'autopep8'}]}]}
+    assert zazu.config.ParsedConfigCache(cache_path).load(path) == expected
+    assert os.path.isfile(cache_path)
+    load_yaml_file = mocker.spy(zazu.config, 'load_yaml_file')
+    cache = zazu.config.ParsedConfigCache(cache_path)
+    config = cache.load(path)
+    assert config == expected
+    load_yaml_file.assert_not_called()
+    config['style'] = []
+    assert cache.load(path) == expected
+    write_old_file(path, 'style: []\n')
+    assert zazu.config.ParsedConfigCache(cache_path).load(path) == {'style': []}
+    assert load_yaml_file.call_count == 1
+
+
+def test_parsed_config_cache_uncacheable(mocker, tmp_dir):
+    cache_path = os.path.join(tmp_dir, 'config_cache.json')
+    recent = os.path.join(tmp_dir, 'recent.yaml')
+    with open(recent, 'w') as f:
+        f.write('a: 1\n')
+    dated = os.path.join(tmp_dir, 'dated.yaml')
+    write_old_file(dated, 'a: 2019-01-01\n1: 2\n')
+    cache = zazu.config.ParsedConfigCache(cache_path)
+    assert cache.load(recent) == {'a': 1}
+    assert cache.load(dated) == {'a': datetime.date(2019, 1, 1), 1: 2}
+    assert not os.path.exists(cache_path)
+
+
+def test_load_yaml_file_round_trip(tmp_dir):
+    path = os.path.join(tmp_dir, 'config.yaml')
+    with open(path, 'w') as f:
+        f.write('# A comment.\na: 1\nb: {url: https://zazu.atlassian.net/}\n')
+    assert zazu.config.load_yaml_file(path) == {'a': 1, 'b': {'url': 'https://zazu.atlassian.net/'}}
+    config_file = zazu.config.ConfigFile(path, round_trip=True)
+    config_file.dict['a'] = 2
+    config_file.write()
+    with open(path) as f:
+        assert f.read() == '# A comment.\na: 2\nb: {url: https://zazu.atlassian.net/}\n'
+
+
+def test_config_cache(mocker, git_repo):
+    path = os.path.join(git_repo.working_tree_dir, 'zazu.yaml')
+    write_old_file(path, 'branches:\n  develop: dev\n')
+    mocker.patch('zazu.config.user_config_filepath', return_value=os.path.join(git_repo.working_tree_dir, 'user.yaml'))
+    assert zazu.config.Config(git_repo.working_tree_dir).develop_branch_name() == 'dev'
+    assert os.path.isfile(os.path.join(git_repo.git_dir, 'zazu', 'config_cache.json'))
+    mocker.patch('ruamel.yaml.YAML', side_effect=AssertionError)
+    assert zazu.config.Config(git_repo.working_tree_dir).develop_branch_name() == 'dev'
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import os
+import pytest
+import socket
+import tempfile
+import threading
+import time
+import zazu.cli
+import zazu.daemon
+import zazu.util
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+
+@pytest.fixture
+def daemon_socket():
+    path = os.path.join(tempfile.mkdtemp(), 'zazu.sock')
+    thread = threading.Thread(target=zazu.daemon.serve, args=(path,))
+    thread.start()
+    deadline = time.time() + 10
+    while not zazu.daemon.is_running(path):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    yield path
+    zazu.daemon.request({'command': 'stop'}, path)
+    thread.join()
+    assert not os.path.exists(path)
+
+
+def test_messages():
+    a, b = socket.socketpair()
+    with a, b:
+        zazu.daemon.send_message(a, {'args': ['style', u'✓']})
+        assert zazu.daemon.recv_message(b) == {'args': ['style', u'✓']}
+        a.close()
+        with pytest.raises(EOFError):
+            zazu.daemon.recv_message(b)
+
+
+def test_forward_not_running(tmp_dir):
+    path = os.path.join(tmp_dir, 'missing.sock')
+    assert zazu.daemon.forward(['style'], path) is None
+    assert not zazu.daemon.is_running(path)
+
+
+def test_forward_unsupported_command(daemon_socket):
+    assert zazu.daemon.forward([], daemon_socket) is None
+    assert zazu.daemon.forward(['dev', 'start'], daemon_socket) is None
+
+
+def test_forward(repo_with_style, daemon_socket, capsys):
+    dir = repo_with_style.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('temp.py', 'w') as f:
+            f.write('def main():\tpass\n')
+        assert zazu.daemon.forward(['style', '--check', '-v'], daemon_socket)
+        assert 'temp.py' in capsys.readouterr().out
+        assert zazu.daemon.forward(['style', '-v'], daemon_socket) == 0
+        assert zazu.daemon.forward(['style', '--check', '-v'], daemon_socket) == 0
+    status = zazu.daemon.request({'command': 'status'}, daemon_socket)
+    assert status['commands_run'] == 3
+    assert status['repos'] == [zazu.git_helper.get_repo_root(dir)]
+
+
+def test_forward_other_installation(repo_with_style, daemon_socket, mocker):
+    mocker.patch('zazu.daemon._package_dir', side_effect=['/somewhere/else', '/installed'])
+    with zazu.util.cd(repo_with_style.working_tree_dir):
+        assert zazu.daemon.forward(['style'], daemon_socket) is None
+
+
+def test_config_reload(repo_with_style):
+    dir = repo_with_style.working_tree_dir
+    daemon = zazu.daemon.Daemon()
+    config = daemon.config(dir)
+    assert daemon.config(dir) is config
+    with open(os.path.join(dir, 'zazu.yaml'), 'a') as f:
+        f.write('\n# changed\n')
+    assert daemon.config(dir) is not config
+
+
+def test_run_exception(repo_with_style, mocker):
+    mocker.patch('zazu.style.style_files', side_effect=RuntimeError('boom'))
+    dir = repo_with_style.working_tree_dir
+    with open(os.path.join(dir, 'temp.py'), 'w') as f:
+        f.write('x = 1\n')
+    response = zazu.daemon.Daemon().run(['style', '--no-cache'], dir, {})
+    assert response['exit_code'] == 1
+    assert 'RuntimeError: boom' in response['output']
+
+
+def test_main(mocker):
+    mocker.patch('zazu.daemon.forward', return_value=3)
+    cli_mock = mocker.patch('zazu.cli.cli')
+    with pytest.raises(SystemExit) as e:
+        zazu.cli.main()
+    assert e.value.code == 3
+    assert cli_mock.call_count == 0
+    zazu.daemon.forward.return_value = None
+    zazu.cli.main()
+    assert cli_mock.call_count == 1
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import click
+import functools
 import os
+import pytest
 import zazu.git_helper
+import zazu.style_cache
+import zazu.util
 
 __author__ = "Nicholas Wiles"
 __copyright__ = "Copyright 2016"
@@ -38,6 +43,32 @@ def test_touched_files(git_repo):
     assert len(zazu.git_helper.get_touched_files(git_repo)) == 2
 
 
+def test_changed_lines(git_repo):
+    dir = git_repo.working_tree_dir
+    names = ['a.txt', os.path.join('sub dir', u'caf\xe9.txt')]
+    with zazu.util.cd(dir):
+        os.mkdir('sub dir')
+        for name in names:
+            with open(name, 'w') as f:
+                f.write(''.join('{}\n'.format(i) for i in range(1, 11)))
+        git_repo.index.add(names)
+        git_repo.index.commit('lines')
+        with open('a.txt', 'w') as f:
+            f.write('1\nTWO\nTHREE\n4\n5\n7\n8\n+++ 9\n10\n11\n')
+        git_repo.index.add(['a.txt'])
+        with open(names[1], 'a') as f:
+            f.write('11\n')
+        with open('new.txt', 'w') as f:
+            f.write('1\n2\n')
+        git_repo.index.add(['new.txt'])
+        assert zazu.git_helper.get_changed_lines(git_repo, cached=True) == {'a.txt': [(2, 3), (8, 8), (10, 10)],
+                                                                            'new.txt': [(1, 2)]}
+        assert zazu.git_helper.get_changed_lines(git_repo) == {names[1]: [(11, 11)]}
+        assert zazu.git_helper.get_changed_lines(git_repo, 'HEAD') == {'a.txt': [(2, 3), (8, 8), (10, 10)],
+                                                                       names[1]: [(11, 11)],
+                                                                       'new.txt': [(1, 2)]}
+
+
 def test_merged_branches(git_repo):
     with zazu.util.cd(git_repo.working_tree_dir):
         git_repo.create_head('foo').checkout()
@@ -53,3 +84,78 @@ def test_merged_branches(git_repo):
         assert merged == {'foo'}
         zazu.git_helper.merged_branches(git_repo, 'master', True)
         assert merged == {'foo'}
+
+
+def test_ls_files(git_repo):
+    dir = git_repo.working_tree_dir
+    with zazu.util.cd(dir):
+        os.mkdir('sub')
+        for f in ['sub/tracked', 'untracked', 'ignored', 'deleted']:
+            with open(f, 'w'):
+                pass
+        with open('.gitignore', 'w') as f:
+            f.write('ignored\n')
+        git_repo.index.add(['sub/tracked', 'deleted', '.gitignore'])
+        os.remove('deleted')
+    assert sorted(zazu.git_helper.ls_files(dir)) == ['.gitignore', 'README.md', 'sub/tracked']
+    assert sorted(zazu.git_helper.ls_files(dir, untracked=True)) == ['.gitignore', 'README.md', 'sub/tracked', 'untracked']
+
+
+def test_stat_clean_blobs(git_repo):
+    dir = git_repo.working_tree_dir
+    with zazu.util.cd(dir):
+        os.mkdir('sub')
+        for f in ['clean', os.path.join('sub', 'modified'), 'deleted', 'untracked']:
+            with open(f, 'w') as file:
+                file.write(f)
+        os.symlink('clean', 'link')
+        git_repo.git.add('clean', 'sub', 'deleted', 'link')
+        git_repo.git.update_index('--refresh')
+        with open(os.path.join('sub', 'modified'), 'a') as f:
+            f.write('more')
+        os.remove('deleted')
+        entries = zazu.git_helper.staged_entries(dir)
+        assert zazu.git_helper.stat_clean_blobs(dir) == {'README.md': entries['README.md'][1],
+                                                         'clean': entries['clean'][1]}
+        assert entries['clean'][1] == zazu.style_cache.blob_id('clean')
+
+
+def test_staged_reader(git_repo):
+    dir = git_repo.working_tree_dir
+    with zazu.util.cd(dir):
+        files = {'a': 'staged a\n', os.path.join('sub', 'b'): 'staged\r\nb', 'c': ''}
+        os.mkdir('sub')
+        for path, content in files.items():
+            with open(path, 'w', newline='') as f:
+                f.write(content)
+        git_repo.git.add('-A')
+        with open('a', 'w') as f:
+            f.write('unstaged')
+        with zazu.git_helper.StagedReader(dir, max_processes=2) as uut:
+            for path in files:
+                assert uut(path) == zazu.git_helper.read_staged(path)
+            results = list(zazu.util.dispatch([functools.partial(uut, p) for p in list(files) * 20]))
+            assert sorted(results) == sorted([zazu.git_helper.read_staged(p) for p in files] * 20)
+            assert uut('README.md') == ''
+            assert uut.read_blob(zazu.git_helper.staged_entries(dir)['a'][1]) == b'staged a\n'
+            with pytest.raises(click.ClickException):
+                uut.read_blob('0' * 40)
+
+
+def test_index_writer(git_repo):
+    dir = git_repo.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('script', 'w') as f:
+            f.write('old')
+        os.chmod('script', 0o755)
+        git_repo.git.add('script')
+        uut = zazu.git_helper.IndexWriter(dir)
+        uut.flush()
+        uut.stage('script', 'new script')
+        uut.stage('README.md', 'no trailing newline')
+        uut.flush()
+        assert git_repo.git.show(':script') == 'new script'
+        assert git_repo.git.show(':README.md') == 'no trailing newline'
+        assert zazu.git_helper.staged_entries(dir)['script'][0] == '100755'
+        with open('script') as f:
+            assert f.read() == 'old'
@@ -1,4 +1,9 @@
 # -*- coding: utf-8 -*-
+import importlib
+import os
+import pytest
+import sys
+import threading
 import zazu.imports
 
 __author__ = "Nicholas Wiles"
@@ -17,3 +22,165 @@ def test_lazy_imports():
     assert zazu.plugins.jira_issue_tracker.IssueTracker
     assert zazu.plugins.github_issue_tracker.IssueTracker
     assert ruamel.yaml.YAMLError
+
+
+def make_package(path, name, modules):
+    """Make a package from a dict of module names to their source."""
+    package_dir = os.path.join(path, name)
+    os.mkdir(package_dir)
+    for module_name, source in modules.items():
+        with open(os.path.join(package_dir, module_name + '.py'), 'w') as f:
+            f.write(source)
+
+
+def unload_package(name):
+    for module_name in list(sys.modules):
+        if module_name.partition('.')[0] == name:
+            del sys.modules[module_name]
+
+
+@pytest.fixture
+def lazy_package(tmp_dir, monkeypatch):
+    """Make a package whose modules record that they were executed in the LAZY_PKG_LOADS environment variable."""
+    source = ('import os\n'
+              'os.environ["LAZY_PKG_LOADS"] += __name__ + " "\n'
+              'VALUE = __name__\n')
+    make_package(tmp_dir, 'lazy_pkg', {name: source for name in ['__init__', 'child', 'other']})
+    monkeypatch.syspath_prepend(tmp_dir)
+    monkeypatch.setenv('LAZY_PKG_LOADS', '')
+    yield os.path.join(tmp_dir, 'lazy_pkg')
+    unload_package('lazy_pkg')
+
+
+def test_lazy_import_defers_execution(lazy_package):
+    scope = {}
+    zazu.imports.lazy_import(scope, ['lazy_pkg.child', 'lazy_pkg.other'])
+    assert os.environ['LAZY_PKG_LOADS'] == ''
+    assert scope['lazy_pkg'] is sys.modules['lazy_pkg']
+    assert scope['lazy_pkg'].child.VALUE == 'lazy_pkg.child'
+    assert os.environ['LAZY_PKG_LOADS'].split() == ['lazy_pkg', 'lazy_pkg.child']
+    import lazy_pkg.other
+    assert lazy_pkg.other is scope['lazy_pkg'].other
+    assert lazy_pkg.other.VALUE == 'lazy_pkg.other'
+    assert os.environ['LAZY_PKG_LOADS'].split() == ['lazy_pkg', 'lazy_pkg.child', 'lazy_pkg.other']
+
+
+def test_lazy_import_loaded_module_is_plain(lazy_package):
+    scope = {}
+    zazu.imports.lazy_import(scope, ['lazy_pkg.child'])
+    child = scope['lazy_pkg'].child
+    assert type(child) is not type(os)
+    assert child.VALUE == 'lazy_pkg.child'
+    # Once loaded, attribute access no longer goes through the lazy module.
+    assert type(child) is type(os)
+    assert type(scope['lazy_pkg']) is type(os)
+    child.VALUE = 'changed'
+    assert child.VALUE == 'changed'
+    assert os.environ['LAZY_PKG_LOADS'].split() == ['lazy_pkg', 'lazy_pkg.child']
+
+
+def test_lazy_import_missing(lazy_package):
+    scope = {}
+    zazu.imports.lazy_import(scope, ['lazy_pkg.missing', 'zazu_missing_module.child'])
+    assert os.environ['LAZY_PKG_LOADS'] == ''
+    with pytest.raises(ImportError):
+        scope['zazu_missing_module'].child.anything
+    with pytest.raises(ImportError):
+        scope['lazy_pkg'].missing.anything
+    assert not hasattr(scope['zazu_missing_module'], '__path__')
+    with pytest.raises(ImportError):
+        import zazu_missing_module  # NOQA
+
+
+def test_lazy_import_existing():
+    scope = {}
+    zazu.imports.lazy_import(scope, ['os.path', 'math'])
+    assert scope['os'] is os
+    # Modules that aren't python source are imported immediately.
+    assert scope['math'] is importlib.import_module('math')
+    assert type(scope['math']) is type(os)
+
+
+def run_threads(targets, timeout=30):
+    """Run each target in its own thread, returning the exceptions they raised."""
+    errors = []
+
+    def run(target):
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout)
+        assert not t.is_alive()
+    return errors
+
+
+def test_lazy_import_threads(tmp_dir, monkeypatch):
+    module_count = 40
+    # Each module counts its executions and takes a while to run, modules also use the one before them as they load.
+    modules = {'__init__': 'import collections\nLOADS = collections.Counter()\n'}
+    for i in range(module_count):
+        modules['m{}'.format(i)] = ('import time\n'
+                                    'import zazu.imports\n'
+                                    'zazu.imports.lazy_import(locals(), ["lazy_threads.m{previous}"])\n'
+                                    'lazy_threads.LOADS[__name__] += 1\n'
+                                    'time.sleep(0.002)\n'
+                                    'VALUE = {i}\n'
+                                    'PREVIOUS = lazy_threads.m{previous}.VALUE if {i} else None\n'
+                                    ).format(i=i, previous=max(i - 1, 0))
+    make_package(tmp_dir, 'lazy_threads', modules)
+    monkeypatch.syspath_prepend(tmp_dir)
+    try:
+        scope = {}
+        zazu.imports.lazy_import(scope, ['lazy_threads.m{}'.format(i) for i in range(module_count)])
+        package = scope['lazy_threads']
+
+        def touch_all(offset):
+            def touch():
+                for i in range(module_count):
+                    index = (i * 7 + offset) % module_count
+                    module = getattr(package, 'm{}'.format(index))
+                    assert module.VALUE == index
+                    assert module.PREVIOUS == (index - 1 if index else None)
+            return touch
+
+        assert run_threads([touch_all(offset) for offset in range(32)]) == []
+        assert package.LOADS == {'lazy_threads.m{}'.format(i): 1 for i in range(module_count)}
+    finally:
+        unload_package('lazy_threads')
+
+
+def test_lazy_import_threads_circular(tmp_dir, monkeypatch):
+    # Each module uses the other as it loads, so threads loading one each would wait on each other.
+    source = ('import threading\n'
+              'import zazu.imports\n'
+              'zazu.imports.lazy_import(locals(), ["lazy_cycle.{other}"])\n'
+              'VALUE = "{name}"\n'
+              'lazy_cycle.BARRIER.wait(5)\n'
+              'OTHER = lazy_cycle.{other}.VALUE\n')
+    make_package(tmp_dir, 'lazy_cycle', {'__init__': 'import threading\nBARRIER = threading.Barrier(2)\n',
+                                         'a': source.format(name='a', other='b'),
+                                         'b': source.format(name='b', other='a')})
+    monkeypatch.syspath_prepend(tmp_dir)
+    try:
+        scope = {}
+        zazu.imports.lazy_import(scope, ['lazy_cycle.a', 'lazy_cycle.b'])
+        package = scope['lazy_cycle']
+        assert package.BARRIER
+        assert run_threads([lambda: package.a.OTHER, lambda: package.b.OTHER]) == []
+        assert (package.a.OTHER, package.b.OTHER) == ('b', 'a')
+    finally:
+        unload_package('lazy_cycle')
+
+
+def test_preload(lazy_package):
+    scope = {}
+    zazu.imports.lazy_import(scope, ['lazy_pkg.child', 'lazy_pkg.other'])
+    zazu.imports.preload(['lazy_pkg.child', lambda: ['lazy_pkg.missing'], lambda: 1 / 0]).join()
+    assert sorted(os.environ['LAZY_PKG_LOADS'].split()) == ['lazy_pkg', 'lazy_pkg.child']
+    assert type(scope['lazy_pkg'].child) is type(os)
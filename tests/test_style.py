@@ -2,8 +2,11 @@
 import click
 import click.testing
 import distutils.spawn
+import json
+import os
 import pytest
 import subprocess
+import time
 import zazu.cli
 import zazu.plugins.clang_format_styler
 import zazu.plugins.eslint_styler
@@ -64,6 +67,148 @@ def test_autopep8():
     assert styler.type() == 'autopep8'
 
 
+def test_autopep8_batch(tmp_dir):
+    styler = zazu.plugins.autopep8_styler.Styler()
+    strings = ['def foo ():\n  pass', 'import os, sys\n', 'x = 1\n']
+    paths = [os.path.join(tmp_dir, f) for f in ['a.py', 'b.py', 'c.py']]
+    assert styler.batch_options() == ['--in-place']
+    assert styler.style_strings(strings, paths) == [styler.style_string(s, p) for s, p in zip(strings, paths)]
+    assert os.listdir(tmp_dir) == []
+
+
+def test_batch_nested_config(tmp_dir):
+    os.mkdir(os.path.join(tmp_dir, 'sub'))
+    with open(os.path.join(tmp_dir, 'sub', 'setup.cfg'), 'w') as f:
+        f.write('[pycodestyle]\nignore = E225\n')
+    with zazu.util.cd(tmp_dir):
+        styler = zazu.plugins.autopep8_styler.Styler()
+        in_process_styler = zazu.plugins.autopep8_styler.Styler.from_config({'in_process': True}, [], [])
+        paths = [os.path.join('sub', 'a.py'), 'b.py', os.path.join('sub', 'c.py')]
+        strings = ['x=1\n', 'y=2\n', 'z=3\n']
+        expected = ['x=1\n', 'y = 2\n', 'z=3\n']
+        assert [styler.style_string(s, p) for s, p in zip(strings, paths)] == expected
+        assert styler.style_strings(strings, paths) == expected
+        assert styler.style_strings(strings[:1], paths[:1]) == expected[:1]
+        assert in_process_styler.style_strings(strings, paths) == expected
+        assert sorted(os.listdir('sub')) == ['setup.cfg']
+
+
+def test_docformatter_batch(tmp_dir):
+    styler = zazu.plugins.docformatter_styler.Styler()
+    strings = ['def foo():\n    """\n    Hello world.\n    """\n', 'def bar():\n    """   Bar.   """\n', 'x = 1\n']
+    paths = [os.path.join(tmp_dir, f) for f in ['a.py', 'b.py', 'c.py']]
+    assert styler.style_strings(strings, paths) == ['def foo():\n    """Hello world."""\n',
+                                                    'def bar():\n    """Bar."""\n', 'x = 1\n']
+    assert os.listdir(tmp_dir) == []
+
+
+def test_batch_error(mocker, tmp_dir):
+    mocker.patch('zazu.util.check_popen', side_effect=subprocess.CalledProcessError(1, 'autopep8'))
+    styler = zazu.plugins.autopep8_styler.Styler()
+    paths = [os.path.join(tmp_dir, f) for f in ['a.py', 'b.py']]
+    with pytest.raises(subprocess.CalledProcessError):
+        styler.style_strings(['a', 'b'], paths)
+    assert os.listdir(tmp_dir) == []
+
+
+def test_batch_read_only(mocker, tmp_dir):
+    access = os.access
+    mocker.patch('os.access', side_effect=lambda path, mode: path != tmp_dir and access(path, mode))
+    check_popen = mocker.spy(zazu.util, 'check_popen')
+    styler = zazu.plugins.autopep8_styler.Styler()
+    strings = ['def foo ():\n  pass\n', 'x=1\n']
+    paths = [os.path.join(tmp_dir, f) for f in ['a.py', 'b.py']]
+    assert styler.style_strings(strings, paths) == ['def foo():\n    pass\n', 'x = 1\n']
+    assert [c[1]['args'] for c in check_popen.call_args_list] == [['autopep8', '-'], ['autopep8', '-']]
+
+
+def test_batches():
+    batchable = [zazu.plugins.autopep8_styler.Styler()]
+    unbatchable = [zazu.plugins.generic_styler.Styler(command='cat')]
+    files = ['f{:03}'.format(i) for i in range(100)]
+    assert zazu.style.batches(unbatchable, files[:3], 2) == [['f000'], ['f001'], ['f002']]
+    assert zazu.style.batches(batchable, files[:3], 2) == [['f000', 'f001'], ['f002']]
+    assert [len(b) for b in zazu.style.batches(batchable, files, 2)] == [32, 32, 32, 4]
+    assert [len(b) for b in zazu.style.batches(batchable + unbatchable, files[:10], 2)] == [5, 5]
+
+
+def test_max_jobs():
+    styler = zazu.plugins.generic_styler.Styler.from_config({'command': 'cat', 'max_jobs': 2}, [], [])
+    assert styler.max_jobs == 2
+    running = []
+    peak = []
+
+    def work():
+        with styler.job_slot():
+            running.append(1)
+            peak.append(len(running))
+            time.sleep(0.05)
+            running.pop()
+
+    list(zazu.util.dispatch([work] * 8, max_workers=8))
+    assert max(peak) == 2
+    styler = zazu.plugins.generic_styler.Styler.from_config({'command': 'cat'}, [], [])
+    assert styler.max_jobs is None
+    with styler.job_slot():
+        pass
+
+
+IN_PROCESS_SAMPLES = ['def foo ():\n  pass',
+                      'def bar(a,b):\n    """  doc string."""\n    return a+b\n',
+                      'import os, sys\r\nx=1\r\n',
+                      '']
+
+
+@pytest.mark.parametrize('styler_class, options', [
+    (zazu.plugins.autopep8_styler.Styler, ['--max-line-length=150']),
+    (zazu.plugins.docformatter_styler.Styler, ['--wrap-summaries=0', '--blank'])])
+def test_in_process(styler_class, options):
+    subprocess_styler = styler_class.from_config({'options': list(options)}, [], [])
+    in_process_styler = styler_class.from_config({'options': list(options), 'in_process': True}, [], [])
+    assert not subprocess_styler.in_process
+    assert in_process_styler.in_process
+    expected = [subprocess_styler.style_string(s, None) for s in IN_PROCESS_SAMPLES]
+    assert [in_process_styler.style_string(s, None) for s in IN_PROCESS_SAMPLES] == expected
+    assert in_process_styler.style_strings(IN_PROCESS_SAMPLES, [None] * len(IN_PROCESS_SAMPLES)) == expected
+
+
+def test_in_process_config(tmp_dir):
+    subprocess_styler = zazu.plugins.autopep8_styler.Styler.from_config({}, [], [])
+    in_process_styler = zazu.plugins.autopep8_styler.Styler.from_config({'in_process': True}, [], [])
+    long_line = 'x = [{}]\n'.format(', '.join(['1'] * 40))
+    for max_line_length in [150, 79]:
+        for name in ['a', 'b']:
+            repo_dir = os.path.join(tmp_dir, name)
+            if not os.path.isdir(repo_dir):
+                os.mkdir(repo_dir)
+            with open(os.path.join(repo_dir, 'setup.cfg'), 'w') as f:
+                f.write('[pycodestyle]\nmax-line-length = {}\n'.format(max_line_length if name == 'a' else 150))
+            with zazu.util.cd(repo_dir):
+                for styler in [subprocess_styler, in_process_styler]:
+                    styler.refresh()
+                expected = subprocess_styler.style_string(long_line, None)
+                assert in_process_styler.style_string(long_line, None) == expected
+                assert (expected == long_line) == (name == 'b' or max_line_length == 150)
+
+
+def test_process_pool_shutdown():
+    pool = zazu.util.process_pool()
+    assert zazu.util.process_pool() is pool
+    zazu.util.shutdown_process_pool()
+    assert zazu.util._process_pool is None
+    assert zazu.util.process_pool().submit(int, '3').result() == 3
+
+
+def test_in_process_unsupported():
+    with pytest.raises(click.ClickException):
+        zazu.plugins.generic_styler.Styler.from_config({'command': 'cat', 'in_process': True}, [], [])
+
+
+def test_ranged_unsupported():
+    with pytest.raises(click.ClickException):
+        zazu.plugins.generic_styler.Styler.from_config({'command': 'cat', 'ranged': True}, [], [])
+
+
 def test_docformatter():
     styler = zazu.plugins.docformatter_styler.Styler()
     ret = styler.style_string('def foo ():\n"""doc"""\n  pass', None)
@@ -122,6 +267,41 @@ def test_eslint(mocker):
         styler.style_string('foo', 'baz/qux')
 
 
+def test_eslint_batch(mocker, tmp_dir):
+    local_eslint = os.path.join('a', 'node_modules', 'eslint', 'bin', 'eslint.js')
+    paths = [os.path.join('a', 'x.js'), os.path.join('a', 'sub', 'y.js'), os.path.join('b', 'z.js')]
+    with zazu.util.cd(tmp_dir):
+        for path in [local_eslint] + paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w'):
+                pass
+
+        def fake_eslint(args, **kwargs):
+            assert os.path.basename(args[-1]).startswith('.zazu-')
+            results = []
+            for path in args[-2:]:
+                with open(path) as f:
+                    results.append({'filePath': os.path.abspath(path), 'output': f.read().upper()})
+            return json.dumps(results)
+
+        mocker.patch('zazu.util.check_popen', side_effect=fake_eslint)
+        mocker.patch('subprocess.Popen')
+        subprocess.Popen.return_value.communicate.return_value = ('[{"output":"Z"}]', None)
+        styler = zazu.plugins.eslint_styler.Styler(options=['--color'])
+        assert styler.style_strings(['x', 'y', 'z'], paths) == ['X', 'Y', 'Z']
+        assert styler.style_strings(['x', 'y', 'z'], paths, [[(1, 1)]] * 3) == ['X', 'Y', 'Z']
+        args = zazu.util.check_popen.call_args[1]['args']
+        assert args[:-2] == [os.path.realpath(local_eslint), '-f', 'json', '--fix-dry-run', '--ignore-pattern',
+                             '!.zazu-*', '--color']
+        assert zazu.util.check_popen.call_args[1]['allowed_return_codes'] == [0, 1]
+        assert subprocess.Popen.call_args[1]['args'][0] == 'eslint'
+        assert sorted(os.listdir('a')) == ['node_modules', 'sub', 'x.js']
+        # Resolution is remembered for every directory that was searched.
+        mocker.patch('os.path.isfile', return_value=False)
+        assert styler.find_eslint(os.path.join('a', 'sub', 'w.js')) == os.path.realpath(local_eslint)
+        assert styler.find_eslint(os.path.join('b', 'w.js')) == 'eslint'
+
+
 def test_goimports(mocker):
     mocker.patch('zazu.util.check_popen', return_value='bar')
     styler = zazu.plugins.goimports_styler.Styler(options=['-U'])
@@ -162,6 +342,24 @@ def test_clang_format():
     assert styler.type() == 'clang-format'
 
 
+@pytest.mark.skipif(not distutils.spawn.find_executable('clang-format'),
+                    reason="requires clang-format")
+def test_clang_format_nested_config(tmp_dir):
+    os.mkdir(os.path.join(tmp_dir, 'sub'))
+    with open(os.path.join(tmp_dir, 'sub', '.clang-format'), 'w') as f:
+        f.write('BasedOnStyle: LLVM\nIndentWidth: 8\n')
+    with zazu.util.cd(tmp_dir):
+        styler = zazu.plugins.clang_format_styler.Styler()
+        paths = [os.path.join('sub', 'a.c'), 'b.cpp', os.path.join('sub', 'c.h')]
+        strings = ['void f() {\nint x;\nint y;\n}\n'] * 3
+        nested = 'void f() {\n        int x;\n        int y;\n}\n'
+        expected = [nested, 'void f() {\n  int x;\n  int y;\n}\n', nested]
+        assert [styler.style_string(s, p) for s, p in zip(strings, paths)] == expected
+        assert styler.style_strings(strings, paths) == expected
+        assert styler.fingerprint(paths[0]) == styler.fingerprint(paths[2])
+        assert styler.fingerprint(paths[0]) != styler.fingerprint(os.path.join('sub', 'd.java'))
+
+
 @pytest.mark.skipif(not distutils.spawn.find_executable('clang-format'),
                     reason="requires clang-format")
 def test_bad_style(repo_with_style_errors):
@@ -171,6 +369,7 @@ def test_bad_style(repo_with_style_errors):
         result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v'])
         assert result.exit_code
         assert result.output.rstrip().endswith('6 files with violations in 6 files')
+        assert '4 of 6 files reused the result of an identical file (67% hit rate)' in result.output
         result = runner.invoke(zazu.cli.cli, ['style', '-v'])
         assert result.exit_code == 0
         assert result.output.rstrip().endswith('6 files fixed in 6 files')
@@ -178,6 +377,89 @@ def test_bad_style(repo_with_style_errors):
         assert result.exit_code == 0
 
 
+@pytest.mark.skipif(not distutils.spawn.find_executable('clang-format'),
+                    reason="requires clang-format")
+def test_discover_git(repo_with_style_errors):
+    dir = repo_with_style_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('.gitignore', 'w') as f:
+            f.write('temp.h\n')
+        repo_with_style_errors.git.add('temp.c')
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--discover', 'git'])
+        assert result.output.rstrip().endswith('1 files with violations in 1 files')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--discover', 'git-all'])
+        assert result.output.rstrip().endswith('5 files with violations in 5 files')
+
+
+@pytest.mark.skipif(not distutils.spawn.find_executable('clang-format'),
+                    reason="requires clang-format")
+def test_profile(repo_with_style_errors, tmp_dir):
+    dir = repo_with_style_errors.working_tree_dir
+    json_path = os.path.join(tmp_dir, 'profile.json')
+    with zazu.util.cd(dir):
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--no-cache', '--profile', '--profile-json', json_path])
+        assert 'Slowest files:' in result.output
+        assert 'clang-format' in result.output
+        with open(json_path) as f:
+            profile = json.load(f)
+        # The C files are identical, so only one of them is run through clang-format.
+        assert profile['stylers']['clang-format']['files'] == 1
+        assert profile['stylers']['autopep8']['files'] == 1
+        assert len(profile['files']) == 2
+
+
+def test_fail_fast(repo_with_style, tmp_dir):
+    dir = repo_with_style.working_tree_dir
+    report_path = os.path.join(tmp_dir, 'report.json')
+    with zazu.util.cd(dir):
+        for i in range(3):
+            write_py_file_with_bad_style('temp{}.py'.format(i))
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check'])
+        assert result.exit_code
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--fail-fast', '--no-cache', '-v', '-j', '1',
+                                              '--report-json', report_path])
+        assert result.exit_code
+        assert result.output.count('FAIL') == 1
+        assert result.output.rstrip().endswith('1 files with violations in 1 of 3 files, stopped at the first violation')
+        with open(report_path) as f:
+            report = json.load(f)
+        assert report['files'] == 1
+        assert report['stopped_early']
+        result = runner.invoke(zazu.cli.cli, ['style-merge', report_path])
+        assert 'not every file was checked' in result.output
+        result = runner.invoke(zazu.cli.cli, ['style', '--fail-fast'])
+        assert result.exit_code == 2
+
+
+@pytest.mark.skipif(not distutils.spawn.find_executable('clang-format'),
+                    reason="requires clang-format")
+def test_since(repo_with_style_errors):
+    dir = repo_with_style_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        repo_with_style_errors.git.checkout('-b', 'develop')
+        repo_with_style_errors.git.checkout('-b', 'feature')
+        repo_with_style_errors.index.add(['temp.c', 'temp.py'])
+        repo_with_style_errors.index.commit('add files')
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--since', 'auto'])
+        assert result.output.rstrip().endswith('2 files with violations in 2 files')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--since', 'HEAD'])
+        assert result.output.rstrip().endswith('0 files with violations in 0 files')
+        write_c_file_with_bad_style('temp.c')
+        with open('temp.c', 'a') as f:
+            f.write('int x;\n')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--since', 'HEAD'])
+        assert result.output.rstrip().endswith('1 files with violations in 1 files')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--since', 'HEAD', '--cached'])
+        assert result.output.rstrip().endswith('0 files with violations in 0 files')
+        repo_with_style_errors.git.checkout('--orphan', 'orphan')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--since', 'auto'])
+        assert 'unable to find the merge base of HEAD and "develop"' in result.output
+
+
 @pytest.mark.skipif(not distutils.spawn.find_executable('clang-format'),
                     reason="requires clang-format")
 def test_dirty_style(repo_with_style_errors):
@@ -207,8 +489,104 @@ def test_dirty_style(repo_with_style_errors):
         repo_with_style_errors.git.add('temp.h')
         with open('temp.h', 'a') as f:
             f.write('//another')
-        result = runner.invoke(zazu.cli.cli, ['style', '--cached'])
-        assert result.output.rstrip().endswith('File "temp.h" must have a trailing newline')
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '-v'])
+        assert result.exit_code == 0
+        assert result.output.rstrip().endswith('1 files fixed in 3 files')
+        assert 'temp.h' in repo_with_style_errors.git.diff('--cached', '--name-only')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--cached', '-v'])
+        assert result.output.rstrip().endswith('0 files with violations in 3 files')
+        # The unstaged modification is preserved in the working tree.
+        with open('temp.h') as f:
+            assert f.read().endswith('//another')
+
+
+@pytest.mark.skipif(not distutils.spawn.find_executable('clang-format'),
+                    reason="requires clang-format")
+def test_ranged_style(repo_with_style):
+    dir = repo_with_style.working_tree_dir
+    bad_style = 'int  a ( ) { }\nint  b ( ) { }\nint  c ( ) { }\n'
+    with zazu.util.cd(dir):
+        with open('zazu.yaml', 'w') as f:
+            f.write("style:\n  - stylers:\n      - type: clang-format\n        ranged: True\n"
+                    "        options: ['-style=google']\n")
+        with open('temp.c', 'w') as f:
+            f.write(bad_style)
+        repo_with_style.index.add(['zazu.yaml', 'temp.c'])
+        repo_with_style.index.commit('add badly styled file')
+        with open('temp.c', 'w') as f:
+            f.write(bad_style.replace('b ( )', 'bb ( )'))
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--cached', '-v'])
+        assert result.output.rstrip().endswith('0 files with violations in 0 files')
+        repo_with_style.git.add('temp.c')
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '-v'])
+        assert result.exit_code == 0
+        assert result.output.rstrip().endswith('1 files fixed in 1 files')
+        with open('temp.c') as f:
+            assert f.read() == 'int  a ( ) { }\nint bb() {}\nint  c ( ) { }\n'
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--cached', '-v'])
+        assert result.output.rstrip().endswith('0 files with violations in 1 files')
+        # Whole files are styled when the run isn't limited to changed files.
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v'])
+        assert result.output.rstrip().endswith('1 files with violations in 1 files')
+
+
+def test_in_shard():
+    files = ['file{}.py'.format(i) for i in range(100)]
+    shards = [[f for f in files if zazu.style.in_shard(f, (i, 3))] for i in range(1, 4)]
+    assert sorted(sum(shards, [])) == sorted(files)
+    assert all(shards)
+    assert zazu.style.in_shard(os.path.join('a', 'b.py'), (1, 2)) == zazu.style.in_shard('a/b.py', (1, 2))
+    assert all(zazu.style.in_shard(f, (1, 1)) for f in files)
+
+
+def test_merge_reports():
+    def report(shard, violations, files=2):
+        return {'shard': shard, 'check': True, 'files': files, 'violations': violations}
+    assert zazu.style.merge_reports([report([2, 2], ['b.py']), report([1, 2], ['a.py'])]) == (4, ['a.py', 'b.py'])
+    assert zazu.style.merge_reports([report(None, [])]) == (2, [])
+    with pytest.raises(click.ClickException) as e:
+        zazu.style.merge_reports([report([1, 3], []), report([3, 3], [])])
+    assert 'missing reports for shard 2/3' in str(e.value)
+    with pytest.raises(click.ClickException) as e:
+        zazu.style.merge_reports([report([1, 2], []), report([1, 2], []), report([2, 2], [])])
+    assert '2 reports for shard 1/2' in str(e.value)
+    with pytest.raises(click.ClickException):
+        zazu.style.merge_reports([report([1, 1], []), report([1, 2], []), report([2, 2], [])])
+    with pytest.raises(click.ClickException):
+        zazu.style.merge_reports([report(None, []), report([1, 1], [])])
+
+
+def test_shard(repo_with_style, tmp_dir):
+    dir = repo_with_style.working_tree_dir
+    with zazu.util.cd(dir):
+        for i in range(6):
+            write_py_file_with_bad_style('temp{}.py'.format(i))
+        runner = click.testing.CliRunner()
+        reports = []
+        for i in range(1, 4):
+            reports.append(os.path.join(tmp_dir, 'report{}.json'.format(i)))
+            result = runner.invoke(zazu.cli.cli, ['style', '--check', '--shard', '{}/3'.format(i),
+                                                  '--report-json', reports[-1]])
+            with open(reports[-1]) as f:
+                report = json.load(f)
+            assert report['shard'] == [i, 3]
+            assert result.exit_code == (-1 if report['violations'] else 0)
+        result = runner.invoke(zazu.cli.cli, ['style-merge', '-v'] + reports)
+        assert result.exit_code
+        assert result.output.count('FAIL') == 6
+        assert result.output.rstrip().endswith('6 files with violations in 6 files')
+        result = runner.invoke(zazu.cli.cli, ['style-merge'] + reports[1:])
+        assert result.exit_code == 1
+        assert 'missing reports for shard 1/3' in result.output
+        for arg in ['0/3', '4/3', '1', 'a/b']:
+            result = runner.invoke(zazu.cli.cli, ['style', '--check', '--shard', arg])
+            assert result.exit_code == 2
+        result = runner.invoke(zazu.cli.cli, ['style', '--shard', '1/1', '--report-json', reports[0]])
+        assert result.exit_code == 0
+        result = runner.invoke(zazu.cli.cli, ['style-merge', reports[0]])
+        assert result.exit_code == 0
+        assert result.output.rstrip() == '6 files fixed in 6 files'
 
 
 def test_style_no_config(repo_with_missing_style):
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+import click.testing
+import functools
+import git
+import os
+import pytest
+import subprocess
+import zazu.cli
+import zazu.plugins.generic_styler
+import zazu.style
+import zazu.style_cache
+import zazu.styler
+import zazu.util
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2019"
+
+
+class UpperStyler(zazu.styler.Styler):
+
+    calls = 0
+
+    def style_string(self, string, filepath):
+        UpperStyler.calls += 1
+        return string.upper()
+
+    @staticmethod
+    def type():
+        return 'upper'
+
+    def version(self):
+        return '1.0'
+
+
+def test_blob_id(tmp_dir):
+    path = os.path.join(tmp_dir, 'file')
+    with open(path, 'w') as f:
+        f.write('hello\n')
+    expected = subprocess.check_output(['git', 'hash-object', path], universal_newlines=True).strip()
+    assert zazu.style_cache.blob_id('hello\n') == expected
+
+
+def test_chain_fingerprint():
+    a = UpperStyler(options=['-a'])
+    b = UpperStyler(options=['-b'])
+    assert zazu.style_cache.chain_fingerprint([a, b]) == zazu.style_cache.chain_fingerprint([a, b])
+    assert zazu.style_cache.chain_fingerprint([a, b]) != zazu.style_cache.chain_fingerprint([b, a])
+    assert zazu.style_cache.chain_fingerprint([a]) != zazu.style_cache.chain_fingerprint([a, b])
+
+
+def write(path, contents):
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+def test_file_fingerprint(tmp_dir, mocker):
+    import zazu.plugins.clang_format_styler
+    mocker.patch('zazu.styler.Styler.version', return_value='1.0')
+    styler = zazu.plugins.clang_format_styler.Styler()
+    os.makedirs(os.path.join(tmp_dir, 'a', 'b'))
+    top = os.path.join(tmp_dir, 'a', 'top.cpp')
+    nested = os.path.join(tmp_dir, 'a', 'b', 'nested.cpp')
+    fingerprints = {path: zazu.style_cache.chain_fingerprint([styler], path) for path in [top, nested]}
+    assert fingerprints[top] == fingerprints[nested]
+    assert fingerprints[top] != zazu.style_cache.chain_fingerprint([styler])
+    write(os.path.join(tmp_dir, 'a', 'b', '.clang-format'), 'BasedOnStyle: LLVM\n')
+    # Config files are only discovered again once the styler is refreshed.
+    assert zazu.style_cache.chain_fingerprint([styler], nested) == fingerprints[nested]
+    styler.refresh()
+    assert zazu.style_cache.chain_fingerprint([styler], top) == fingerprints[top]
+    assert zazu.style_cache.chain_fingerprint([styler], nested) != fingerprints[nested]
+    write(os.path.join(tmp_dir, '.clang-format'), 'BasedOnStyle: LLVM\n')
+    styler.refresh()
+    assert zazu.style_cache.chain_fingerprint([styler], top) != fingerprints[top]
+    nested_fingerprint = zazu.style_cache.chain_fingerprint([styler], nested)
+    write(os.path.join(tmp_dir, 'a', 'b', '.clang-format'), 'BasedOnStyle: Google\n')
+    styler.refresh()
+    assert zazu.style_cache.chain_fingerprint([styler], nested) != nested_fingerprint
+
+
+def test_eslint_fingerprint(tmp_dir, mocker):
+    import zazu.plugins.eslint_styler
+    mocker.patch('zazu.styler.Styler.version', return_value='1.0')
+    eslint_dir = os.path.join(tmp_dir, 'node_modules', 'eslint')
+    os.makedirs(os.path.join(eslint_dir, 'bin'))
+    write(os.path.join(eslint_dir, 'bin', 'eslint.js'), '')
+    write(os.path.join(eslint_dir, 'package.json'), '{"version": "5.0.0"}')
+    with zazu.util.cd(tmp_dir):
+        styler = zazu.plugins.eslint_styler.Styler()
+        assert styler.tool_id('a.js') == [os.path.join('node_modules', 'eslint', 'bin', 'eslint.js'), '5.0.0']
+        fingerprint = styler.fingerprint('a.js')
+        write(os.path.join(eslint_dir, 'package.json'), '{"version": "6.0.0"}')
+        styler.refresh()
+        assert styler.fingerprint('a.js') != fingerprint
+
+
+def test_fingerprint_tool_location(tmp_dir, mocker):
+    fingerprints = []
+    for name in ['a', 'b']:
+        os.mkdir(os.path.join(tmp_dir, name))
+        tool = os.path.join(tmp_dir, name, 'tool')
+        write(tool, '#!/bin/sh\necho 1.0\n')
+        os.chmod(tool, 0o755)
+        mocker.patch.dict(os.environ, {'PATH': os.path.dirname(tool)})
+        styler = zazu.plugins.generic_styler.Styler(command='tool')
+        styler.refresh()
+        assert styler.version() == '1.0'
+        fingerprints.append(styler.fingerprint(os.path.join(tmp_dir, 'x.py')))
+    assert fingerprints[0] == fingerprints[1]
+
+
+def test_version_refresh(tmp_dir):
+    tool = os.path.join(tmp_dir, 'tool')
+    write(tool, '#!/bin/sh\necho 1.0\n')
+    os.chmod(tool, 0o755)
+    styler = zazu.styler.Styler(command=tool)
+    styler.refresh()
+    assert styler.version() == '1.0'
+    styler.refresh()
+    assert styler._version == '1.0'
+    write(tool, '#!/bin/sh\necho 2.0.0\n')
+    styler.refresh()
+    assert styler.version() == '2.0.0'
+
+
+def test_ranged_fingerprint():
+    fingerprint = zazu.style_cache.chain_fingerprint([UpperStyler()])
+    ranged = zazu.style_cache.ranged_fingerprint(fingerprint, [(1, 2)])
+    assert ranged == zazu.style_cache.ranged_fingerprint(fingerprint, [(1, 2)])
+    assert ranged != fingerprint
+    assert ranged != zazu.style_cache.ranged_fingerprint(fingerprint, [(1, 3)])
+    assert ranged != zazu.style_cache.ranged_fingerprint(fingerprint, [])
+
+
+def test_style_cache_get_put(tmp_dir):
+    uut = zazu.style_cache.StyleCache(tmp_dir)
+    assert uut.get('blob', 'fp', 'foo') is None
+    assert not uut.is_clean('blob', 'fp')
+    uut.put('blob', 'fp', 'foo', 'foo')
+    assert uut.get('blob', 'fp', 'foo') == 'foo'
+    assert uut.is_clean('blob', 'fp')
+    uut.put('blob2', 'fp', 'bar', 'BAR')
+    assert uut.get('blob2', 'fp', 'bar') == 'BAR'
+    assert not uut.is_clean('blob2', 'fp')
+    assert uut.get('blob2', 'other_fp', 'bar') is None
+    # A new instance sees the persisted results.
+    assert zazu.style_cache.StyleCache(tmp_dir).get('blob2', 'fp', 'bar') == 'BAR'
+
+
+def test_style_cache_prune(tmp_dir):
+    uut = zazu.style_cache.StyleCache(tmp_dir, max_size=25)
+    for i in range(5):
+        uut.put('blob{}'.format(i), 'fp', 'x', 'y' * 10)
+        entry_path = uut._entry_path('blob{}'.format(i), 'fp')
+        os.utime(entry_path, (i, i))
+    uut.prune()
+    assert [uut.get('blob{}'.format(i), 'fp', 'x') is not None for i in range(5)] == [False, False, False, True, True]
+
+
+def test_notes_style_cache(git_repo, tmp_dir):
+    dir = git_repo.working_tree_dir
+    uut = zazu.style_cache.NotesStyleCache(dir)
+    foo = zazu.style_cache.blob_id('foo')
+    bar = zazu.style_cache.blob_id('bar')
+    assert uut.get(foo, 'fp', 'foo') is None
+    uut.put(foo, 'fp', 'foo', 'foo')
+    uut.put(bar, 'fp', 'bar', u'BAR ✓')
+    uut.prune()
+    assert git_repo.git.notes('--ref', zazu.style_cache.DEFAULT_NOTES_REF, 'show', foo) == 'fp {}'.format(foo)
+    # Another clone that has fetched the notes uses them before its own local cache.
+    clone = git.Repo.clone_from(dir, os.path.join(tmp_dir, 'clone'))
+    clone.git.fetch('origin', '{0}:{0}'.format(zazu.style_cache.DEFAULT_NOTES_REF))
+    local = zazu.style_cache.StyleCache(os.path.join(tmp_dir, 'cache'))
+    uut = zazu.style_cache.NotesStyleCache(clone.working_tree_dir, local=local)
+    assert uut.is_clean(foo, 'fp')
+    assert not uut.is_clean(bar, 'fp')
+    assert uut.get(bar, 'fp', 'bar') == u'BAR ✓'
+    assert local.get(bar, 'fp', 'bar') == u'BAR ✓'
+    assert uut.get(bar, 'other_fp', 'bar') is None
+    # Only new results are written, and they are added to the existing notes of a blob.
+    head = clone.git.rev_parse(zazu.style_cache.DEFAULT_NOTES_REF)
+    uut.put(bar, 'fp', 'bar', u'BAR ✓')
+    uut.prune()
+    assert clone.git.rev_parse(zazu.style_cache.DEFAULT_NOTES_REF) == head
+    uut.put(bar, 'other_fp', 'bar', 'bar')
+    uut.prune()
+    assert clone.git.rev_parse(zazu.style_cache.DEFAULT_NOTES_REF + '^') == head
+    assert uut.get(bar, 'other_fp', 'bar') == 'bar'
+    assert uut.get(bar, 'fp', 'bar') == u'BAR ✓'
+
+
+def test_style_notes_config(repo_with_style):
+    dir = repo_with_style.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('zazu.yaml', 'a') as f:
+            f.write('style_cache:\n  notes: true\n')
+        with open('temp.py', 'w') as f:
+            f.write('x=1\n')
+        result = click.testing.CliRunner().invoke(zazu.cli.cli, ['style'])
+        assert result.exit_code == 0
+        note = repo_with_style.git.notes('--ref', zazu.style_cache.DEFAULT_NOTES_REF, 'show',
+                                         zazu.style_cache.blob_id('x=1\n'))
+        assert note.split()[1] == zazu.style_cache.blob_id('x = 1\n')
+
+
+def test_style_skips_known_clean_files(repo_with_style, mocker):
+    dir = repo_with_style.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('clean.py', 'w') as f:
+            f.write('x = 1\n')
+        repo_with_style.git.add('clean.py')
+        runner = click.testing.CliRunner()
+        assert runner.invoke(zazu.cli.cli, ['style', '--check']).exit_code == 0
+        read_file = mocker.patch('zazu.style.read_file', side_effect=zazu.style.read_file)
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v'])
+        assert result.exit_code == 0
+        assert 'clean.py' in result.output
+        assert read_file.call_count == 0
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--no-cache'])
+        assert read_file.call_count == 1
+        # A file that has changed since it was staged is read.
+        with open('clean.py', 'w') as f:
+            f.write('x=1\n')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v'])
+        assert result.exit_code
+        assert read_file.call_count == 2
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--cached', '-v'])
+        assert result.exit_code == 0
+        assert 'clean.py' in result.output
+
+
+def test_style_config_change_misses_cache(repo_with_style, mocker):
+    dir = repo_with_style.working_tree_dir
+    with zazu.util.cd(dir):
+        write('clean.py', 'x = 1\n')
+        repo_with_style.git.add('clean.py')
+        runner = click.testing.CliRunner()
+        assert runner.invoke(zazu.cli.cli, ['style', '--check']).exit_code == 0
+        read_file = mocker.patch('zazu.style.read_file', side_effect=zazu.style.read_file)
+        assert runner.invoke(zazu.cli.cli, ['style', '--check']).exit_code == 0
+        assert read_file.call_count == 0
+        # autopep8 reads setup.cfg, so files known to be clean are styled again once it changes.
+        write('setup.cfg', '[pycodestyle]\nmax-line-length = 100\n')
+        assert runner.invoke(zazu.cli.cli, ['style', '--check']).exit_code == 0
+        assert read_file.call_count
+
+
+def test_style_file_uses_cache(tmp_dir):
+    cache = zazu.style_cache.StyleCache(tmp_dir)
+    stylers = [UpperStyler()]
+    UpperStyler.calls = 0
+    assert zazu.style.style_file(stylers, 'a', lambda p: 'foo', None, cache) == ('a', stylers, True)
+    assert UpperStyler.calls == 1
+    assert zazu.style.style_file(stylers, 'b', lambda p: 'foo', None, cache) == ('b', stylers, True)
+    assert UpperStyler.calls == 1
+    assert zazu.style.style_file(stylers, 'c', lambda p: 'FOO', None, cache) == ('c', stylers, False)
+    assert zazu.style.style_file(stylers, 'c', lambda p: 'FOO', None, cache) == ('c', stylers, False)
+    assert UpperStyler.calls == 2
+    assert zazu.style.style_file(stylers, 'c', lambda p: 'FOO', None, None) == ('c', stylers, False)
+    assert UpperStyler.calls == 3
+
+
+def test_style_memo():
+    uut = zazu.style_cache.StyleMemo()
+    future, owner = uut.claim('blob', 'fp')
+    assert owner
+    same_future, owner = uut.claim('blob', 'fp')
+    assert not owner
+    assert same_future is future
+    assert uut.claim('blob', 'other fp')[1]
+    assert uut.hits == 1
+    assert uut.lookups == 3
+    assert uut.hit_rate() == 1 / 3.0
+    assert zazu.style_cache.StyleMemo().hit_rate() == 0
+
+
+def test_style_files_memo():
+    memo = zazu.style_cache.StyleMemo()
+    stylers = [UpperStyler()]
+    UpperStyler.calls = 0
+    contents = {'a': 'foo', 'b': 'bar', 'c': 'foo', 'd': 'BAR', 'e': 'bar', 'f': 'foo'}
+    work = [functools.partial(zazu.style.style_files, stylers, batch, contents.get, None, None, None, memo)
+            for batch in [['a', 'b'], ['c', 'd'], ['e', 'f']]]
+    results = sorted(r for results in zazu.util.dispatch(work, max_workers=3) for r in results)
+    assert [violation for _, _, violation in results] == [True, True, True, False, True, True]
+    assert UpperStyler.calls == 3
+    assert memo.hits == 3
+
+
+def test_style_files_memo_exception():
+    class FailingStyler(UpperStyler):
+        def style_string(self, string, filepath):
+            raise ValueError('bad style')
+
+    memo = zazu.style_cache.StyleMemo()
+    stylers = [FailingStyler()]
+    with pytest.raises(ValueError):
+        zazu.style.style_files(stylers, ['a'], lambda p: 'foo', None, memo=memo)
+    with pytest.raises(ValueError):
+        zazu.style.style_files(stylers, ['b'], lambda p: 'foo', None, memo=memo)
+
+
+def test_style_files_cache_exception():
+    class FailingCache(object):
+        def get(self, blob, fingerprint, string):
+            raise IOError('bad cache')
+
+    memo = zazu.style_cache.StyleMemo()
+    stylers = [UpperStyler()]
+    with pytest.raises(IOError):
+        zazu.style.style_files(stylers, ['a'], lambda p: 'foo', None, cache=FailingCache(), memo=memo)
+    # The claimed result is resolved, so files waiting on it don't hang.
+    future, owner = memo.claim(zazu.style_cache.blob_id('foo'), zazu.style_cache.chain_fingerprint(stylers, 'a'))
+    assert not owner
+    assert isinstance(future.exception(timeout=0), IOError)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import json
+import zazu.style
+import zazu.style_profile
+import zazu.styler
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2019"
+
+
+class NamedStyler(zazu.styler.Styler):
+
+    def style_string(self, string, filepath):
+        return string + '!'
+
+    @staticmethod
+    def type():
+        return 'named'
+
+
+def test_percentile():
+    assert zazu.style_profile.percentile([], 50) == 0
+    assert zazu.style_profile.percentile([3, 1, 2], 50) == 2
+    assert zazu.style_profile.percentile(list(range(1, 101)), 90) == 90
+    assert zazu.style_profile.percentile(list(range(1, 101)), 99) == 99
+    assert zazu.style_profile.percentile([5], 99) == 5
+
+
+def test_style_profile(tmp_dir):
+    uut = zazu.style_profile.StyleProfile()
+    a = NamedStyler('a')
+    b = NamedStyler('b')
+    uut.record_invocation(a, ['x', 'y'], 2.0, ['12', '34'], ['1234', '5678'])
+    uut.record_invocation(b, ['x'], 0.5, ['1'], ['1'])
+    assert uut.timed(lambda: 5)() == 5
+    uut.stop()
+    profile = uut.to_dict()
+    assert [f['path'] for f in profile['files']] == ['x', 'y']
+    assert profile['files'][0] == {'path': 'x', 'seconds': 1.5, 'stylers': ['a', 'b']}
+    assert profile['stylers']['a']['invocations'] == 1
+    assert profile['stylers']['a']['files'] == 2
+    assert profile['stylers']['a']['bytes_in'] == 4
+    assert profile['stylers']['a']['bytes_out'] == 8
+    assert profile['stylers']['a']['invocation_seconds']['total'] == 2.0
+    assert profile['stylers']['a']['file_seconds']['p50'] == 1.0
+    assert len(profile['queue_wait_seconds']) == 5
+    report = uut.format_report(top=1)
+    assert '1.500s  x (a, b)' in report
+    assert 'y (a)' not in report
+    path = tmp_dir + '/profile.json'
+    uut.write_json(path)
+    with open(path) as f:
+        assert json.load(f)['stylers']['b']['files'] == 1
+
+
+def test_style_files_profile():
+    uut = zazu.style_profile.StyleProfile()
+    stylers = [NamedStyler('a'), NamedStyler('b')]
+    results = zazu.style.style_files(stylers, ['p', 'q'], lambda p: p, None, profile=uut)
+    assert results == [('p', stylers, True), ('q', stylers, True)]
+    profile = uut.to_dict()
+    assert profile['stylers']['a']['bytes_out'] == 4
+    assert profile['stylers']['b']['bytes_in'] == 4
+    assert profile['stylers']['b']['bytes_out'] == 6
@@ -5,12 +5,14 @@ try:
 except (ImportError, AttributeError):
     pass
 import click
+import fnmatch
 import functools
 import PyInquirer
 import os
 import pytest
 import subprocess
 import tempfile
+import threading
 import time
 import zazu.util
 try:
@@ -44,6 +46,57 @@ def test_scan_tree():
     assert os.path.relpath(include_file, dir) in results
 
 
+def test_filter_paths():
+    dir = tempfile.mkdtemp()
+    paths = ['file.yes', 'file.no', '.hidden.yes', '.hidden/file.yes', 'sub/.hidden.yes', 'sub/file.yes',
+             'exclude/file.yes', 'sub/exclude/file.yes', 'sub/deep/file.yes', 'sub/deep/skip.yes']
+    for p in paths:
+        path = os.path.join(dir, *p.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        touch_file(path)
+    for exclude_hidden in [True, False]:
+        for excludes in [[], ['exclude'], ['sub/exclude', '*/skip.yes']]:
+            expected = zazu.util.scantree(dir, ['*.yes'], excludes, exclude_hidden=exclude_hidden)
+            results = zazu.util.filter_paths(paths, ['*.yes'], excludes, exclude_hidden=exclude_hidden)
+            assert sorted(results) == sorted(expected)
+
+
+def test_path_matcher():
+    includes = ['src/**.cpp', '*.h', 'tools/gen.py', 'lib?/*.c']
+    excludes = ['**/generated/**', 'dependency', '*_test.cpp']
+    uut = zazu.util.PathMatcher(includes, excludes)
+    files = ['src/a.cpp', 'src/b/c.cpp', 'src/a_test.cpp', 'a.h', 'x/y/z.h', 'src/generated/a.cpp', 'x/generated/a.h',
+             'dependency/a.h', 'tools/gen.py', 'tools/gen.pyc', 'lib1/a.c', 'lib/a.c', 'src/a.py']
+    for f in files:
+        expected = any(fnmatch.fnmatch(f, i) for i in includes) and not any(fnmatch.fnmatch(f, e) for e in excludes)
+        assert uut.match(f) == expected, f
+    assert uut.may_match_below('src')
+    assert uut.may_match_below('lib1')
+    assert not uut.may_match_below('src/generated')
+    assert not uut.may_match_below('x/y/generated')
+    assert not uut.may_match_below('dependency')
+    uut = zazu.util.PathMatcher(['src/**.cpp', 'tools/gen.py', 'lib?/*.c'], [])
+    assert uut.may_match_below('src')
+    assert uut.may_match_below('src/generated')
+    assert uut.may_match_below('tools')
+    assert uut.may_match_below('lib2')
+    assert not uut.may_match_below('tools/sub')
+    assert not uut.may_match_below('docs')
+    assert not zazu.util.PathMatcher([], []).may_match_below('src')
+    assert not zazu.util.PathMatcher([], []).match('src')
+
+
+def test_scan_tree_prunes(mocker):
+    dir = tempfile.mkdtemp()
+    for p in ['src/a.cpp', 'src/generated/b.cpp', 'src/generated/deep/c.cpp', 'docs/d.cpp']:
+        path = os.path.join(dir, *p.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        touch_file(path)
+    mocker.spy(os, 'scandir')
+    assert zazu.util.scantree(dir, ['src/*.cpp'], ['**/generated/**']) == [os.path.join('src', 'a.cpp')]
+    assert sorted(os.path.relpath(c[0][0], dir) for c in os.scandir.call_args_list) == ['.', 'src']
+
+
 def test_check_output(mocker):
     mocker.patch('subprocess.check_output', side_effect=OSError(''))
     with pytest.raises(click.ClickException):
@@ -220,6 +273,121 @@ def test_dispatch():
     assert time_taken < sum(times)
 
 
+def test_dispatch_bounded():
+    lock = threading.Lock()
+    state = {'in_flight': 0, 'peak': 0}
+
+    def work():
+        time.sleep(0.01)
+        with lock:
+            state['in_flight'] -= 1
+        return 1
+
+    def work_gen():
+        for i in range(20):
+            with lock:
+                state['in_flight'] += 1
+                state['peak'] = max(state['peak'], state['in_flight'])
+            yield work
+
+    assert sum(zazu.util.dispatch(work_gen(), max_workers=2, max_pending=3)) == 20
+    assert state['peak'] == 3
+
+
+def test_dispatch_exception():
+    def fail():
+        raise ValueError('foo')
+
+    with pytest.raises(ValueError):
+        list(zazu.util.dispatch([functools.partial(wait, 0.01), fail], max_workers=1))
+
+
+def test_dispatch_abort(mocker):
+    started = []
+    on_abort = mocker.Mock()
+
+    def work(i):
+        started.append(i)
+        time.sleep(0.01)
+        return i
+
+    results = zazu.util.dispatch([functools.partial(work, i) for i in range(10)], max_workers=1, max_pending=3,
+                                 on_abort=on_abort)
+    assert next(results) == 0
+    results.close()
+    assert on_abort.call_count == 1
+    assert len(started) < 4
+    on_abort.reset_mock()
+    assert list(zazu.util.dispatch([functools.partial(work, i) for i in range(3)], on_abort=on_abort)) != []
+    assert on_abort.call_count == 0
+
+
+def test_dispatch_exception_cancels():
+    started = []
+
+    def fail():
+        raise ValueError('foo')
+
+    work = [fail] + [functools.partial(started.append, i) for i in range(10)]
+    with pytest.raises(ValueError):
+        list(zazu.util.dispatch(work, max_workers=1, max_pending=5))
+    assert len(started) < 5
+
+
+def test_terminate_processes():
+    errors = []
+
+    def run():
+        try:
+            zazu.util.check_popen(['sleep', '10'])
+        except subprocess.CalledProcessError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    start = time.time()
+    thread.start()
+    while not zazu.util._running_processes:
+        time.sleep(0.01)
+    zazu.util.terminate_processes()
+    thread.join()
+    assert time.time() - start < 5
+    assert len(errors) == 1
+    assert not zazu.util._running_processes
+
+
+def test_cpu_count(mocker):
+    mocker.patch('os.sched_getaffinity', return_value={0, 1, 2, 3}, create=True)
+    mocker.patch('zazu.util._cgroup_cpu_quota', return_value=None)
+    assert zazu.util.cpu_count() == 4
+    zazu.util._cgroup_cpu_quota.return_value = 1.5
+    assert zazu.util.cpu_count() == 2
+    zazu.util._cgroup_cpu_quota.return_value = 0.1
+    assert zazu.util.cpu_count() == 1
+    zazu.util._cgroup_cpu_quota.return_value = 8
+    assert zazu.util.cpu_count() == 4
+
+
+def test_cgroup_cpu_quota(mocker):
+    files = {}
+
+    def fake_open(path, mode='r'):
+        if path not in files:
+            raise IOError(path)
+        return mocker.mock_open(read_data=files[path])()
+
+    mocker.patch('builtins.open', side_effect=fake_open)
+    assert zazu.util._cgroup_cpu_quota() is None
+    files['/sys/fs/cgroup/cpu/cpu.cfs_quota_us'] = '-1\n'
+    files['/sys/fs/cgroup/cpu/cpu.cfs_period_us'] = '100000\n'
+    assert zazu.util._cgroup_cpu_quota() is None
+    files['/sys/fs/cgroup/cpu/cpu.cfs_quota_us'] = '250000\n'
+    assert zazu.util._cgroup_cpu_quota() == 2.5
+    files['/sys/fs/cgroup/cpu.max'] = 'max 100000\n'
+    assert zazu.util._cgroup_cpu_quota() is None
+    files['/sys/fs/cgroup/cpu.max'] = '50000 100000\n'
+    assert zazu.util._cgroup_cpu_quota() == 0.5
+
+
 def test_async_do():
     start_time = time.time()
     result = zazu.util.async_do(wait, 0.2)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import click.testing
+import os
+import pytest
+import sys
+import zazu.cli
+import zazu.util
+import zazu.watch
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+
+class FakeWatcher(object):
+    """Returns the result of calling each of a list of functions from successive reads, then raises KeyboardInterrupt."""
+
+    def __init__(self, reads):
+        self._reads = list(reads)
+        self.closed = False
+
+    def read(self, timeout):
+        if not self._reads:
+            raise KeyboardInterrupt
+        return self._reads.pop(0)()
+
+    def close(self):
+        self.closed = True
+
+
+def write(path, contents):
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+def test_debounced_changes():
+    watcher = FakeWatcher([lambda: set(), lambda: {'a'}, lambda: {'b'}, lambda: set(),
+                           lambda: {'c'}, lambda: None,
+                           lambda: None])
+    changes = zazu.watch.debounced_changes(watcher)
+    assert next(changes) == {'a', 'b'}
+    assert next(changes) is None
+    assert next(changes) is None
+    with pytest.raises(KeyboardInterrupt):
+        next(changes)
+
+
+def test_debounced_changes_max_delay(mocker):
+    mocker.patch('time.time', side_effect=[0, 1, 3])
+    watcher = FakeWatcher([lambda: {'a'}, lambda: {'b'}, lambda: {'c'}])
+    assert next(zazu.watch.debounced_changes(watcher)) == {'a', 'b'}
+
+
+def make_watched_dirs(root):
+    for d in ['skip', os.path.join('keep', '.hidden'), '.top']:
+        os.makedirs(os.path.join(root, d))
+
+
+def check_watcher(watcher, root):
+    try:
+        write(os.path.join(root, 'a.py'), 'a')
+        os.makedirs(os.path.join(root, 'new', 'sub'))
+        write(os.path.join(root, 'new', 'sub', 'b.py'), 'b')
+        write(os.path.join(root, 'skip', 'c.py'), 'c')
+        # Like zazu.util.scantree, only hidden directories at the top of the tree are skipped.
+        write(os.path.join(root, 'keep', '.hidden', 'd.py'), 'd')
+        write(os.path.join(root, '.top', 'e.py'), 'e')
+        os.makedirs(os.path.join(root, 'new', '.gen'))
+        write(os.path.join(root, 'new', '.gen', 'f.py'), 'f')
+        expected = {'a.py', os.path.join('new', 'sub', 'b.py'), os.path.join('keep', '.hidden', 'd.py'),
+                    os.path.join('new', '.gen', 'f.py')}
+        changed = set()
+        for _ in range(20):
+            changed |= watcher.read(0.1)
+            if expected <= changed:
+                break
+        assert expected <= changed
+        assert os.path.join('skip', 'c.py') not in changed
+        assert os.path.join('.top', 'e.py') not in changed
+        os.remove(os.path.join(root, 'a.py'))
+        changed = set()
+        for _ in range(20):
+            changed |= watcher.read(0.1)
+            if changed:
+                break
+        assert changed == {'a.py'}
+    finally:
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='requires inotify')
+def test_inotify_watcher(tmp_dir):
+    make_watched_dirs(tmp_dir)
+    check_watcher(zazu.watch.InotifyWatcher(tmp_dir, lambda d: d != 'skip'), tmp_dir)
+
+
+def test_polling_watcher(tmp_dir):
+    make_watched_dirs(tmp_dir)
+    check_watcher(zazu.watch.PollingWatcher(tmp_dir, lambda d: d != 'skip', interval=0.01), tmp_dir)
+
+
+def test_style_watch(repo_with_style, mocker):
+    dir = repo_with_style.working_tree_dir
+    bad_style = 'def main():\tpass\n'
+    write(os.path.join(dir, 'temp.py'), bad_style)
+    write(os.path.join(dir, 'clean.py'), 'x = 1\n')
+    # zazu's own write of the initial fix and a file that is unchanged since the initial run read it.
+    watcher = FakeWatcher([lambda: {'temp.py', 'clean.py'}, lambda: set(),
+                           lambda: write('temp.py', bad_style) or write('temp.txt', bad_style) or {'temp.py', 'temp.txt'},
+                           lambda: set(),
+                           lambda: write('.zazu-0-temp.py', bad_style) or {'.zazu-0-temp.py'}, lambda: set()])
+    mocker.patch('zazu.watch.make_watcher', return_value=watcher)
+    with zazu.util.cd(dir):
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--watch', '-v'])
+        assert result.exit_code == 0
+        assert watcher.closed
+        with open('temp.py') as f:
+            assert f.read() != bad_style
+        # Once for the initial run and once for the change made after it.
+        assert result.output.count('temp.py') == 2
+        assert result.output.count('clean.py') == 1
+        assert 'temp.txt' not in result.output
+        assert '.zazu-0-temp.py' not in result.output
+        result = runner.invoke(zazu.cli.cli, ['style', '--watch', '--cached'])
+        assert result.exit_code == 2
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 """Entry point for zazu."""
 import click
+import sys
 import zazu.config
+import zazu.daemon
 import zazu.dev.commands
 import zazu.repo.commands
 import zazu.style
@@ -11,22 +13,32 @@ __author__ = 'Nicholas Wiles'
 __copyright__ = 'Copyright 2016'
 
 
-@click.group()
+@click.group(cls=zazu.config.PreloadGroup)
 @click.version_option(version=zazu.__version__)
 def cli():
     """Entry point for zazu cli."""
     pass
 
 
+def main():
+    """Entry point for the zazu executable, commands are run by the zazu daemon if it is running."""
+    exit_code = zazu.daemon.forward(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+    cli()
+
+
 def init():
     """Run on startup to allow zazu to be run as a module."""
     if __name__ == '__main__':
-        cli()
+        main()
 
 
 cli.add_command(zazu.upgrade.upgrade)
 cli.add_command(zazu.style.style)
+cli.add_command(zazu.style.style_merge)
 cli.add_command(zazu.config.config)
+cli.add_command(zazu.daemon.daemon)
 cli.add_command(zazu.dev.commands.dev)
 cli.add_command(zazu.repo.commands.repo)
 init()
@@ -4,17 +4,22 @@
 import zazu.imports
 zazu.imports.lazy_import(locals(), [
     'click',
+    'copy',
     'dict_recursive_update',
     'git',
     'importlib',
+    'json',
     'os',
     'ruamel.yaml',
     'subprocess',
     'sys',
+    'tempfile',
+    'time',
     'zazu.code_reviewer',
     'zazu.git_helper',
     'zazu.issue_tracker',
     'zazu.scm_host',
+    'zazu.style_cache',
     'zazu.util',
 ])
 
@@ -23,6 +28,10 @@ __copyright__ = 'Copyright 2016'
 
 PROJECT_FILE_NAMES = ['zazu.yaml', '.zazu.yaml']
 
+# Files modified more recently than this (in seconds) aren't cached, as a change made within the resolution of the file
+# system's timestamps wouldn't change the modification time.
+RACY_MODIFICATION_TIME = 2
+
 
 class PluginFactory(object):
     """A genetic plugin factory that uses the type field of the config to create the appropriate class."""
@@ -133,12 +142,29 @@ def find_file(search_paths, file_names):
     return None
 
 
-def load_yaml_file(filepath):
-    """Load a yaml file."""
+def load_yaml_file(filepath, round_trip=False, cache=None):
+    """Load a yaml file.
+
+    Args:
+        filepath (str): the file to load.
+        round_trip (bool): keep the comments and formatting of the file so that it can be written back, otherwise a
+            faster loader is used.
+        cache (ParsedConfigCache): the cache of parsed files to use, if any. It isn't used for round trip loads.
+
+    """
+    if cache is not None and not round_trip:
+        return cache.load(filepath)
     with open(filepath, 'r') as f:
+        contents = f.read()
         try:
-            yaml = ruamel.yaml.YAML()
-            config = yaml.load(f)
+            if not round_trip:
+                try:
+                    config = ruamel.yaml.YAML(typ='safe').load(contents)
+                except ruamel.yaml.YAMLError:
+                    # The safe loader is stricter about some plain scalars (e.g. urls in flow mappings).
+                    round_trip = True
+            if round_trip:
+                config = ruamel.yaml.YAML().load(contents)
             if config is None:
                 config = {}
         except ruamel.yaml.YAMLError as e:
@@ -152,15 +178,85 @@ def load_yaml_file(filepath):
         return config
 
 
-def find_and_load_yaml_file(search_paths, file_names):
+def find_and_load_yaml_file(search_paths, file_names, cache=None):
     """Find and load a yaml file."""
     filepath = find_file(search_paths, file_names)
     if filepath is not None:
-        return load_yaml_file(filepath)
+        return load_yaml_file(filepath, cache=cache)
     searched = path_gen(search_paths, file_names)
     raise click.ClickException('no yaml file found, searched:{}'.format(zazu.util.pprint_list(searched)))
 
 
+def config_cache_path(repo):
+    """Get the path of the cache of parsed config files for a repo."""
+    return os.path.join(repo.git_dir, 'zazu', 'config_cache.json')
+
+
+class ParsedConfigCache(object):
+    """Caches parsed config files in a json file, keyed on their path, modification time and size.
+
+    Only files that json represents faithfully are cached, others are parsed every time.
+
+    """
+
+    def __init__(self, path):
+        """Constructor.
+
+        Args:
+            path (str): the json file to store the cache in.
+
+        """
+        self._path = path
+        self._entries = None
+
+    def _read(self):
+        if self._entries is None:
+            try:
+                with open(self._path, 'r') as f:
+                    self._entries = json.load(f)
+                if not isinstance(self._entries, dict):
+                    self._entries = {}
+            except (IOError, OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _write(self):
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self._path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self._path)
+        except (IOError, OSError):
+            pass  # The cache is best effort only.
+
+    def load(self, filepath):
+        """Load a yaml file, parsing it only if it has changed since it was cached.
+
+        Args:
+            filepath (str): the file to load.
+
+        Returns:
+            dict: the parsed file.
+
+        """
+        key = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        entry = self._read().get(key)
+        if entry is not None and entry.get('mtime') == stat.st_mtime_ns and entry.get('size') == stat.st_size:
+            return copy.deepcopy(entry['config'])
+        config = load_yaml_file(filepath)
+        if time.time() - stat.st_mtime > RACY_MODIFICATION_TIME:
+            try:
+                cacheable = json.loads(json.dumps(config)) == config
+            except (TypeError, ValueError):
+                cacheable = False
+            if cacheable:
+                self._entries[key] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'config': copy.deepcopy(config)}
+                self._write()
+        return config
+
+
 def user_config_filepath():
     """User configuration file path."""
     return os.path.join(os.path.expanduser('~'), '.zazuconfig.yaml')
@@ -169,9 +265,18 @@ def user_config_filepath():
 class ConfigFile(object):
     """Holds a parsed config file and can write changes to disk."""
 
-    def __init__(self, path):
-        """Store path and read the contents from disk if it exists."""
+    def __init__(self, path, round_trip=False, cache=None):
+        """Store path and read the contents from disk if it exists.
+
+        Args:
+            path (str): the path of the config file.
+            round_trip (bool): read the file so that its comments and formatting are kept when it is written.
+            cache (ParsedConfigCache): the cache of parsed files to read from, if any.
+
+        """
         self._path = path
+        self._round_trip = round_trip
+        self._cache = cache
         self.dict = {}
         if self.exists():
             self.read()
@@ -182,10 +287,10 @@ class ConfigFile(object):
 
     def read(self):
         """Read config file from disk."""
-        self.dict = load_yaml_file(self._path)
+        self.dict = load_yaml_file(self._path, round_trip=self._round_trip, cache=self._cache)
 
     def write(self):
-        """Write config file to disk."""
+        """Write config file to disk, its comments and formatting are only kept if it was read with round_trip."""
         yaml = ruamel.yaml.YAML()
         with open(self._path, 'w') as f:
             yaml.dump(self.dict, f)
@@ -204,6 +309,7 @@ class Config(object):
                 self.repo = git.Repo(self.repo_root)
             except git.InvalidGitRepositoryError:
                 self.repo = None
+        self._config_cache = None
         self._issue_tracker = None
         self._code_reviewer = None
         self._scm_hosts = None
@@ -211,6 +317,7 @@ class Config(object):
         self._project_config = None
         self._user_config = None
         self._stylers = None
+        self._style_cache = None
 
     def issue_tracker(self):
         """Lazily create a IssueTracker object."""
@@ -299,7 +406,8 @@ class Config(object):
         """Parse and return the zazu yaml configuration file."""
         if self._project_config is None:
             self.check_repo()
-            self._project_config = find_and_load_yaml_file([self.repo_root], PROJECT_FILE_NAMES)
+            self._project_config = find_and_load_yaml_file([self.repo_root], PROJECT_FILE_NAMES,
+                                                           cache=self.config_cache())
             required_zazu_version = self._project_config.get('zazu', '')
             if required_zazu_version and required_zazu_version != zazu.__version__:
                 zazu.util.warn('this repo has requested zazu {}, which doesn\'t match the installed version ({}). '
@@ -309,7 +417,7 @@ class Config(object):
     def user_config(self):
         """Parse and return the global zazu yaml configuration file."""
         if self._user_config is None:
-            self._user_config = ConfigFile(user_config_filepath()).dict
+            self._user_config = ConfigFile(user_config_filepath(), cache=self.config_cache()).dict
         return self._user_config
 
     def stylers(self):
@@ -318,6 +426,19 @@ class Config(object):
             self._stylers = styler_factory(self.project_config().get('style', {}))
         return self._stylers
 
+    def style_cache(self):
+        """Lazily create the StyleCache for the repo, layered under a NotesStyleCache if notes are enabled."""
+        if self._style_cache is None:
+            self.check_repo()
+            self._style_cache = zazu.style_cache.StyleCache(zazu.style_cache.default_path(self.repo))
+            cache_config = self.project_config().get('style_cache', {})
+            if cache_config.get('notes', False):
+                self._style_cache = zazu.style_cache.NotesStyleCache(self.repo_root,
+                                                                     cache_config.get('notes_ref',
+                                                                                      zazu.style_cache.DEFAULT_NOTES_REF),
+                                                                     self._style_cache)
+        return self._style_cache
+
     def develop_branch_name(self):
         """Get the branch name for develop branch."""
         try:
@@ -342,6 +463,12 @@ class Config(object):
         """Return the version of zazu requested by the config file."""
         return self.project_config().get('zazu', '')
 
+    def config_cache(self):
+        """Return the cache of parsed config files, or None if there is no repo to store it in."""
+        if self._config_cache is None and getattr(self, 'repo', None) is not None:
+            self._config_cache = ParsedConfigCache(config_cache_path(self.repo))
+        return self._config_cache
+
     def check_repo(self):
         """Check that the config has a valid repo set."""
         if self.repo_root is None or self.repo is None:
@@ -351,6 +478,54 @@ class Config(object):
 pass_config = click.make_pass_decorator(Config, ensure=True)
 
 
+# The libraries that each type of issue tracker uses.
+ISSUE_TRACKER_MODULES = {
+    'github': ['github'],
+    'jira': ['jira'],
+}
+
+
+def issue_tracker_modules(config):
+    """Get the libraries that the project's issue tracker uses, for commands to preload."""
+    try:
+        return ISSUE_TRACKER_MODULES.get(config.issue_tracker_config().get('type'), [])
+    except click.ClickException:
+        return []
+
+
+def preload(*module_names):
+    """Declare the modules that a command is likely to use, which a PreloadGroup imports once it picks the command.
+
+    Functions that take the Config and return a list of modules (such as issue_tracker_modules) can be used in place
+    of module names. They are called before the command runs with the same Config that the command is passed.
+
+    """
+    def decorator(command):
+        command.preload_modules = module_names
+        return command
+    return decorator
+
+
+class PreloadGroup(click.Group):
+    """A click group that imports the modules declared by its commands in the background as soon as one is picked.
+
+    Nothing is imported for shell completion or help requests.
+
+    """
+
+    def resolve_command(self, ctx, args):
+        """Resolve a command and start importing its modules, see click.MultiCommand.resolve_command."""
+        cmd_name, cmd, args = super(PreloadGroup, self).resolve_command(ctx, args)
+        module_names = getattr(cmd, 'preload_modules', None)
+        if module_names and not ctx.resilient_parsing and not set(args) & set(ctx.help_option_names):
+            if any(callable(name) for name in module_names):
+                # Functions are called here rather than on the preload thread so that the config is only parsed once.
+                config = ctx.ensure_object(Config)
+                module_names = [n for name in module_names for n in (name(config) if callable(name) else [name])]
+            zazu.imports.preload(module_names)
+        return cmd_name, cmd, args
+
+
 def maybe_write_default_user_config(path):
     """Write a default user config file if it doesn't exist."""
     DEFAULT_USER_CONFIG = """# User configuration file for zazu.
@@ -377,6 +552,7 @@ def complete_param(ctx, args, incomplete):
     return sorted([param for param in flattened.keys() if incomplete in param])
 
 
+@preload('ruamel.yaml')
 @click.command()
 @click.pass_context
 @click.option('-l', '--list', is_flag=True, help='list config')
@@ -402,7 +578,7 @@ def config(ctx, list, add, unset, show_origin, param_name, param_value):
     user_config_path = user_config_filepath()
     maybe_write_default_user_config(user_config_path)
 
-    config_file = ConfigFile(user_config_path)
+    config_file = ConfigFile(user_config_path, round_trip=True)
     config_dict = config_file.dict
 
     write_config = False
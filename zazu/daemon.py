@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""Long lived zazu daemon that keeps configuration warm between invocations."""
+import zazu.imports
+zazu.imports.lazy_import(locals(), [
+    'click',
+    'click.testing',
+    'json',
+    'os',
+    'socket',
+    'socketserver',
+    'struct',
+    'subprocess',
+    'sys',
+    'tempfile',
+    'threading',
+    'time',
+    'traceback',
+    'zazu.cli',
+    'zazu.config',
+    'zazu.git_helper',
+    'zazu.util',
+])
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+# Commands that are run by the daemon when it is running, they must not prompt for input.
+FORWARDED_COMMANDS = ['style']
+
+# The environment of the client is applied to the daemon while a command runs, git hooks rely on these variables.
+FORWARDED_ENV_PREFIXES = ('GIT_', 'ZAZU_')
+
+START_TIMEOUT = 10
+
+_HEADER = struct.Struct('>I')
+
+
+def supported():
+    """Return True if the daemon can run on this platform."""
+    return hasattr(socket, 'AF_UNIX')
+
+
+def socket_path():
+    """Get the path of the per user daemon socket."""
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, 'zazu-{}.sock'.format(os.getuid()))
+
+
+def send_message(sock, message):
+    """Send a json serializable message on a socket."""
+    data = json.dumps(message).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 16))
+        if not chunk:
+            raise EOFError('connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock):
+    """Receive a message sent by send_message()."""
+    size, = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return json.loads(_recv_exactly(sock, size).decode('utf-8'))
+
+
+def connect(path=None, timeout=None):
+    """Connect to the daemon.
+
+    Raises:
+        OSError: if the daemon isn't running or the socket isn't owned by this user.
+
+    """
+    path = socket_path() if path is None else path
+    if os.stat(path).st_uid != os.getuid():
+        raise OSError('{} is not owned by the current user'.format(path))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request(message, path=None, timeout=None):
+    """Send a request to the daemon and return its response."""
+    sock = connect(path, timeout)
+    with sock:
+        send_message(sock, message)
+        return recv_message(sock)
+
+
+def _package_dir():
+    return os.path.dirname(os.path.abspath(zazu.__file__))
+
+
+def forward(args, path=None):
+    """Run a command in the daemon if it is running and the command can be forwarded.
+
+    Args:
+        args (list of str): the command line arguments (without the program name).
+        path (str): the daemon socket path, defaults to socket_path().
+
+    Returns:
+        int: the exit code of the command or None if it should be run in process.
+
+    """
+    if not args or args[0] not in FORWARDED_COMMANDS or not supported() or os.environ.get('ZAZU_NO_DAEMON'):
+        return None
+    if '--watch' in args:
+        return None  # Watching never finishes, so it would block the daemon.
+    message = {'command': 'run',
+               'args': args,
+               'cwd': os.getcwd(),
+               'env': {k: v for k, v in os.environ.items() if k.startswith(FORWARDED_ENV_PREFIXES)},
+               'color': sys.stdout.isatty(),
+               'package': _package_dir()}
+    try:
+        response = request(message, path)
+    except (OSError, EOFError, ValueError):
+        return None
+    if 'error' in response:
+        return None
+    sys.stdout.write(response['output'])
+    sys.stdout.flush()
+    return response['exit_code']
+
+
+def config_signature(repo_root):
+    """Get the size and modification time of each config file that a repo's Config depends on."""
+    paths = [os.path.join(repo_root, f) for f in zazu.config.PROJECT_FILE_NAMES]
+    paths.append(zazu.config.user_config_filepath())
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+class Daemon(object):
+    """Runs zazu commands on behalf of clients using Config objects that are kept warm per repo.
+
+    Commands are run one at a time because they change the working directory and environment of the process. A repo's
+    Config (and the plugins, stylers and style cache that it holds) is rebuilt when any of its config files change.
+
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._lock = threading.Lock()
+        self._configs = {}
+        self._start = time.time()
+        self._commands_run = 0
+
+    def config(self, repo_root):
+        """Get the Config for a repo, rebuilding it if its config files have changed."""
+        signature = config_signature(repo_root)
+        try:
+            cached_signature, config = self._configs[repo_root]
+            if cached_signature == signature:
+                return config
+        except KeyError:
+            pass
+        config = zazu.config.Config(repo_root)
+        self._configs[repo_root] = (signature, config)
+        return config
+
+    def run(self, args, cwd, env, color=False):
+        """Run a zazu command.
+
+        Args:
+            args (list of str): the command line arguments.
+            cwd (str): the working directory of the client.
+            env (dict): environment variables to set while the command runs, other variables with a forwarded prefix
+                are removed.
+            color (bool): True if the output should keep ANSI styling.
+
+        Returns:
+            dict: the output and exit_code of the command.
+
+        """
+        env = dict(env)
+        for k in os.environ:
+            if k.startswith(FORWARDED_ENV_PREFIXES) and k not in env:
+                env[k] = None
+        with self._lock:
+            self._commands_run += 1
+            with zazu.util.cd(cwd):
+                repo_root = zazu.git_helper.get_repo_root(cwd)
+                config = self.config(repo_root) if repo_root is not None else zazu.config.Config()
+                result = click.testing.CliRunner().invoke(zazu.cli.cli, args, obj=config, env=env, color=color)
+        output = result.output
+        if result.exc_info is not None and not isinstance(result.exception, SystemExit):
+            output += ''.join(traceback.format_exception(*result.exc_info))
+        return {'output': output, 'exit_code': result.exit_code}
+
+    def status(self):
+        """Get a description of the daemon state, this doesn't wait for a running command to finish."""
+        return {'pid': os.getpid(),
+                'uptime': time.time() - self._start,
+                'commands_run': self._commands_run,
+                'repos': sorted(self._configs),
+                'package': _package_dir()}
+
+    def handle(self, message):
+        """Handle a request from a client and return the response."""
+        command = message.get('command')
+        if command == 'run':
+            if message.get('package') != _package_dir():
+                return {'error': 'the daemon is running a different zazu installation'}
+            return self.run(message['args'], message['cwd'], message['env'], message.get('color', False))
+        if command == 'status':
+            return self.status()
+        return {'error': 'unknown command "{}"'.format(command)}
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        try:
+            message = recv_message(self.request)
+        except (OSError, EOFError, ValueError):
+            return
+        if message.get('command') == 'stop':
+            send_message(self.request, {'stopping': True})
+            threading.Thread(target=self.server.shutdown).start()
+            return
+        try:
+            response = self.server.zazu_daemon.handle(message)
+        except Exception:
+            response = {'error': traceback.format_exc()}
+        try:
+            send_message(self.request, response)
+        except OSError:
+            pass  # The client went away.
+
+
+def serve(path=None):
+    """Run the daemon until it is told to stop."""
+    path = socket_path() if path is None else path
+    try:
+        os.remove(path)  # Remove the socket of a daemon that didn't exit cleanly.
+    except OSError:
+        pass
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(path, _RequestHandler)
+    finally:
+        os.umask(old_umask)
+    server.daemon_threads = True
+    server.zazu_daemon = Daemon()
+    # Commands run on request threads, so the workers of the process pool (used by in process stylers) are started
+    # while this is the only thread.
+    zazu.util.process_pool()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def is_running(path=None):
+    """Return True if a daemon is listening on the socket."""
+    try:
+        request({'command': 'status'}, path, timeout=START_TIMEOUT)
+    except (OSError, EOFError, ValueError):
+        return False
+    return True
+
+
+@click.group()
+def daemon():
+    """Manage the zazu daemon, which keeps configuration warm to make commands start faster."""
+    if not supported():
+        raise click.ClickException('the zazu daemon requires Unix domain sockets')
+
+
+@daemon.command()
+@click.option('--foreground', is_flag=True, help='run in the foreground instead of in the background')
+def start(foreground):
+    """Start the zazu daemon."""
+    if is_running():
+        click.echo('zazu daemon is already running')
+        return
+    if foreground:
+        click.echo('zazu daemon listening on {}'.format(socket_path()))
+        serve()
+        return
+    with open(os.devnull, 'r+') as devnull:
+        subprocess.Popen([sys.executable, '-m', 'zazu.daemon'], stdin=devnull, stdout=devnull, stderr=devnull,
+                         cwd='/', start_new_session=True)
+    deadline = time.time() + START_TIMEOUT
+    while not is_running():
+        if time.time() > deadline:
+            raise click.ClickException('timed out waiting for the zazu daemon to start')
+        time.sleep(0.05)
+    click.echo('zazu daemon started')
+
+
+@daemon.command()
+def stop():
+    """Stop the zazu daemon."""
+    try:
+        request({'command': 'stop'}, timeout=START_TIMEOUT)
+    except (OSError, EOFError, ValueError):
+        click.echo('zazu daemon is not running')
+        return
+    click.echo('zazu daemon stopped')
+
+
+@daemon.command()
+def status():
+    """Show the status of the zazu daemon."""
+    try:
+        response = request({'command': 'status'}, timeout=START_TIMEOUT)
+    except (OSError, EOFError, ValueError):
+        click.echo('zazu daemon is not running')
+        sys.exit(1)
+    click.echo('zazu daemon running (pid {}, up {:.0f}s, {} commands run)'.format(
+        response['pid'], response['uptime'], response['commands_run']))
+    for repo in response['repos']:
+        click.echo('  {}'.format(repo))
+
+
+if __name__ == '__main__':
+    serve()
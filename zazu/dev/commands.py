@@ -99,7 +99,7 @@ def make_issue_descriptor(name, require_type=False):
     return IssueDescriptor(type, id, description)
 
 
-@click.group()
+@click.group(cls=zazu.config.PreloadGroup)
 @zazu.config.pass_config
 def dev(config):
     """Create or update work items."""
@@ -181,6 +181,7 @@ def branch_is_current(repo, branch):
     return repo.git.rev_parse('{}@{{0}}'.format(branch)) == repo.git.rev_parse('{}@{{u}}'.format(branch))
 
 
+@zazu.config.preload(zazu.config.issue_tracker_modules)
 @dev.command()
 @click.argument('name', required=False, autocompletion=complete_issue)
 @click.option('--no-verify', is_flag=True, help='Skip verification that ticket exists')
@@ -263,6 +264,7 @@ def wrap_text(text, width=90, indent=''):
                                               subsequent_indent=indent)) for line in text.splitlines()])
 
 
+@zazu.config.preload('github', zazu.config.issue_tracker_modules)
 @dev.command()
 @click.argument('name', required=False, autocompletion=complete_issue)
 @zazu.config.pass_config
@@ -296,6 +298,7 @@ def status(config, name):
                 click.echo(click.style('    Description:\n', fg='green') + wrap_text(p.description, indent='    '))
 
 
+@zazu.config.preload('github', zazu.config.issue_tracker_modules, 'webbrowser')
 @dev.command()
 @zazu.config.pass_config
 @click.option('--base', help='The base branch to target', autocompletion=complete_git_branch)
@@ -333,6 +336,7 @@ def review(config, base, head):
     webbrowser.open_new(pr.browse_url)
 
 
+@zazu.config.preload(zazu.config.issue_tracker_modules, 'webbrowser')
 @dev.command()
 @zazu.config.pass_config
 @click.argument('ticket', required=False, autocompletion=complete_issue)
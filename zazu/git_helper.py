@@ -2,11 +2,19 @@
 """Git functions for zazu."""
 import zazu.imports
 zazu.imports.lazy_import(locals(), [
+    'ast',
+    'click',
     'filecmp',
     'git',
+    'locale',
     'os',
     'pkg_resources',
+    'queue',
+    're',
     'shutil',
+    'subprocess',
+    'tempfile',
+    'threading',
     'zazu.util',
 ])
 
@@ -46,6 +54,76 @@ def get_touched_files(repo):
     return [file for file in repo.git.diff('--cached', '--name-only', '--diff-filter=ACMR').split('\n') if file]
 
 
+def get_changed_files(repo, ref):
+    """Get list of files that have been added, created, modified, or renamed in the working tree since ref."""
+    return [file for file in repo.git.diff('--name-only', '-z', '--diff-filter=ACMR', ref, '--').split('\0') if file]
+
+
+_HUNK_HEADER = r'@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@'
+
+
+def _unquote_path(path):
+    """Undo the quoting that git applies to paths with unusual characters in diff headers."""
+    if path.startswith('"'):
+        return ast.literal_eval('b' + path).decode('utf-8')
+    return path
+
+
+def get_changed_lines(repo, ref=None, cached=False):
+    """Get the ranges of lines that have been added or modified in each file.
+
+    Args:
+        repo (git.Repo): the repo.
+        ref (str): the ref to compare to, defaults to HEAD when cached is True and the index otherwise.
+        cached (bool): if True compare the staged files, otherwise compare the working tree.
+
+    Returns:
+        dict of str to list of (int, int): the (first, last) line numbers, 1 based and inclusive, of each range of
+            changed lines in the new version of each file. Paths are relative to the repo root.
+
+    """
+    args = ['-U0', '--no-color', '--no-ext-diff', '--diff-filter=ACMR', '--src-prefix=a/', '--dst-prefix=b/']
+    if cached:
+        args.append('--cached')
+    if ref:
+        args.append(ref)
+    args.append('--')
+    ranges = {}
+    path = None
+    in_header = False
+    for line in repo.git.diff(*args).split('\n'):
+        if line.startswith('diff --git '):
+            in_header = True
+            path = None
+        elif in_header and line.startswith('+++ '):
+            name = _unquote_path(line[4:])
+            path = os.path.normpath(name[2:]) if name.startswith('b/') else None
+        elif line.startswith('@@ '):
+            in_header = False
+            match = re.match(_HUNK_HEADER, line)
+            if path is not None and match is not None:
+                first = int(match.group(1))
+                count = 1 if match.group(2) is None else int(match.group(2))
+                if count:
+                    ranges.setdefault(path, []).append((first, first + count - 1))
+    return ranges
+
+
+def merge_base(repo, branch):
+    """Get the merge base of HEAD and a branch, falling back to the branch on origin if there is no local branch.
+
+    Raises:
+        click.ClickException: if neither branch exists.
+
+    """
+    for ref in [branch, 'origin/{}'.format(branch)]:
+        try:
+            return repo.git.merge_base(ref, 'HEAD')
+        except git.exc.GitCommandError:
+            pass
+    raise click.ClickException('unable to find the merge base of HEAD and "{}"'.format(branch))
+
+
 def check_git_hooks(repo_base):
     """Check that all known git hooks are in place."""
     have_hooks = True
@@ -93,3 +171,215 @@ def merged_branches(repo, target_branch, remote=False):
 def read_staged(path):
     """Read the contents of the staged version of the file."""
     return zazu.util.check_output(['git', 'show', ':{}'.format(path)], universal_newlines=True)
+
+
+def ls_files(repo_root, untracked=False):
+    """List the files in the git index that are present in the working tree.
+
+    Args:
+        repo_root (str): the root directory of the repo.
+        untracked (bool): also list untracked files that aren't ignored by .gitignore.
+
+    Returns:
+        list of str: '/' separated file paths relative to the repo root.
+
+    """
+    args = ['git', 'ls-files', '-z', '--cached']
+    if untracked:
+        args += ['--others', '--exclude-standard']
+    files = zazu.util.check_output(args, cwd=repo_root, universal_newlines=True).split('\0')
+    deleted = set(zazu.util.check_output(['git', 'ls-files', '-z', '--deleted'], cwd=repo_root,
+                                         universal_newlines=True).split('\0'))
+    # Unmerged paths are listed once per stage, so remove duplicates while preserving order.
+    return [f for f in dict.fromkeys(files) if f and f not in deleted]
+
+
+def staged_entries(repo_root):
+    """Get the mode and blob id of every file in the git index.
+
+    Args:
+        repo_root (str): the root directory of the repo.
+
+    Returns:
+        dict: maps file paths (relative to the repo root, using the OS path separator) to (mode, blob id) tuples.
+
+    """
+    output = zazu.util.check_output(['git', 'ls-files', '-s', '-z'], cwd=repo_root, universal_newlines=True)
+    entries = {}
+    for entry in output.split('\0'):
+        if entry:
+            info, _, path = entry.partition('\t')
+            mode, blob, stage = info.split(' ')
+            if stage == '0':  # Skip unmerged entries.
+                entries[path if os.sep == '/' else path.replace('/', os.sep)] = (mode, blob)
+    return entries
+
+
+def stat_clean_blobs(repo_root, entries=None):
+    """Get the blob id of every file in the git index whose working tree file hasn't changed since it was staged.
+
+    Files are compared with "git diff-files", which uses the stat data recorded in the index rather than reading them,
+    so a file that was touched without being changed is treated as changed.
+
+    Args:
+        repo_root (str): the root directory of the repo.
+        entries (dict): the index entries as returned by staged_entries(), these are read if not provided.
+
+    Returns:
+        dict: maps file paths (relative to the repo root, using the OS path separator) to blob ids.
+
+    """
+    entries = staged_entries(repo_root) if entries is None else entries
+    output = zazu.util.check_output(['git', 'diff-files', '--name-only', '-z'], cwd=repo_root,
+                                    universal_newlines=True)
+    changed = set(f if os.sep == '/' else f.replace('/', os.sep) for f in output.split('\0') if f)
+    return {path: blob for path, (mode, blob) in entries.items()
+            if mode in ('100644', '100755') and path not in changed}
+
+
+class StagedReader(object):
+    """Reads the staged contents of files through a small pool of long lived "git cat-file --batch" processes.
+
+    Instances are callable and thread safe, so they can be used in place of read_staged().
+
+    """
+
+    def __init__(self, repo_root, entries=None, max_processes=4):
+        """Resolve the blob ids of all staged files.
+
+        Args:
+            repo_root (str): the root directory of the repo.
+            entries (dict): the index entries as returned by staged_entries(), these are read if not provided.
+            max_processes (int): the maximum number of cat-file processes to run concurrently.
+
+        """
+        self._repo_root = repo_root
+        self._entries = staged_entries(repo_root) if entries is None else entries
+        self._idle = queue.LifoQueue()
+        self._processes = []
+        self._lock = threading.Lock()
+        self._max_processes = max_processes
+        self._encoding = locale.getpreferredencoding(False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def _acquire_process(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._processes) < self._max_processes:
+                try:
+                    process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=self._repo_root,
+                                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+                except OSError:
+                    zazu.util.raise_uninstalled('git')
+                self._processes.append(process)
+                return process
+        return self._idle.get()
+
+    def read_blob(self, blob):
+        """Read the raw contents of a blob.
+
+        Args:
+            blob (str): the blob id.
+
+        Returns:
+            bytes: the blob contents.
+
+        """
+        process = self._acquire_process()
+        try:
+            process.stdin.write(blob.encode('ascii') + b'\n')
+            process.stdin.flush()
+            header = process.stdout.readline().split()
+            if len(header) != 3:
+                raise click.ClickException('unable to read git object {}'.format(blob))
+            data = process.stdout.read(int(header[2]))
+            process.stdout.read(1)  # Trailing newline.
+        finally:
+            self._idle.put(process)
+        return data
+
+    def __call__(self, path):
+        """Read the contents of the staged version of the file (like read_staged())."""
+        try:
+            _, blob = self._entries[path]
+        except KeyError:
+            return read_staged(path)
+        string = self.read_blob(blob).decode(self._encoding)
+        return string.replace('\r\n', '\n').replace('\r', '\n')
+
+    def close(self):
+        """Stop the cat-file processes."""
+        with self._lock:
+            for process in self._processes:
+                process.stdin.close()
+                process.wait()
+                process.stdout.close()
+            self._processes = []
+
+
+class IndexWriter(object):
+    """Collects new contents for files in the git index and writes them all to the index at once.
+
+    All of the blobs are written with a single "git hash-object -w --stdin-paths" call and the index is updated with a
+    single "git update-index --index-info" call.
+
+    """
+
+    def __init__(self, repo_root, entries=None):
+        """Constructor.
+
+        Args:
+            repo_root (str): the root directory of the repo.
+            entries (dict): the index entries as returned by staged_entries(), these are read if not provided.
+
+        """
+        self._repo_root = repo_root
+        self._entries = staged_entries(repo_root) if entries is None else entries
+        self._pending = []
+        self._lock = threading.Lock()
+        self._encoding = locale.getpreferredencoding(False)
+
+    def stage(self, path, string):
+        """Schedule new contents to be written to the index for a file.
+
+        Args:
+            path (str): the file path relative to the repo root.
+            string (str): the new contents.
+
+        """
+        with self._lock:
+            self._pending.append((path, string))
+
+    def flush(self):
+        """Write all of the scheduled contents to the index."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        temp_dir = tempfile.mkdtemp()
+        try:
+            temp_paths = []
+            for i, (_, string) in enumerate(pending):
+                temp_path = os.path.join(temp_dir, str(i))
+                with open(temp_path, 'wb') as f:
+                    f.write(string.encode(self._encoding))
+                temp_paths.append(temp_path)
+            blobs = zazu.util.check_popen(args=['git', 'hash-object', '-w', '--no-filters', '--stdin-paths'],
+                                          stdin_str='\n'.join(temp_paths) + '\n', cwd=self._repo_root,
+                                          universal_newlines=True).split()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        index_info = []
+        for (path, _), blob in zip(pending, blobs):
+            mode = self._entries.get(path, ('100644', None))[0]
+            index_info.append('{} {}\t{}\0'.format(mode, blob, path.replace(os.sep, '/')))
+        zazu.util.check_popen(args=['git', 'update-index', '-z', '--index-info'], stdin_str=''.join(index_info),
+                              cwd=self._repo_root, universal_newlines=True)
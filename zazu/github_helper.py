@@ -5,6 +5,7 @@ zazu.imports.lazy_import(locals(), [
     'click',
     'getpass',
     'github',
+    'keyring',
     're',
     'requests',
     'socket',
@@ -29,7 +30,6 @@ def make_gh(api_url=None):
     """Make github object with token from the keychain."""
     if api_url is None:
         api_url = GITHUB_API_URL
-    import keyring  # For some reason this doesn't play nicely with threads on lazy import.
     gh = None
     token = keyring.get_password(api_url, 'token')
     if token is None:
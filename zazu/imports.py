@@ -1,97 +1,213 @@
 # -*- coding: utf-8 -*-
 """Lazy module importing for zazu."""
 
-import imp
 import importlib
+import importlib.machinery
+import importlib.util
 import sys
+import threading
 from types import ModuleType
 
+# Loaders whose modules are executed lazily, other modules (builtins and extensions) are cheap to import or can't be
+# loaded lazily, so they are imported when they are declared.
+_LAZY_LOADERS = (importlib.machinery.SourceFileLoader, importlib.machinery.SourcelessFileLoader)
 
-class _ImportLockContext:
-    """Context manager to aquire and release the import lock."""
+# Attributes of a lazy module that don't load it. The import system reads these when a module that is already in
+# sys.modules is imported again, so "import x" elsewhere binds the lazy module rather than loading it.
+_UNLOADED_ATTRIBUTES = frozenset(['__class__', '__loader__', '__name__', '__spec__'])
 
-    def __enter__(self):
-        imp.acquire_lock()
+# Guards the creation of lazy modules and the bookkeeping of the modules being loaded, it isn't held while a module
+# executes so independent modules load concurrently.
+_lock = threading.RLock()
+_loaded = threading.Condition(_lock)
 
-    def __exit__(self, exc_type, exc_value, exc_traceback):
-        imp.release_lock()
+# The thread executing each lazy module that is loading and the module that each waiting thread needs.
+_loading = {}
+_waiting = {}
 
+# Stand ins for the modules that couldn't be found, they aren't added to sys.modules so that importing them fails as
+# usual.
+_missing = {}
 
-def _lazy_import_modules_with_children(base_name, remainder):
-    """Recursively ensure that all modules downstream of base_name are present in sys.modules and linked to children.
 
-    These modules may either be real modules or _LazyModules and linked to their children defined by remainder.
+class _LazyModule(ModuleType):
+    """A module that is executed when one of its attributes is first used, it then becomes an ordinary module.
+
+    This works like importlib.util.LazyLoader, except that reading the attributes that the import system uses doesn't
+    load the module.
 
     """
-    leaf_name, _, remainder = remainder.partition('.')
-    module_name = '.'.join([base_name, leaf_name]) if base_name else leaf_name
-    try:
-        module = sys.modules[module_name]
-    except KeyError:
-        module = _LazyModule(module_name)
-        sys.modules[module_name] = module
-    if remainder:
-        child = _lazy_import_modules_with_children(module_name, remainder)
-        leaf_name, _, remainder = remainder.partition('.')
-        ModuleType.__setattr__(module, leaf_name, child)
-    return module
 
+    def __getattribute__(self, key):
+        if key not in _UNLOADED_ATTRIBUTES:
+            _load(self)
+        return ModuleType.__getattribute__(self, key)
 
-def _ensure_loaded(module):
-    """Recursively ensure that a module and its parents are loaded."""
-    with _ImportLockContext():
-        if not ModuleType.__getattribute__(module, '_LAZY_LOAD_PENDING'):
-            return
-        name = module.__name__
-        parent_name, _, remainder = name.rpartition('.')
-        if parent_name:
-            parent_module = sys.modules[parent_name]
-            # This may invoke _ensure_loaded() if parent_module is an unloaded _LazyModule.
-            setattr(parent_module, remainder, module)
-        if ModuleType.__getattribute__(module, '_LAZY_LOAD_PENDING'):
-            importlib.reload(module)
-            ModuleType.__setattr__(module, '_LAZY_LOAD_PENDING', False)
+    def __setattr__(self, key, value):
+        _load(self)
+        ModuleType.__setattr__(self, key, value)
 
+    def __delattr__(self, key):
+        _load(self)
+        ModuleType.__delattr__(self, key)
 
-class _LazyModule(ModuleType):
-    """Class that imports a module when it is first accessed."""
-    _LAZY_LOAD_PENDING = True
 
-    def __getattribute__(self, key):
+def _deadlocked(name, thread):
+    """Check if waiting for a module to load would wait on thread, which happens when modules use each other."""
+    owner = _loading[name]
+    for _ in range(len(_waiting) + 1):
+        if owner == thread:
+            return True
         try:
-            return ModuleType.__getattribute__(self, key)
-        except AttributeError:
-            pass
-        _ensure_loaded(self)
-        return ModuleType.__getattribute__(self, key)
+            owner = _loading[_waiting[owner]]
+        except KeyError:
+            return False
+    return False
 
-    def __setattr__(self, key, value):
-        _ensure_loaded(self)
-        ModuleType.__setattr__(self, key, value)
+
+def _load(module):
+    """Execute a lazy module, turning it into an ordinary module.
+
+    Only threads that need the same module wait for it to load. The thread executing the module (and a thread that
+    would otherwise deadlock on it) uses the partly executed module, as with a circular import.
+
+    """
+    if type(module) is not _LazyModule:
+        return
+    name = ModuleType.__getattribute__(module, '__name__')
+    thread = threading.get_ident()
+    with _lock:
+        while type(module) is _LazyModule and name in _loading:
+            if _loading[name] == thread or _deadlocked(name, thread):
+                return
+            _waiting[thread] = name
+            try:
+                _loaded.wait()
+            finally:
+                del _waiting[thread]
+        if type(module) is not _LazyModule:
+            return
+        _loading[name] = thread
+    try:
+        # Attributes set before the module loads (its lazy submodules) are kept, as the module body runs in the same
+        # dict.
+        ModuleType.__getattribute__(module, '__spec__').loader.exec_module(module)
+        # The class only changes once the module is complete, threads that see an ordinary module don't wait.
+        ModuleType.__setattr__(module, '__class__', ModuleType)
+    finally:
+        with _lock:
+            del _loading[name]
+            _loaded.notify_all()
+
+
+class _MissingModule(ModuleType):
+    """Stands in for a module that can't be found, raising ImportError when it is used."""
+
+    def __getattr__(self, key):
+        if key.startswith('__'):
+            raise AttributeError(key)  # Keep introspection such as hasattr(module, '__path__') working.
+        raise ModuleNotFoundError('No module named {!r}'.format(self.__name__), name=self.__name__)
+
+
+def _find_spec(name, parent):
+    """Find the spec of a module without loading its parent package if that is a lazy module."""
+    if parent is None:
+        return importlib.util.find_spec(name)
+    if type(parent) is _LazyModule:
+        path = ModuleType.__getattribute__(parent, '__spec__').submodule_search_locations
+    else:
+        path = getattr(parent, '__path__', None)
+    if path is None:
+        return None  # The parent isn't a package.
+    for finder in sys.meta_path:
+        find_spec = getattr(finder, 'find_spec', None)
+        if find_spec is not None:
+            spec = find_spec(name, path)
+            if spec is not None:
+                return spec
+    return None
+
+
+def _lazy_module(name):
+    """Get a module, making a lazy module for it if it hasn't been imported.
+
+    The parents of the module are made first and the module is set as an attribute of its parent, as importing it
+    would.
+
+    """
+    try:
+        return sys.modules[name]
+    except KeyError:
+        pass
+    try:
+        return _missing[name]
+    except KeyError:
+        pass
+    parent_name, _, leaf_name = name.rpartition('.')
+    parent = _lazy_module(parent_name) if parent_name else None
+    module = None
+    if type(parent) is not _MissingModule:
+        spec = _find_spec(name, parent)
+        if spec is not None and isinstance(spec.loader, _LAZY_LOADERS):
+            module = importlib.util.module_from_spec(spec)
+            module.__class__ = _LazyModule
+            sys.modules[name] = module
+        elif spec is not None:
+            try:
+                module = importlib.import_module(name)
+            except ImportError:
+                pass
+    if module is None:
+        module = _missing[name] = _MissingModule(name)
+    if parent is not None:
+        # Set the attribute directly so that a lazy parent isn't loaded.
+        ModuleType.__setattr__(parent, leaf_name, module)
+    return module
 
 
 def lazy_import(scope, imports):
     """Declare a list of modules to import on their first use.
 
+    Modules are executed when one of their attributes is first used, after which they are ordinary modules. Modules
+    that can't be found raise ImportError when they are used rather than when they are declared.
+
     Args:
         scope: the scope to import the modules into.
         imports: the list of modules to import.
 
     """
-    with _ImportLockContext():
+    with _lock:
         for module_name in imports:
-            base_name, _, remainder = module_name.partition('.')
+            _lazy_module(module_name)
+            base_name = module_name.partition('.')[0]
             if base_name not in scope:
-                scope[base_name] = _lazy_import_modules_with_children('', module_name)
-                continue
-            existing_module = scope[base_name]
-            while base_name != module_name:
-                leaf_name, _, new_remainder = remainder.partition('.')
-                try:
-                    existing_module = ModuleType.__getattribute__(existing_module, leaf_name)
-                except AttributeError:
-                    new_module = _lazy_import_modules_with_children(base_name, remainder)
-                    ModuleType.__setattr__(existing_module, leaf_name, new_module)
-                    break
-                base_name = '.'.join([base_name, leaf_name])
-                remainder = new_remainder
+                scope[base_name] = _lazy_module(base_name)
+
+
+def _preload(module_names):
+    """Import and load a list of modules, ignoring errors as they are raised again when the modules are used."""
+    for name in module_names:
+        try:
+            if callable(name):
+                _preload(name())
+            else:
+                _load(importlib.import_module(name))
+        except Exception:
+            pass
+
+
+def preload(module_names):
+    """Import modules on a background thread so that they are likely to be loaded by the time they are used.
+
+    Args:
+        module_names: the list of modules to import, in the order that they are likely to be used. Functions that
+            return a list of modules (e.g. depending on the config) can be used in place of module names.
+
+    Returns:
+        threading.Thread: the thread importing the modules.
+
+    """
+    thread = threading.Thread(target=_preload, args=(list(module_names),), name='zazu-preload')
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -24,3 +24,18 @@ class Styler(zazu.styler.Styler):
     def type():
         """Return the string type of this Styler."""
         return 'astyle'
+
+    @staticmethod
+    def config_file_names():
+        """Get the names of the config files that astyle looks for."""
+        return ['.astylerc', '_astylerc']
+
+    @staticmethod
+    def global_config_files():
+        """Get the user wide config files that astyle reads."""
+        return ['~/.astylerc', '~/.config/astylerc']
+
+    @staticmethod
+    def batch_options():
+        """Get options required to make astyle style a list of files in place."""
+        return ['--suffix=none', '--quiet']
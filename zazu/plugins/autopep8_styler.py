@@ -1,11 +1,39 @@
 # -*- coding: utf-8 -*-
 """Autopep8Styler plugin for zazu."""
+import zazu.imports
 import zazu.styler
+zazu.imports.lazy_import(locals(), [
+    'autopep8',
+    'functools',
+    'os'
+])
 
 __author__ = 'Nicholas Wiles'
 __copyright__ = 'Copyright 2016'
 
 
+@functools.lru_cache()
+def _parse_args(options, directory, config_hash):
+    """Parse (and cache) autopep8 command line options, including any config files found from the directory.
+
+    The hash of the config files is part of the cache key, so the options are parsed again after they change.
+
+    """
+    # autopep8 looks for config files from the directory of the files that it is given, stdin is in the directory.
+    return autopep8.parse_args([os.path.join(directory, o) if o == '-' else o for o in options], apply_config=True)
+
+
+def fix_code(string, options):
+    """Style a string using the autopep8 library exactly as "autopep8 <options>" would style it from stdin.
+
+    Args:
+        string (str): the string to style.
+        options (argparse.Namespace): the parsed options, see Styler.in_process_options().
+
+    """
+    return autopep8.fix_code(string, options)
+
+
 class Styler(zazu.styler.Styler):
     """Autopep8 plugin for code styling."""
 
@@ -19,7 +47,31 @@ class Styler(zazu.styler.Styler):
         """Return the name of this Styler."""
         return 'autopep8'
 
+    @staticmethod
+    def config_file_names():
+        """Get the names of the config files that autopep8 (and pycodestyle) looks for."""
+        return ['setup.cfg', 'tox.ini', '.pep8', '.flake8', 'pyproject.toml']
+
+    @staticmethod
+    def global_config_files():
+        """Get the user wide config files that autopep8 (and pycodestyle) reads."""
+        return ['~/.config/pycodestyle', '~/.pep8']
+
     @staticmethod
     def required_options():
         """Get options required to make autopep8 take input from stdin."""
         return ['-']
+
+    @staticmethod
+    def in_process_function():
+        """Get the function that styles a string using the autopep8 library."""
+        return fix_code
+
+    def in_process_options(self, directory):
+        """Parse the options here rather than in a pool worker, finding config files like "autopep8 -" would."""
+        return _parse_args(tuple(self.options), directory, self._config_hash(directory))
+
+    @staticmethod
+    def batch_options():
+        """Get options required to make autopep8 style a list of files in place."""
+        return ['--in-place']
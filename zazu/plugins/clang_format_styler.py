@@ -1,10 +1,28 @@
 # -*- coding: utf-8 -*-
 """ClangFormatStyler plugin for zazu."""
+import os
 import zazu.styler
 
 __author__ = 'Nicholas Wiles'
 __copyright__ = 'Copyright 2017'
 
+# The languages that clang-format picks by file extension, every other extension is C++ (or objective-C by content).
+LANGUAGES = {
+    '.cs': 'csharp',
+    '.java': 'java',
+    '.js': 'javascript',
+    '.json': 'json',
+    '.m': 'objc',
+    '.mjs': 'javascript',
+    '.mm': 'objc',
+    '.proto': 'proto',
+    '.protodevel': 'proto',
+    '.td': 'tablegen',
+    '.textpb': 'textproto',
+    '.textproto': 'textproto',
+    '.ts': 'javascript',
+}
+
 
 class Styler(zazu.styler.Styler):
     """ClangFormat plugin for code styling."""
@@ -25,3 +43,28 @@ class Styler(zazu.styler.Styler):
     def type():
         """Return the name of this Styler."""
         return 'clang-format'
+
+    @staticmethod
+    def config_file_names():
+        """Get the names of the config files that clang-format looks for."""
+        return ['.clang-format', '_clang-format']
+
+    @staticmethod
+    def batch_options():
+        """Get options required to make clang-format style a list of files in place."""
+        return ['-i']
+
+    @staticmethod
+    def filename_options(filename):
+        """Get options that make clang-format find the style config and pick the language from the file name."""
+        return ['-assume-filename={}'.format(filename)]
+
+    @staticmethod
+    def language(filepath):
+        """Get the language that clang-format picks from the extension of a file, see default_extensions()."""
+        return LANGUAGES.get(os.path.splitext(filepath)[1].lower(), 'cpp')
+
+    @staticmethod
+    def ranged_options(line_ranges, filepath):
+        """Get options that make clang-format style only some lines."""
+        return ['--lines={}:{}'.format(first, last) for first, last in line_ranges]
@@ -1,11 +1,27 @@
 # -*- coding: utf-8 -*-
 """DocformatterStyler plugin for zazu."""
+import zazu.imports
 import zazu.styler
+zazu.imports.lazy_import(locals(), [
+    'io'
+])
 
 __author__ = 'Nicholas Wiles'
 __copyright__ = 'Copyright 2018'
 
 
+def format_code(string, options):
+    """Style a string using the docformatter library exactly as "docformatter <options>" would style it from stdin."""
+    try:
+        from docformatter.__main__ import _main
+    except ImportError:
+        from docformatter import _main  # docformatter < 1.5 is a single module.
+    standard_out = io.StringIO()
+    _main(['docformatter'] + list(options), standard_out=standard_out, standard_error=io.StringIO(),
+          standard_in=io.StringIO(string))
+    return standard_out.getvalue()
+
+
 class Styler(zazu.styler.Styler):
     """Docformatter plugin for code styling."""
 
@@ -19,7 +35,17 @@ class Styler(zazu.styler.Styler):
         """Return the name of this Styler."""
         return 'docformatter'
 
+    @staticmethod
+    def config_file_names():
+        """Get the names of the config files that docformatter looks for."""
+        return ['pyproject.toml', 'setup.cfg', 'tox.ini']
+
     @staticmethod
     def required_options():
         """Get options required to make docformatter use stdin."""
         return ['-']
+
+    @staticmethod
+    def in_process_function():
+        """Get the function that styles a string using the docformatter library."""
+        return format_code
@@ -20,3 +20,8 @@ class Styler(zazu.styler.Styler):
     def type():
         """Return the name of this Styler."""
         return 'esformatter'
+
+    @staticmethod
+    def config_file_names():
+        """Get the names of the config files that esformatter looks for."""
+        return ['.esformatter', 'package.json']
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 """ESLint plugin for zazu."""
 import zazu.imports
+import zazu.styler
 zazu.imports.lazy_import(locals(), [
     'click',
     'json',
     'os',
-    'subprocess'
+    'subprocess',
+    'zazu.util',
 ])
 
 __author__ = "Patrick Moore"
@@ -15,26 +17,45 @@ __copyright__ = "Copyright 2018"
 class Styler(zazu.styler.Styler):
     """ESLint plugin for code styling."""
 
-    def style_string(self, string, filepath):
-        """Fix a string to be within style guidelines.
+    def __init__(self, *args, **kwargs):
+        """Constructor, see zazu.styler.Styler."""
+        super(Styler, self).__init__(*args, **kwargs)
+        self._eslint_paths = {}
+
+    def find_eslint(self, filepath):
+        """Find the eslint to use for a file.
+
+        The nearest node_modules/eslint/bin/eslint.js in the directory of the file or its parents (up to the current
+        working directory) is used, otherwise eslint is expected to be on the path. The result is remembered for every
+        directory searched.
 
         Args:
-            string (str): the string to style
-            filepath (str): the filepath of the file being styled
+            filepath (str): the filepath of the file being styled.
 
         Returns:
-            Styled string.
+            str: the eslint to run.
 
         """
-        eslint = 'eslint'
         cwd = os.path.normpath(os.getcwd())
         dirname = os.path.normpath(os.path.dirname(filepath))
+        try:
+            return self._eslint_paths[(cwd, dirname)]
+        except KeyError:
+            pass
+        eslint = 'eslint'
+        searched = [dirname]
+        dirname = os.path.realpath(dirname)
         loop_count = 0
 
         local_eslint = os.path.join('node_modules', 'eslint', 'bin', 'eslint.js')
 
         while True and loop_count < 100:
             loop_count = loop_count + 1
+            try:
+                eslint = self._eslint_paths[(cwd, dirname)]
+                break
+            except KeyError:
+                searched.append(dirname)
             maybe_eslint = os.path.join(dirname, local_eslint)
 
             if os.path.isfile(maybe_eslint):
@@ -54,7 +75,40 @@ class Styler(zazu.styler.Styler):
         if loop_count >= 100:
             raise click.ClickException('Unable to find eslint.js')
 
-        args = [eslint, '-f', 'json', '--fix-dry-run', '--stdin', '--stdin-filename', filepath] + self.options
+        for d in searched:
+            self._eslint_paths[(cwd, d)] = eslint
+        return eslint
+
+    def tool_id(self, filepath):
+        """Identify the eslint used for a file by its path and the version of the package it is in."""
+        eslint = self.find_eslint(filepath)
+        if eslint == 'eslint':
+            return super(Styler, self).tool_id(filepath)
+        try:
+            with open(os.path.join(os.path.dirname(os.path.dirname(eslint)), 'package.json')) as f:
+                version = json.load(f).get('version', '')
+        except (IOError, OSError, ValueError):
+            version = ''
+        return [os.path.relpath(eslint), version]
+
+    def refresh(self):
+        """Forget where eslint was found as well, see zazu.styler.Styler.refresh."""
+        super(Styler, self).refresh()
+        self._eslint_paths = {}
+
+    def style_string(self, string, filepath):
+        """Fix a string to be within style guidelines.
+
+        Args:
+            string (str): the string to style
+            filepath (str): the filepath of the file being styled
+
+        Returns:
+            Styled string.
+
+        """
+        args = [self.find_eslint(filepath), '-f', 'json', '--fix-dry-run', '--stdin', '--stdin-filename',
+                filepath] + self.options
         try:
             p = subprocess.Popen(args=args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
             results, _ = p.communicate(string)
@@ -63,6 +117,60 @@ class Styler(zazu.styler.Styler):
 
         return json.loads(results)[0].get('output', string)
 
+    def style_strings(self, strings, filepaths, line_ranges=None):
+        """Fix a list of strings, styling all of the files that use the same eslint with one invocation of it.
+
+        Args:
+            strings (list of str): the strings to style.
+            filepaths (list of str): the filepaths of the files being styled.
+            line_ranges (list): ignored, eslint has no ranged mode so whole strings are always styled.
+
+        Returns:
+            list of str: the styled strings, in the same order as the input.
+
+        """
+        groups = {}
+        for i, filepath in enumerate(filepaths):
+            groups.setdefault(self.find_eslint(filepath), []).append(i)
+        styled_strings = list(strings)
+        for eslint, indices in groups.items():
+            if len(indices) < 2 or not zazu.styler.can_write_temp_copies([filepaths[i] for i in indices]):
+                for i in indices:
+                    styled_strings[i] = self.style_string(strings[i], filepaths[i])
+            else:
+                styled = self._style_eslint_batch(eslint, [strings[i] for i in indices], [filepaths[i] for i in indices])
+                for i, styled_string in zip(indices, styled):
+                    styled_strings[i] = styled_string
+        return styled_strings
+
+    def _style_eslint_batch(self, eslint, strings, filepaths):
+        """Style strings with one eslint invocation, mapping the output reported for each temporary file back."""
+        with zazu.styler.temp_copies(strings, filepaths) as temp_paths:
+            args = [eslint] + self.batch_options() + self.options + temp_paths
+            results = zazu.util.check_popen(args=args, universal_newlines=True,
+                                            allowed_return_codes=self.batch_return_codes())
+        outputs = {os.path.realpath(r['filePath']): r.get('output') for r in json.loads(results)}
+        styled_strings = []
+        for string, temp_path in zip(strings, temp_paths):
+            output = outputs.get(os.path.realpath(temp_path))
+            styled_strings.append(string if output is None else output)
+        return styled_strings
+
+    @staticmethod
+    def batch_options():
+        """Return the options used to lint many files with one eslint invocation.
+
+        The temporary copies of the files are hidden, which eslint ignores by default unless a negated ignore pattern
+        matches them.
+
+        """
+        return ['-f', 'json', '--fix-dry-run', '--ignore-pattern', '!{}*'.format(zazu.styler.TEMP_PREFIX)]
+
+    @staticmethod
+    def batch_return_codes():
+        """Return the eslint exit codes of a successful run, 1 means that problems that can't be fixed remain."""
+        return [0, 1]
+
     @staticmethod
     def default_extensions():
         """Return the list of file extensions that are compatible with this Styler."""
@@ -72,3 +180,20 @@ class Styler(zazu.styler.Styler):
     def type():
         """Return the string type of this Styler."""
         return 'eslint'
+
+    @staticmethod
+    def config_file_names():
+        """Get the names of the config files that eslint looks for."""
+        return [
+            '.eslintrc',
+            '.eslintrc.js',
+            '.eslintrc.cjs',
+            '.eslintrc.yaml',
+            '.eslintrc.yml',
+            '.eslintrc.json',
+            'package.json',
+            '.eslintignore',
+            'eslint.config.js',
+            'eslint.config.mjs',
+            'eslint.config.cjs',
+        ]
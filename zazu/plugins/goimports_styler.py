@@ -18,3 +18,8 @@ class Styler(zazu.styler.Styler):
     def type():
         """Return the name of this Styler."""
         return 'goimports'
+
+    @staticmethod
+    def config_file_names():
+        """Get the names of the config files that goimports looks for."""
+        return ['go.mod']
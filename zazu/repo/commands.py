@@ -18,7 +18,7 @@ __author__ = 'Nicholas Wiles'
 __copyright__ = 'Copyright 2016'
 
 
-@click.group()
+@click.group(cls=zazu.config.PreloadGroup)
 def repo():
     """Manage repository."""
     pass
@@ -48,6 +48,7 @@ def complete_repo(ctx, args, incomplete):
     return sorted(paths)
 
 
+@zazu.config.preload('ruamel.yaml', 'github')
 @repo.command()
 @click.argument('repository', autocompletion=complete_repo)
 @click.argument('destination', required=False)
@@ -94,6 +95,7 @@ def clone(config, repository, destination, nohooks, nosubmodules):
         raise click.ClickException(str(err))
 
 
+@zazu.config.preload(zazu.config.issue_tracker_modules)
 @repo.command()
 @click.option('-r', '--remote', is_flag=True, help='Also clean up remote branches')
 @click.option('-b', '--target_branch', default='origin/master', help='Delete branches merged with this branch')
@@ -231,6 +233,7 @@ def pep440_from_semver(semver):
     return version_str
 
 
+@zazu.config.preload('semantic_version')
 @repo.command()
 @click.option('--pep440', is_flag=True, help='Format the output as PEP 440 compliant')
 @click.option('--prerelease', type=int, help='Pre-release number (invalid for tagged commits)')
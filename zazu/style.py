@@ -2,22 +2,29 @@
 """Style functions for zazu."""
 import zazu.imports
 zazu.imports.lazy_import(locals(), [
+    'builtins',
     'click',
-    'difflib',
     'functools',
+    'hashlib',
+    'json',
     'os',
-    'threading',
     'sys',
+    'time',
     'zazu.config',
     'zazu.git_helper',
+    'zazu.style_cache',
+    'zazu.style_profile',
     'zazu.styler',
-    'zazu.util'
+    'zazu.util',
+    'zazu.watch',
 ])
 
 __author__ = 'Nicholas Wiles'
 __copyright__ = 'Copyright 2016'
 
 
+MAX_BATCH_SIZE = 32
+
 default_exclude_paths = ['build',
                          'dependency',
                          'dependencies']
@@ -35,40 +42,42 @@ def write_file(path, _, styled_string):
         return f.write(styled_string)
 
 
-"""The git binary doesn't allow concurrent access, so serailize calls to it using a lock."""
-git_lock = threading.Lock()
-
+def stage_file(index_writer, path, input_string, styled_string):
+    """Stage styled_string as the new contents of a file.
 
-def stage_patch(path, input_string, styled_string):
-    """Create a patch between input_string and output_string and add the patch to the git staging area.
+    If the file isn't partially staged the styled version is also written to the working tree.
 
     Args:
-        path: the path of the file being patched.
+        index_writer (IndexWriter): collects the new index contents.
+        path: the path of the file being staged.
         input_string: the current state of the file in the git stage.
         styled_string: the properly styled string to stage.
 
     """
-    # If the input was the same as the current file contents, apply the styling locally and add it.
-    if read_file(path) == input_string:
+    try:
+        fully_staged = read_file(path) == input_string
+    except IOError:
+        fully_staged = False  # The file has been removed from the working tree.
+    if fully_staged:
         write_file(path, '', styled_string)
-        with git_lock:
-            zazu.util.check_output(['git', 'add', path])
-    else:
-        # The file is partially staged. We must apply a patch to the staging area.
-        input_lines = input_string.splitlines()
-        styled_lines = styled_string.splitlines()
-        patch = difflib.unified_diff(input_lines, styled_lines, 'a/' + path, 'b/' + path, lineterm='')
-        patch_string = '\n'.join(patch) + '\n'
-        if input_string[-1] != '\n':
-            # This is to address a bizarre issue with git apply whereby if the staged file doesn't end in a newline,
-            # the patch will fail to apply.
-            raise click.ClickException('File "{}" must have a trailing newline'.format(path))
-        with git_lock:
-            zazu.util.check_popen(args=['git', 'apply', '--cached', '--verbose', '-'], stdin_str=patch_string,
-                                  universal_newlines=True)
-
-
-def style_file(stylers, path, read_fn, write_fn):
+    index_writer.stage(path, styled_string)
+
+
+def file_fingerprints(stylers, paths):
+    """Compute the fingerprint of the styler chain applied to each file, once per directory and file extension."""
+    by_dir = {}
+    fingerprints = []
+    for path in paths:
+        key = (os.path.dirname(path), os.path.splitext(path)[1])
+        try:
+            fingerprint = by_dir[key]
+        except KeyError:
+            fingerprint = by_dir[key] = zazu.style_cache.chain_fingerprint(stylers, path)
+        fingerprints.append(fingerprint)
+    return fingerprints
+
+
+def style_file(stylers, path, read_fn, write_fn, cache=None, profile=None, memo=None, line_ranges=None):
     """Style a file.
 
     Args:
@@ -76,16 +85,111 @@ def style_file(stylers, path, read_fn, write_fn):
         path: the file path.
         read_fn: function used to read in the file contents.
         write_fn: function used to write out the styled file, or None
+        cache (StyleCache): cache of previous style results, or None.
+        profile (StyleProfile): records timing information, or None.
+        memo (StyleMemo): shares results between identical files in a run, or None.
+        line_ranges (dict): the changed line ranges of each file for ranged stylers, or None to style whole files.
 
     """
-    input_string = read_fn(path)
-    styled_string = input_string
-    for styler in stylers:
-        styled_string = styler.style_string(styled_string, path)
-    violation = styled_string != input_string
-    if violation and callable(write_fn):
-        write_fn(path, input_string, styled_string)
-    return path, stylers, violation
+    return style_files(stylers, [path], read_fn, write_fn, cache, profile, memo, line_ranges)[0]
+
+
+def style_files(stylers, paths, read_fn, write_fn, cache=None, profile=None, memo=None, line_ranges=None):
+    """Style a batch of files that share the same list of stylers.
+
+    When a memo is given, files whose result another batch is already computing wait for that result. Every result
+    claimed by this batch is computed before waiting, so batches can never wait on each other in a cycle.
+
+    Args:
+        stylers: the stylers to apply (in order) to each file.
+        paths: the file paths.
+        read_fn: function used to read in the file contents.
+        write_fn: function used to write out the styled file, or None
+        cache (StyleCache): cache of previous style results, or None.
+        profile (StyleProfile): records timing information, or None.
+        memo (StyleMemo): shares results between identical files in a run, or None.
+        line_ranges (dict): the changed line ranges of each file for ranged stylers, or None to style whole files. Files
+            that aren't in the dict have no changed lines.
+
+    Returns:
+        list of (path, stylers, violation) tuples, one per path.
+
+    """
+    input_strings = [read_fn(p) for p in paths]
+    styled_strings = [None] * len(paths)
+    ranges = None
+    if line_ranges is not None and any(s.ranged for s in stylers):
+        ranges = [line_ranges.get(p, []) for p in paths]
+    if cache is not None or memo is not None:
+        blobs = [zazu.style_cache.blob_id(s) for s in input_strings]
+        fingerprints = file_fingerprints(stylers, paths)
+        if ranges is not None:
+            # The result of a ranged styler depends on the ranges as well as the contents.
+            fingerprints = [zazu.style_cache.ranged_fingerprint(f, r) for f, r in zip(fingerprints, ranges)]
+    owned = {}
+    waiting = {}
+    misses = []
+    try:
+        # Other batches wait on the results claimed here, so they must be resolved even if something raises.
+        for i, input_string in enumerate(input_strings):
+            if memo is not None:
+                future, owner = memo.claim(blobs[i], fingerprints[i])
+                if not owner:
+                    waiting[i] = future
+                    continue
+                owned[i] = future
+            if cache is not None:
+                styled_strings[i] = cache.get(blobs[i], fingerprints[i], input_string)
+            if styled_strings[i] is None:
+                misses.append(i)
+        if misses:
+            strings = [input_strings[i] for i in misses]
+            miss_paths = [paths[i] for i in misses]
+            for styler in stylers:
+                with styler.job_slot():
+                    start = time.perf_counter()
+                    if styler.ranged and ranges is not None:
+                        styled = styler.style_strings(strings, miss_paths, [ranges[i] for i in misses])
+                    else:
+                        styled = styler.style_strings(strings, miss_paths)
+                    if profile is not None:
+                        profile.record_invocation(styler, miss_paths, time.perf_counter() - start, strings, styled)
+                strings = styled
+            for i, styled_string in zip(misses, strings):
+                styled_strings[i] = styled_string
+                if cache is not None:
+                    cache.put(blobs[i], fingerprints[i], input_strings[i], styled_string)
+        for i, future in owned.items():
+            future.set_result(None if styled_strings[i] == input_strings[i] else styled_strings[i])
+    except BaseException as e:
+        for future in owned.values():
+            if not future.done():
+                future.set_exception(e)
+        raise
+    for i, future in waiting.items():
+        styled_string = future.result()
+        styled_strings[i] = input_strings[i] if styled_string is None else styled_string
+    results = []
+    for path, input_string, styled_string in zip(paths, input_strings, styled_strings):
+        violation = styled_string != input_string
+        if violation and callable(write_fn):
+            write_fn(path, input_string, styled_string)
+        results.append((path, stylers, violation))
+    return results
+
+
+def batches(stylers, files, jobs):
+    """Split files that share a list of stylers into batches.
+
+    Files are only batched together if one of the stylers can style many files in one invocation, and batches are kept
+    small enough that there are still enough of them to keep every job busy.
+
+    """
+    files = sorted(files)
+    batch_size = 1
+    if any(s.batch_options() is not None for s in stylers):
+        batch_size = max(1, min(MAX_BATCH_SIZE, -(-len(files) // jobs)))
+    return [files[i:i + batch_size] for i in builtins.range(0, len(files), batch_size)]
 
 
 def styler_list(file, sets, keys):
@@ -93,63 +197,404 @@ def styler_list(file, sets, keys):
     return [s for s in keys if file in sets[s]]
 
 
+def styler_file_sets(stylers, repo_root, candidates):
+    """Determine the files that each styler applies to.
+
+    Args:
+        stylers (list of Styler): the stylers.
+        repo_root (str): the root of the repo.
+        candidates (list of str): relative paths of the files to consider, or None to scan the working tree.
+
+    Returns:
+        dict of Styler to set of str.
+
+    """
+    file_sets = {}
+    styler_sets = {}
+    for s in stylers:
+        key = (tuple(s.includes), tuple(s.excludes))
+        if key not in file_sets:
+            if candidates is None:
+                files = zazu.util.scantree(repo_root, key[0], key[1], exclude_hidden=True)
+            else:
+                files = zazu.util.filter_paths(candidates, key[0], key[1], exclude_hidden=True)
+            file_sets[key] = set(files)
+        styler_sets[s] = file_sets[key]
+    return styler_sets
+
+
+def parse_shard(ctx, param, value):
+    """Parse a shard given as I/N, where I is 1 based, into an (index, count) tuple."""
+    if value is None:
+        return None
+    try:
+        index, count = (int(v) for v in value.split('/'))
+    except ValueError:
+        raise click.BadParameter('must be I/N, for example 1/4')
+    if not 1 <= index <= count:
+        raise click.BadParameter('I must be between 1 and N')
+    return index, count
+
+
+def in_shard(path, shard):
+    """Return True if a file belongs to a shard.
+
+    Files are assigned by a hash of their path relative to the repo root, so every node that checks the same tree
+    assigns the files in the same way regardless of platform, ordering or file count.
+
+    """
+    index, count = shard
+    digest = hashlib.sha1(path.replace(os.sep, '/').encode('utf-8')).hexdigest()
+    return int(digest, 16) % count == index - 1
+
+
+def shard_file_sets(styler_sets, shard):
+    """Keep only the files of a shard in the file set of each styler, see styler_file_sets()."""
+    all_files = set()
+    for files in styler_sets.values():
+        all_files |= files
+    shard_files = set(f for f in all_files if in_shard(f, shard))
+    return {s: files & shard_files for s, files in styler_sets.items()}
+
+
+def write_report(path, shard, check, file_count, violations, stopped_early=False):
+    """Write the result of a style run to a json file that style-merge can combine with the reports of other shards.
+
+    Args:
+        path (str): the path of the json file.
+        shard ((int, int)): the (index, count) of the shard that was styled, or None if every file was.
+        check (bool): True if files were checked rather than fixed.
+        file_count (int): the number of files that were examined.
+        violations (list of str): the files that had style violations.
+        stopped_early (bool): True if the run stopped at the first violation (--fail-fast) before examining every file.
+
+    """
+    report = {'shard': None if shard is None else list(shard),
+              'check': check,
+              'files': file_count,
+              'stopped_early': stopped_early,
+              'violations': sorted(violations)}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def merge_reports(reports):
+    """Combine the reports of style runs on every shard of a tree.
+
+    Args:
+        reports (list of dict): reports written by write_report().
+
+    Returns:
+        tuple of (number of files examined, sorted list of files with violations).
+
+    Raises:
+        click.ClickException: if the reports don't cover every shard exactly once.
+
+    """
+    shards = [tuple(r['shard']) if r['shard'] is not None else None for r in reports]
+    if None in shards:
+        if len(reports) != 1:
+            raise click.ClickException('an unsharded report can\'t be merged with other reports')
+    else:
+        counts = set(count for _, count in shards)
+        if len(counts) != 1:
+            raise click.ClickException('reports are from different shard counts: {}'.format(
+                ', '.join(str(c) for c in sorted(counts))))
+        count = counts.pop()
+        for index in builtins.range(1, count + 1):
+            found = shards.count((index, count))
+            if found != 1:
+                raise click.ClickException('{} reports for shard {}/{}'.format('missing' if not found else found,
+                                                                               index, count))
+    violations = set()
+    for r in reports:
+        violations.update(r['violations'])
+    return sum(r['files'] for r in reports), sorted(violations)
+
+
+def clean_results(stylers, paths):
+    """Get the results of files that are known to be clean without reading them, see style_files()."""
+    return [(path, stylers, False) for path in paths]
+
+
+def known_clean_files(stylers, files, cache, known_blobs):
+    """Find the files whose blob id the cache knows is already styled by a chain of stylers.
+
+    Args:
+        stylers (list of Styler): the styler chain.
+        files (list of str): the files to consider.
+        cache (StyleCache): cache of previous style results.
+        known_blobs (dict): maps files to the blob id of their contents, files that aren't in it are never clean.
+
+    Returns:
+        set of str: the clean files.
+
+    """
+    files = [f for f in files if f in known_blobs]
+    return set(f for f, fingerprint in zip(files, file_fingerprints(stylers, files))
+               if cache.is_clean(known_blobs[f], fingerprint))
+
+
+def style_work(stylers, styler_sets, read_fn, write_fn, cache, timing, memo, line_ranges, known_blobs, jobs):
+    """Make the work items that style every file in styler_sets, see style_files() for the arguments.
+
+    Files whose blob id is in known_blobs (e.g. from the git index) and that the cache knows are clean are skipped
+    without being read.
+
+    Returns:
+        tuple of (list of work items, set of all files styled).
+
+    """
+    all_files = set()
+    for files in styler_sets.values():
+        all_files |= files
+    # Group files by the list of stylers to apply so they can be styled in batches.
+    chains = {}
+    for f in all_files:
+        chains.setdefault(tuple(styler_list(f, styler_sets, stylers)), []).append(f)
+    work = []
+    for chain, files in chains.items():
+        chain = list(chain)
+        # The cache key of a ranged styler depends on the changed lines, which are only known once the file is read.
+        if known_blobs and cache is not None and not (line_ranges is not None and any(s.ranged for s in chain)):
+            clean = known_clean_files(chain, files, cache, known_blobs)
+            if clean:
+                files = [f for f in files if f not in clean]
+                work.append(functools.partial(clean_results, chain, sorted(clean)))
+        work += [functools.partial(style_files, chain, batch, read_fn, write_fn, cache, timing, memo, line_ranges)
+                 for batch in batches(chain, files, jobs)]
+    if timing is not None:
+        work = [timing.timed(w) for w in work]
+    return work, all_files
+
+
+def watch_dir_filter(stylers):
+    """Make a function that returns False for directories that can't contain files to style."""
+    matchers = [zazu.util.path_matcher(tuple(s.includes), tuple(s.excludes)) for s in stylers]
+    return lambda directory: any(m.may_match_below(directory) for m in matchers)
+
+
+def watch(stylers, repo_root, write_fn, known, cache, jobs, tags):
+    """Restyle files as they change until interrupted.
+
+    Args:
+        stylers (list of Styler): the stylers.
+        repo_root (str): the root of the repo to watch.
+        write_fn: function used to write out styled files, or None.
+        known (dict): blob id of the last contents of each file that zazu read or wrote, files whose contents match are
+            not restyled, so zazu's own writes are ignored.
+        cache (StyleCache): cache of previous style results, or None.
+        jobs (int): the number of files to style concurrently.
+        tags: the checklist tags to print results with.
+
+    """
+    watcher = zazu.watch.make_watcher(repo_root, watch_dir_filter(stylers))
+    click.echo('watching for changes, press Ctrl+C to stop')
+    try:
+        for changed in zazu.watch.debounced_changes(watcher):
+            if changed is None:
+                changed = zazu.util.scantree(repo_root, ['*'], [], exclude_hidden=True)
+            for styler in stylers:
+                styler.refresh()  # Config files may have changed too.
+            candidates = []
+            for path in changed:
+                try:
+                    blob = zazu.style_cache.blob_id(read_file(path))
+                except (IOError, UnicodeDecodeError):
+                    known.pop(path, None)  # Removed or not a text file.
+                    continue
+                if known.get(path) != blob:
+                    known[path] = blob
+                    candidates.append(path)
+            styler_sets = styler_file_sets(stylers, repo_root, candidates)
+            memo = zazu.style_cache.StyleMemo()
+            work, _ = style_work(stylers, styler_sets, read_file, write_fn, cache, None, memo, None, None, jobs)
+            results = zazu.util.dispatch(work, max_workers=jobs, on_abort=zazu.util.terminate_processes)
+            for f, file_stylers, violation in (r for batch_results in results for r in batch_results):
+                click.echo(zazu.util.format_checklist_item(not violation,
+                                                           text='({}) {}'.format(', '.join([s.name() for s in file_stylers]), f),
+                                                           tag_formats=tags))
+            if cache is not None:
+                cache.prune()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def recording_read_fn(read_fn, known):
+    """Wrap read_fn so that the blob id of everything it reads is recorded in known."""
+    def read(path):
+        string = read_fn(path)
+        known[path] = zazu.style_cache.blob_id(string)
+        return string
+    return read
+
+
+def recording_write_fn(write_fn, known):
+    """Wrap write_fn so that the blob id of everything it writes is recorded in known."""
+    def write(path, input_string, styled_string):
+        known[path] = zazu.style_cache.blob_id(styled_string)
+        write_fn(path, input_string, styled_string)
+    return write
+
+
 @click.command()
 @zazu.config.pass_config
 @click.option('-v', '--verbose', is_flag=True, help='print files that are dirty')
 @click.option('--check', is_flag=True, help='only check the repo for style violations, do not correct them')
 @click.option('--cached', is_flag=True, help='only examine/fix files that are staged for SCM commit')
-def style(config, verbose, check, cached):
+@click.option('--no-cache', is_flag=True, help='ignore and don\'t update the cache of previous style results')
+@click.option('--discover', type=click.Choice(['walk', 'git', 'git-all']), default='walk', show_default=True,
+              help='how to find files: walk the working tree, list files tracked by git or list tracked and untracked '
+                   'files that aren\'t ignored by git')
+@click.option('--since', metavar='REF', help='only examine/fix files that have changed since REF, use "auto" for the '
+                                             'merge base of HEAD and the develop branch')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), help='number of files to style concurrently, defaults to the '
+                                                               'number of CPUs available')
+@click.option('--profile', is_flag=True, help='print the slowest files and the time spent in each styler')
+@click.option('--profile-json', type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+              help='write the timing of each styler and file to a json file')
+@click.option('--watch', 'watch_', is_flag=True, help='after styling, keep restyling files as they change')
+@click.option('--fail-fast', is_flag=True, help='with --check, stop at the first file with a style violation')
+@click.option('--shard', metavar='I/N', callback=parse_shard, help='only examine/fix the I-th of N shards of the files, '
+                                                                   'files are assigned to shards by a stable hash')
+@click.option('--report-json', type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+              help='write the result to a json file, see zazu style-merge')
+def style(config, verbose, check, cached, no_cache, discover, since, jobs, profile, profile_json, watch_, fail_fast,
+          shard, report_json):
     """Style repo files or check that they are valid style."""
     config.check_repo()
+    if watch_ and cached:
+        raise click.UsageError('--watch can\'t be used with --cached')
+    if fail_fast and not check:
+        raise click.UsageError('--fail-fast can only be used with --check')
+    if jobs is None:
+        jobs = zazu.util.cpu_count()
     violation_count = 0
+    violations = []
     stylers = config.stylers()
+    for styler in stylers:
+        styler.refresh()
+    if any(s.in_process for s in stylers):
+        zazu.util.process_pool()  # Start the workers before styling is dispatched to threads.
     fixed_ok_tags = [click.style('FIXED', fg='red', bold=True), click.style(' OK  ', fg='green', bold=True)]
     tags = zazu.util.FAIL_OK if check else fixed_ok_tags
     with zazu.util.cd(config.repo_root):
         if stylers:
             if cached:
                 staged_files = zazu.git_helper.get_touched_files(config.repo)
-                read_fn = zazu.git_helper.read_staged
-                write_fn = stage_patch
+                entries = zazu.git_helper.staged_entries(config.repo_root)
+                read_fn = zazu.git_helper.StagedReader(config.repo_root, entries)
+                index_writer = zazu.git_helper.IndexWriter(config.repo_root, entries)
+                write_fn = functools.partial(stage_file, index_writer)
             else:
                 read_fn = read_file
                 write_fn = write_file
             if check:
                 write_fn = None
-            # Determine files for each styler.
-            file_sets = {}
-            styler_file_sets = {}
-            all_files = set()
-            for s in stylers:
-                includes = tuple(s.includes)
-                excludes = tuple(s.excludes)
-                if (includes, excludes) not in file_sets:
-                    files = set(zazu.util.scantree(config.repo_root,
-                                                   includes,
-                                                   excludes,
-                                                   exclude_hidden=True))
-                    if cached:
-                        files = files.intersection(staged_files)
-                    file_sets[(includes, excludes)] = files
+            known = {}
+            if watch_:
+                read_fn = recording_read_fn(read_fn, known)
+                if write_fn is not None:
+                    write_fn = recording_write_fn(write_fn, known)
+            cache = None if no_cache else config.style_cache()
+            # Determine the candidate files, None means that the working tree must be scanned.
+            candidates = None
+            if since:
+                if since == 'auto':
+                    since = zazu.git_helper.merge_base(config.repo, config.develop_branch_name())
+                candidates = zazu.git_helper.get_changed_files(config.repo, since)
+                if cached:
+                    candidates = list(set(candidates).intersection(staged_files))
+            elif cached:
+                candidates = staged_files
+            elif discover != 'walk':
+                candidates = zazu.git_helper.ls_files(config.repo_root, untracked=discover == 'git-all')
+            styler_sets = styler_file_sets(stylers, config.repo_root, candidates)
+            if shard is not None:
+                styler_sets = shard_file_sets(styler_sets, shard)
+            timing = zazu.style_profile.StyleProfile() if profile or profile_json else None
+            # Ranged stylers only style the lines that have changed when the run is limited to changed files.
+            line_ranges = None
+            if (cached or since) and any(s.ranged for s in stylers):
+                line_ranges = zazu.git_helper.get_changed_lines(config.repo, since, cached)
+            # Git already knows the blob id of staged files and of files that are unchanged since they were staged.
+            known_blobs = None
+            if cache is not None:
+                if cached:
+                    known_blobs = {path: blob for path, (_, blob) in entries.items()}
                 else:
-                    files = file_sets[(includes, excludes)]
-                styler_file_sets[s] = files
-                all_files |= files
-
-            work = [functools.partial(style_file, styler_list(f, styler_file_sets, stylers), f, read_fn, write_fn) for f in all_files]
-            checked_files = zazu.util.dispatch(work)
-            for f, stylers, violation in checked_files:
-                if verbose:
-                    click.echo(zazu.util.format_checklist_item(not violation,
-                                                               text='({}) {}'.format(', '.join([s.name() for s in stylers]), f),
-                                                               tag_formats=tags))
+                    known_blobs = zazu.git_helper.stat_clean_blobs(config.repo_root)
+            memo = zazu.style_cache.StyleMemo()
+            work, all_files = style_work(stylers, styler_sets, read_fn, write_fn, cache, timing, memo, line_ranges,
+                                         known_blobs, jobs)
+            results = zazu.util.dispatch(work, max_workers=jobs, on_abort=zazu.util.terminate_processes)
+            checked_count = 0
+            stopped_early = False
+            try:
+                for f, file_stylers, violation in (r for batch_results in results for r in batch_results):
+                    checked_count += 1
+                    if verbose:
+                        click.echo(zazu.util.format_checklist_item(not violation,
+                                                                   text='({}) {}'.format(', '.join([s.name() for s in file_stylers]), f),
+                                                                   tag_formats=tags))
                     violation_count += violation
+                    if violation:
+                        violations.append(f)
+                        if fail_fast:
+                            stopped_early = checked_count < len(all_files)
+                            break
+            finally:
+                results.close()
+                if cached:
+                    read_fn.close()
+                    index_writer.flush()
+            if cache is not None:
+                cache.prune()
+            file_count = checked_count if stopped_early else len(all_files)
+            if report_json:
+                write_report(report_json, shard, check, file_count, violations, stopped_early)
+            if timing is not None:
+                timing.stop()
+                if profile:
+                    click.echo(timing.format_report())
+                if profile_json:
+                    timing.write_json(profile_json)
             if verbose:
-                file_count = len(all_files)
-                if check:
+                if memo.hits:
+                    click.echo('{} of {} files reused the result of an identical file ({:.0%} hit rate)'.format(
+                        memo.hits, memo.lookups, memo.hit_rate()))
+                if stopped_early:
+                    click.echo('{} files with violations in {} of {} files, stopped at the first violation'.format(
+                        violation_count, file_count, len(all_files)))
+                elif check:
                     click.echo('{} files with violations in {} files'.format(violation_count, file_count))
                 else:
                     click.echo('{} files fixed in {} files'.format(violation_count, file_count))
+            if watch_:
+                watch(stylers, config.repo_root, write_fn, known, cache, jobs, tags)
+                sys.exit(0)
             sys.exit(-1 if check and violation_count else 0)
         else:
             click.echo('no style settings found')
+
+
+@click.command('style-merge')
+@click.option('-v', '--verbose', is_flag=True, help='print files with violations')
+@click.argument('reports', nargs=-1, required=True, type=click.File('r'))
+def style_merge(verbose, reports):
+    """Combine the --report-json results of zazu style runs on every shard of a tree."""
+    reports = [json.load(f) for f in reports]
+    check = all(r['check'] for r in reports)
+    file_count, violations = merge_reports(reports)
+    if verbose:
+        for f in violations:
+            click.echo(zazu.util.format_checklist_item(False, text=f, tag_formats=zazu.util.FAIL_OK))
+    if check:
+        click.echo('{} files with violations in {} files'.format(len(violations), file_count))
+    else:
+        click.echo('{} files fixed in {} files'.format(len(violations), file_count))
+    if any(r.get('stopped_early') for r in reports):
+        click.echo('some shards stopped at their first violation, so not every file was checked')
+    sys.exit(-1 if check and violations else 0)
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""Persistent style result cache for zazu."""
+import zazu.imports
+zazu.imports.lazy_import(locals(), [
+    'concurrent.futures',
+    'hashlib',
+    'click',
+    'os',
+    'subprocess',
+    'tempfile',
+    'threading',
+    'time',
+    'zazu.git_helper',
+    'zazu.util',
+])
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+DEFAULT_NOTES_REF = 'refs/notes/zazu-style'
+
+# Entry markers, the first byte of every cache entry file.
+_CLEAN = b'='
+_STYLED = b'+'
+
+
+def blob_id(string):
+    """Compute the git blob id of a string (utf-8 encoded).
+
+    Args:
+        string (str): the file contents.
+
+    Returns:
+        str: the hex sha1 that git would assign to a blob with this content.
+
+    """
+    data = string.encode('utf-8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def chain_fingerprint(stylers, filepath=None):
+    """Compute a fingerprint that uniquely identifies an ordered chain of stylers (applied to filepath, if given)."""
+    h = hashlib.sha1()
+    for s in stylers:
+        h.update(s.fingerprint(filepath).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def ranged_fingerprint(fingerprint, line_ranges):
+    """Compute a fingerprint for a styler chain that only styles some ranges of lines."""
+    return hashlib.sha1('{}:{}'.format(fingerprint, list(line_ranges)).encode('utf-8')).hexdigest()
+
+
+def default_path(repo):
+    """Get the default cache directory for a repo (inside its git directory)."""
+    return os.path.join(repo.git_dir, 'zazu', 'style_cache')
+
+
+class StyleCache(object):
+    """Content addressed store of style results that persists between runs.
+
+    Entries are keyed on the git blob id of the input and the fingerprint of the styler chain applied to it. Each entry
+    records either that the input was already clean or the styled output. The least recently used entries are evicted
+    once the cache grows beyond max_size bytes.
+
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        """Constructor.
+
+        Args:
+            path (str): directory to store cache entries in.
+            max_size (int): size in bytes that the cache is pruned to.
+
+        """
+        self._path = path
+        self._max_size = max_size
+        self._dirty = False
+
+    def _entry_path(self, blob, fingerprint):
+        key = hashlib.sha1('{}:{}'.format(fingerprint, blob).encode('utf-8')).hexdigest()
+        return os.path.join(self._path, key[:2], key[2:])
+
+    def _read(self, blob, fingerprint):
+        entry_path = self._entry_path(blob, fingerprint)
+        try:
+            with open(entry_path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        try:
+            os.utime(entry_path, None)  # Mark as recently used.
+        except OSError:
+            pass
+        return data
+
+    def is_clean(self, blob, fingerprint):
+        """Return True if the blob is known to already be styled by the styler chain."""
+        data = self._read(blob, fingerprint)
+        return data is not None and data[:1] == _CLEAN
+
+    def get(self, blob, fingerprint, input_string):
+        """Look up the styled version of input_string.
+
+        Args:
+            blob (str): the blob id of input_string.
+            fingerprint (str): the styler chain fingerprint.
+            input_string (str): the unstyled contents.
+
+        Returns:
+            str: the styled string or None if there is no cache entry.
+
+        """
+        data = self._read(blob, fingerprint)
+        if data is None:
+            return None
+        if data[:1] == _CLEAN:
+            return input_string
+        if data[:1] == _STYLED:
+            return data[1:].decode('utf-8')
+        return None
+
+    def put(self, blob, fingerprint, input_string, styled_string):
+        """Record the result of styling a blob."""
+        if styled_string == input_string:
+            data = _CLEAN
+        else:
+            data = _STYLED + styled_string.encode('utf-8')
+        entry_path = self._entry_path(blob, fingerprint)
+        entry_dir = os.path.dirname(entry_path)
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, entry_path)
+        except (IOError, OSError):
+            return  # The cache is best effort only.
+        self._dirty = True
+
+    def prune(self):
+        """Evict least recently used entries until the cache is no larger than max_size."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        entries = []
+        total_size = 0
+        for dir_path, _, file_names in os.walk(self._path):
+            for f in file_names:
+                entry_path = os.path.join(dir_path, f)
+                try:
+                    st = os.stat(entry_path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry_path))
+                total_size += st.st_size
+        if total_size <= self._max_size:
+            return
+        entries.sort()
+        for _, size, entry_path in entries:
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            total_size -= size
+            if total_size <= self._max_size:
+                break
+
+
+class NotesStyleCache(object):
+    """Style results shared through a git notes ref, so that they can be pushed and fetched along with the repo.
+
+    The note attached to an input blob id has a "<fingerprint> <styled blob id>" line for each styler chain that has
+    styled it, a clean input maps to its own blob id. Styled blobs are kept reachable from the notes ref under a
+    "blobs" directory, which git notes ignores. Lookups try the local cache first, results that aren't in the notes yet
+    are written to the notes ref in a single git fast-import commit when the run finishes.
+
+    """
+
+    def __init__(self, repo_root, ref=DEFAULT_NOTES_REF, local=None):
+        """Constructor.
+
+        Args:
+            repo_root (str): the root directory of the repo.
+            ref (str): the notes ref that stores the results.
+            local (StyleCache): the cache to consult before the notes, or None.
+
+        """
+        self._repo_root = repo_root
+        self._ref = ref
+        self._local = local
+        self._lock = threading.Lock()
+        self._notes = None
+        self._entries = {}
+        self._new = {}
+        self._reader = None
+
+    def _git(self, *args):
+        return zazu.util.check_popen(args=['git'] + list(args), cwd=self._repo_root)
+
+    def _read_blob(self, blob):
+        with self._lock:
+            if self._reader is None:
+                self._reader = zazu.git_helper.StagedReader(self._repo_root, entries={})
+            reader = self._reader
+        return reader.read_blob(blob)
+
+    def _note(self, blob):
+        """Get the fingerprint to styled blob id mapping recorded for an input blob."""
+        with self._lock:
+            if self._notes is None:
+                self._notes = {}
+                for line in self._git('notes', '--ref', self._ref, 'list').decode('ascii').splitlines():
+                    note, annotated = line.split()
+                    self._notes[annotated] = note
+            try:
+                return self._entries[blob]
+            except KeyError:
+                note = self._notes.get(blob)
+        entries = {}
+        if note is not None:
+            for line in self._read_blob(note).decode('ascii').splitlines():
+                fingerprint, styled = line.split()
+                entries[fingerprint] = styled
+        with self._lock:
+            self._entries[blob] = entries
+        return entries
+
+    def is_clean(self, blob, fingerprint):
+        """Return True if the blob is known to already be styled by the styler chain."""
+        if self._local is not None and self._local.is_clean(blob, fingerprint):
+            return True
+        return self._note(blob).get(fingerprint) == blob
+
+    def get(self, blob, fingerprint, input_string):
+        """Look up the styled version of input_string, see StyleCache.get()."""
+        if self._local is not None:
+            styled_string = self._local.get(blob, fingerprint, input_string)
+            if styled_string is not None:
+                return styled_string
+        styled = self._note(blob).get(fingerprint)
+        if styled is None:
+            return None
+        if styled == blob:
+            styled_string = input_string
+        else:
+            try:
+                styled_string = self._read_blob(styled).decode('utf-8')
+            except click.ClickException:
+                return None  # The styled blob hasn't been fetched.
+        if self._local is not None:
+            self._local.put(blob, fingerprint, input_string, styled_string)
+        return styled_string
+
+    def put(self, blob, fingerprint, input_string, styled_string):
+        """Record the result of styling a blob, it is written to the notes ref by prune()."""
+        if self._local is not None:
+            self._local.put(blob, fingerprint, input_string, styled_string)
+        if fingerprint in self._note(blob):
+            return
+        with self._lock:
+            self._new[(blob, fingerprint)] = None if styled_string == input_string else styled_string
+
+    def prune(self):
+        """Write new results to the notes ref and prune the local cache.
+
+        The notes are read again by the next lookup, so a long lived cache sees results that were fetched meanwhile.
+
+        """
+        if self._local is not None:
+            self._local.prune()
+        with self._lock:
+            new, self._new = self._new, {}
+            reader, self._reader = self._reader, None
+        try:
+            if new:
+                self._write(new)
+        finally:
+            if reader is not None:
+                reader.close()
+            with self._lock:
+                self._notes = None
+                self._entries = {}
+
+    def _write(self, new):
+        """Commit new results to the notes ref with git fast-import."""
+        notes = {}
+        for blob, _ in new:
+            notes.setdefault(blob, dict(self._note(blob)))
+        stream = []
+        commands = []
+
+        def add_blob(path, content):
+            mark = len(commands) + 1
+            stream.append(b'blob\nmark :%d\ndata %d\n' % (mark, len(content)) + content + b'\n')
+            commands.append('M 100644 :{} {}\n'.format(mark, path))
+
+        for (blob, fingerprint), styled_string in sorted(new.items()):
+            if styled_string is None:
+                notes[blob][fingerprint] = blob
+            else:
+                notes[blob][fingerprint] = blob_id(styled_string)
+                add_blob('blobs/' + notes[blob][fingerprint], styled_string.encode('utf-8'))
+        for blob, entries in sorted(notes.items()):
+            add_blob(blob, ''.join('{} {}\n'.format(f, s) for f, s in sorted(entries.items())).encode('ascii'))
+        message = b'zazu style results\n'
+        stream.append('commit {}\ncommitter zazu <zazu> {} +0000\n'.format(self._ref, int(time.time())).encode('utf-8'))
+        stream.append(b'data %d\n' % len(message) + message)
+        try:
+            parent = self._git('rev-parse', '--verify', '-q', self._ref).decode('ascii').strip()
+            stream.append('from {}\n'.format(parent).encode('ascii'))
+        except subprocess.CalledProcessError:
+            pass  # The first commit on the notes ref.
+        stream.append(''.join(commands).encode('ascii') + b'\n')
+        try:
+            zazu.util.check_popen(args=['git', 'fast-import', '--quiet'], stdin_str=b''.join(stream),
+                                  cwd=self._repo_root)
+        except subprocess.CalledProcessError:
+            pass  # The notes are best effort only, e.g. another process updated the ref meanwhile.
+
+
+class StyleMemo(object):
+    """In memory record of the style results of a single run, so that identical files are only styled once.
+
+    Results are keyed on (blob id, chain fingerprint). The first caller to claim a key owns it and must resolve its
+    future, later callers wait on the same future. A clean result is stored as None so that only styled output is held
+    in memory.
+
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.lookups = 0
+        self.hits = 0
+
+    def claim(self, blob, fingerprint):
+        """Claim the result for a blob styled by a styler chain.
+
+        Returns:
+            tuple of (concurrent.futures.Future, bool): the future holding the styled string (or None if the blob is
+                already clean) and True if the caller owns it and must set its result.
+
+        """
+        key = (blob, fingerprint)
+        with self._lock:
+            self.lookups += 1
+            try:
+                future = self._futures[key]
+            except KeyError:
+                future = concurrent.futures.Future()
+                self._futures[key] = future
+                return future, True
+            self.hits += 1
+            return future, False
+
+    def hit_rate(self):
+        """Get the fraction of lookups that reused the result of an identical file."""
+        return self.hits / self.lookups if self.lookups else 0
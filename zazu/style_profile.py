@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Timing report for zazu style runs."""
+import zazu.imports
+zazu.imports.lazy_import(locals(), [
+    'json',
+    'math',
+    'threading',
+    'time',
+])
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+
+def percentile(values, p):
+    """Get the p-th percentile (nearest rank) of a list of values, or 0 if the list is empty."""
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def _summarize(values):
+    return {'total': sum(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'max': max(values) if values else 0}
+
+
+class StyleProfile(object):
+    """Records the time spent by each styler invocation, on each file and waiting to start.
+
+    Time spent on a batched styler invocation is split evenly between the files in the batch.
+
+    """
+
+    def __init__(self):
+        """Start timing a style run."""
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._wall_time = None
+        self._stylers = {}
+        self._files = {}
+        self._queue_waits = []
+
+    def timed(self, fn):
+        """Wrap a work item so that the time between this call and it starting is recorded.
+
+        Work items are wrapped when the work list is built, before any of them are submitted, so the recorded wait
+        includes the time an item spends held back by dispatch's bound on pending work, not just time in the executor's
+        queue.
+
+        """
+        submitted = time.perf_counter()
+
+        def wrapper():
+            wait = time.perf_counter() - submitted
+            with self._lock:
+                self._queue_waits.append(wait)
+            return fn()
+        return wrapper
+
+    def record_invocation(self, styler, paths, seconds, strings_in, strings_out):
+        """Record a styler invocation.
+
+        Args:
+            styler (Styler): the styler that was run.
+            paths (list of str): the files that were styled.
+            seconds (float): the wall time taken.
+            strings_in (list of str): the input to the styler.
+            strings_out (list of str): the output of the styler.
+
+        """
+        bytes_in = sum(len(s.encode('utf-8')) for s in strings_in)
+        bytes_out = sum(len(s.encode('utf-8')) for s in strings_out)
+        per_file = seconds / len(paths) if paths else 0
+        with self._lock:
+            stats = self._stylers.setdefault(styler.name(), {'invocations': [], 'files': [],
+                                                             'bytes_in': 0, 'bytes_out': 0})
+            stats['invocations'].append(seconds)
+            stats['files'].extend([per_file] * len(paths))
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            for path in paths:
+                entry = self._files.setdefault(path, {'seconds': 0, 'stylers': []})
+                entry['seconds'] += per_file
+                entry['stylers'].append(styler.name())
+
+    def stop(self):
+        """Stop timing the run."""
+        self._wall_time = time.perf_counter() - self._start
+
+    def to_dict(self):
+        """Get the profile as a json serializable dictionary."""
+        with self._lock:
+            stylers = {}
+            for name, stats in self._stylers.items():
+                stylers[name] = {'invocations': len(stats['invocations']),
+                                 'files': len(stats['files']),
+                                 'bytes_in': stats['bytes_in'],
+                                 'bytes_out': stats['bytes_out'],
+                                 'invocation_seconds': _summarize(stats['invocations']),
+                                 'file_seconds': _summarize(stats['files'])}
+            files = [{'path': path, 'seconds': entry['seconds'], 'stylers': entry['stylers']}
+                     for path, entry in self._files.items()]
+            files.sort(key=lambda f: f['seconds'], reverse=True)
+            return {'wall_seconds': self._wall_time,
+                    'queue_wait_seconds': _summarize(self._queue_waits),
+                    'stylers': stylers,
+                    'files': files}
+
+    def write_json(self, path):
+        """Write the profile to a json file."""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    def format_report(self, top=10):
+        """Format the profile as a human readable report.
+
+        Args:
+            top (int): the number of slowest files to list.
+
+        Returns:
+            str: the report.
+
+        """
+        profile = self.to_dict()
+        lines = ['Slowest files:']
+        for f in profile['files'][:top]:
+            lines.append('  {:8.3f}s  {} ({})'.format(f['seconds'], f['path'], ', '.join(f['stylers'])))
+        lines.append('Stylers:')
+        lines.append('  {:20} {:>6} {:>6} {:>9} {:>8} {:>8} {:>8} {:>11} {:>11}'.format(
+            'name', 'calls', 'files', 'total', 'p50', 'p90', 'p99', 'bytes in', 'bytes out'))
+        for name, stats in sorted(profile['stylers'].items(), key=lambda s: -s[1]['invocation_seconds']['total']):
+            seconds = stats['invocation_seconds']
+            lines.append('  {:20} {:>6} {:>6} {:>8.3f}s {:>7.3f}s {:>7.3f}s {:>7.3f}s {:>11} {:>11}'.format(
+                name, stats['invocations'], stats['files'], seconds['total'], seconds['p50'], seconds['p90'],
+                seconds['p99'], stats['bytes_in'], stats['bytes_out']))
+        wait = profile['queue_wait_seconds']
+        lines.append('Queue wait: total {:.3f}s, p50 {:.3f}s, p90 {:.3f}s, max {:.3f}s'.format(
+            wait['total'], wait['p50'], wait['p90'], wait['max']))
+        if profile['wall_seconds'] is not None:
+            lines.append('Wall time: {:.3f}s'.format(profile['wall_seconds']))
+        return '\n'.join(lines)
@@ -2,8 +2,16 @@
 """Styler class for zazu."""
 import zazu.imports
 zazu.imports.lazy_import(locals(), [
+    'click',
+    'contextlib',
     'functools',
+    'hashlib',
+    'json',
     'os',
+    'shutil',
+    'subprocess',
+    'tempfile',
+    'threading',
     'zazu.util'
 ])
 
@@ -11,6 +19,52 @@ __author__ = 'Nicholas Wiles'
 __copyright__ = 'Copyright 2016'
 
 
+TEMP_PREFIX = '.zazu-'
+
+
+def _universal_newlines(string):
+    """Translate line endings the same way as reading the output of a subprocess with universal_newlines=True."""
+    return string.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _call_in_directory(directory, function, *args):
+    """Call a function from a directory, pool workers are shared by every repo so they move to the caller's first."""
+    os.chdir(directory)
+    return function(*args)
+
+
+def can_write_temp_copies(filepaths):
+    """Check that temporary copies of files can be written next to them, which they can't in a read only checkout."""
+    dir_names = set(os.path.dirname(filepath) or os.curdir for filepath in filepaths)
+    return all(os.access(d, os.W_OK) or not os.path.isdir(d) for d in dir_names)
+
+
+@contextlib.contextmanager
+def temp_copies(strings, filepaths):
+    """Context manager that writes strings to temporary files and yields their paths, removing them afterwards.
+
+    Each temporary file is hidden (prefixed with .zazu-) and put next to the file it is a copy of, so tools find the same
+    config files for it.
+
+    """
+    temp_paths = []
+    try:
+        for string, filepath in zip(strings, filepaths):
+            dir_name, base_name = os.path.split(filepath)
+            fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix='-' + base_name,
+                                             dir=dir_name if os.path.isdir(dir_name or '.') else None)
+            temp_paths.append(temp_path)
+            with os.fdopen(fd, 'w') as f:
+                f.write(string)
+        yield temp_paths
+    finally:
+        for temp_path in temp_paths:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
 class Styler(object):
     """Parent of all style plugins."""
 
@@ -29,6 +83,15 @@ class Styler(object):
         self.excludes = [] if excludes is None else excludes
         self.includes = [] if includes is None else includes
         self.options += self.required_options()
+        self.in_process = False
+        self.ranged = False
+        self.max_jobs = None
+        self._job_semaphore = None
+        self._version = None
+        self._version_lock = threading.Lock()
+        self._tool_signature = None
+        self._config_hashes = {}
+        self._fingerprints = {}
 
     def style_string(self, string, filepath):
         """Fix a string to be within style guidelines.
@@ -41,8 +104,203 @@ class Styler(object):
             Styled string (str).
 
         """
-        args = [self.command] + self.options
-        return zazu.util.check_popen(args=args, stdin_str=string, universal_newlines=True)
+        if self.in_process:
+            return _universal_newlines(self._submit_in_process(string, filepath).result())
+        return self._style_stdin(string, filepath)
+
+    def style_strings(self, strings, filepaths, line_ranges=None):
+        """Fix a list of strings to be within style guidelines.
+
+        Stylers that support batching style all of the strings in a directory with a single invocation of the tool,
+        otherwise each string is styled with style_string().
+
+        Args:
+            strings (list of str): the strings to style.
+            filepaths (list of str): the filepaths of the files being styled.
+            line_ranges (list): for ranged stylers, the (first, last) line ranges to style in each string (None styles
+                the whole string).
+
+        Returns:
+            list of str: the styled strings, in the same order as the input.
+
+        """
+        if self.ranged and line_ranges is not None:
+            return [self._style_ranges(s, f, r) for s, f, r in zip(strings, filepaths, line_ranges)]
+        if self.in_process:
+            futures = [self._submit_in_process(s, f) for s, f in zip(strings, filepaths)]
+            return [_universal_newlines(f.result()) for f in futures]
+        batch_options = self.batch_options()
+        if batch_options is None or len(strings) < 2 or not can_write_temp_copies(filepaths):
+            return [self.style_string(s, f) for s, f in zip(strings, filepaths)]
+        return self._style_batch(strings, filepaths, batch_options)
+
+    def _directory(self, filepath):
+        """Get the directory to run the tool from when styling a file, or None to run it from the current directory.
+
+        Stylers that can batch run from the directory of the file whether they style it in place or from stdin, and are
+        told the name of the file, so the result doesn't depend on how files are batched.
+
+        """
+        if filepath is None or self.batch_options() is None:
+            return None
+        dir_name = os.path.dirname(os.path.abspath(filepath))
+        return dir_name if os.path.isdir(dir_name) else None
+
+    def _check_popen(self, options, directory, **kwargs):
+        """Run the tool with options from a directory (None for the current directory), see zazu.util.check_popen."""
+        if directory is None:
+            return zazu.util.check_popen(args=[self.command] + options, universal_newlines=True, **kwargs)
+        # A relative path to the tool is relative to the current directory.
+        command = os.path.abspath(self.command) if os.path.dirname(self.command) else self.command
+        return zazu.util.check_popen(args=[command] + options, universal_newlines=True, cwd=directory, **kwargs)
+
+    def _style_stdin(self, string, filepath, extra_options=()):
+        """Style a string by piping it through the tool, see _directory()."""
+        directory = self._directory(filepath)
+        options = self.options + list(extra_options)
+        if filepath is not None:
+            options += self.filename_options(filepath if directory is None else os.path.basename(filepath))
+        return self._check_popen(options, directory, stdin_str=string)
+
+    def _submit_in_process(self, string, filepath):
+        """Style a string with in_process_function() in the process pool, from the same directory as the tool."""
+        directory = self._directory(filepath) or os.getcwd()
+        return zazu.util.process_pool().submit(_call_in_directory, directory, self.in_process_function(), string,
+                                               self.in_process_options(directory))
+
+    def _style_ranges(self, string, filepath, line_ranges):
+        """Style only the given ranges of lines of a string."""
+        if line_ranges is None:
+            return self.style_string(string, filepath)
+        if not line_ranges:
+            return string
+        return self._style_stdin(string, filepath, self.ranged_options(line_ranges, filepath))
+
+    def _style_batch(self, strings, filepaths, batch_options):
+        """Style strings by writing them to temporary files and styling the files in each directory in place."""
+        groups = {}
+        for i, filepath in enumerate(filepaths):
+            groups.setdefault(self._directory(filepath), []).append(i)
+        styled_strings = [None] * len(strings)
+        required_options = self.required_options()
+        options = [o for o in self.options if o not in required_options] + batch_options
+        for directory, indices in groups.items():
+            with temp_copies([strings[i] for i in indices], [filepaths[i] for i in indices]) as temp_paths:
+                if directory is not None:
+                    temp_paths = [os.path.basename(p) for p in temp_paths]
+                try:
+                    self._check_popen(options + temp_paths, directory)
+                except subprocess.CalledProcessError as e:
+                    if e.returncode not in self.batch_return_codes():
+                        raise
+                for i, temp_path in zip(indices, temp_paths):
+                    with open(temp_path if directory is None else os.path.join(directory, temp_path), 'r') as f:
+                        styled_strings[i] = f.read()
+        return styled_strings
+
+    @contextlib.contextmanager
+    def job_slot(self):
+        """Context manager that waits until fewer than max_jobs invocations of this styler are in progress."""
+        if self._job_semaphore is None:
+            yield
+        else:
+            with self._job_semaphore:
+                yield
+
+    def version(self):
+        """Get the version string reported by the styler's tool, or an empty string if it can't be determined."""
+        with self._version_lock:
+            if self._version is None:
+                try:
+                    self._version = zazu.util.check_popen(args=[self.command, '--version'], universal_newlines=True).strip()
+                except (click.ClickException, subprocess.CalledProcessError):
+                    self._version = ''
+        return self._version
+
+    def tool_id(self, filepath):
+        """Get a json serializable identifier of the tool that styles a file, in addition to its command and version.
+
+        The default is None, as the command and version identify a tool wherever it is installed, so machines that share
+        the style cache (e.g. through git notes) match. Tools found in the repo (e.g. eslint in node_modules) are
+        identified by their path relative to it.
+
+        """
+        return None
+
+    def _config_hash(self, dir_name):
+        """Hash the config files that the tool would discover for files in a directory (or any of its parents)."""
+        try:
+            return self._config_hashes[dir_name]
+        except KeyError:
+            pass
+        parent = os.path.dirname(dir_name)
+        if parent != dir_name:
+            config_hash = self._config_hash(parent)
+            paths = [os.path.join(dir_name, name) for name in self.config_file_names()]
+        else:
+            config_hash = ''
+            paths = ([os.path.join(dir_name, name) for name in self.config_file_names()] +
+                     [os.path.expanduser(path) for path in self.global_config_files()])
+        # Directories without config files share the hash of their parent, and only the names of config files are
+        # hashed, so identical configs in different clones of a repo match.
+        h = None
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except (IOError, OSError):
+                continue
+            if h is None:
+                h = hashlib.sha1(config_hash.encode('utf-8'))
+            h.update(os.path.basename(path).encode('utf-8') + b'\0' + data + b'\0')
+        if h is not None:
+            config_hash = h.hexdigest()
+        self._config_hashes[dir_name] = config_hash
+        return config_hash
+
+    def fingerprint(self, filepath=None):
+        """Get a string that changes whenever the output of this styler might change.
+
+        Args:
+            filepath (str): the file being styled, the tool that styles it and the config files that the tool would
+                discover for it are part of the fingerprint. If None, only the styler itself is.
+
+        """
+        if filepath is None:
+            return json.dumps([self.type(), self.command, self.options, self.version()])
+        dir_name = os.path.dirname(os.path.abspath(filepath))
+        key = (dir_name, self.language(filepath))
+        try:
+            return self._fingerprints[key]
+        except KeyError:
+            pass
+        fingerprint = json.dumps([self.type(), self.command, self.options, self.version(), self.tool_id(filepath),
+                                  self._config_hash(dir_name), key[1]])
+        self._fingerprints[key] = fingerprint
+        return fingerprint
+
+    def refresh(self):
+        """Forget what was found out about the tool and its config files, which may have changed since.
+
+        This is called at the start of each style run, as stylers can outlive a run (e.g. in the zazu daemon).
+
+        """
+        self._config_hashes = {}
+        self._fingerprints = {}
+        self._check_tool_signature()
+
+    def _check_tool_signature(self):
+        """Forget the version of the tool if its executable has changed (e.g. it was upgraded) since it was asked for."""
+        path = shutil.which(self.command)
+        try:
+            st = os.stat(path)
+            signature = (path, st.st_mtime_ns, st.st_size)
+        except (TypeError, OSError):
+            signature = path
+        with self._version_lock:
+            if signature != self._tool_signature:
+                self._tool_signature = signature
+                self._version = None
 
     @classmethod
     def from_config(cls, config, excludes, includes):
@@ -61,6 +319,18 @@ class Styler(object):
                   config.get('options', []),
                   excludes + config.get('excludes', []),
                   includes + config.get('includes', []))
+        if config.get('in_process', False):
+            if cls.in_process_function() is None:
+                raise click.ClickException('{} styler doesn\'t support in_process mode'.format(cls.type()))
+            obj.in_process = True
+        if config.get('ranged', False):
+            if cls.ranged_options([], '') is None:
+                raise click.ClickException('{} styler doesn\'t support ranged mode'.format(cls.type()))
+            obj.ranged = True
+        max_jobs = config.get('max_jobs', None)
+        if max_jobs:
+            obj.max_jobs = int(max_jobs)
+            obj._job_semaphore = threading.BoundedSemaphore(obj.max_jobs)
         return obj
 
     @staticmethod
@@ -68,6 +338,69 @@ class Styler(object):
         """Get options required to make the tool use stdin for input and output styled version to stdout."""
         return []
 
+    @staticmethod
+    def in_process_function():
+        """Get a function(string, options) that styles a string in a worker process rather than running the tool.
+
+        The function must be picklable (i.e. defined at module level) and produce exactly the same output as the tool.
+        Returns None if the styler has no in process mode.
+
+        """
+        return None
+
+    def in_process_options(self, directory):
+        """Get the options to pass to in_process_function(), which may parse them first (e.g. to read config files).
+
+        Args:
+            directory (str): the directory that the tool would be run from, where it would find its config files.
+
+        """
+        return self.options
+
+    @staticmethod
+    def config_file_names():
+        """Get the names of the config files that the tool looks for in the directory of a file and its parents."""
+        return []
+
+    @staticmethod
+    def global_config_files():
+        """Get the paths of user wide config files that the tool reads (~ is expanded)."""
+        return []
+
+    @staticmethod
+    def batch_options():
+        """Get options that make the tool style a list of files in place, or None if the tool can't do this."""
+        return None
+
+    @staticmethod
+    def filename_options(filename):
+        """Get options that tell the tool the name of the file that it is styling from stdin (e.g. to pick a language)."""
+        return []
+
+    @staticmethod
+    def language(filepath):
+        """Get the language that the tool styles a file as when it is told the file name, or None if it doesn't care."""
+        return None
+
+    @staticmethod
+    def ranged_options(line_ranges, filepath):
+        """Get options that make the tool style only some lines of a string read from stdin.
+
+        Args:
+            line_ranges (list of (int, int)): the (first, last) line numbers to style, 1 based and inclusive.
+            filepath (str): the filepath of the file being styled.
+
+        Returns:
+            list of str: the options, or None if the tool can't style ranges of lines.
+
+        """
+        return None
+
+    @staticmethod
+    def batch_return_codes():
+        """Get the return codes that indicate success when styling files in place."""
+        return [0]
+
     @staticmethod
     def default_extensions():
         """Get extensions that this styler can fix."""
@@ -9,17 +9,23 @@ except ImportError:
 
 import zazu.imports
 zazu.imports.lazy_import(locals(), [
+    'atexit',
     'builtins',
     'click',
     'concurrent.futures',
     'contextlib',
     'dict_recursive_update',
     'fnmatch',
+    'functools',
+    'itertools',
+    'math',
     'PyInquirer',
     'multiprocessing',
     'os',
+    're',
     'subprocess',
-    'sys'
+    'sys',
+    'threading'
 ])
 __author__ = 'Nicholas Wiles'
 __copyright__ = 'Copyright 2016'
@@ -41,16 +47,21 @@ def call(*args, **kwargs):
         raise_uninstalled(args[0])
 
 
-def check_popen(args, stdin_str=None, *other_args, **kwargs):
+_running_processes = set()
+_running_processes_lock = threading.Lock()
+
+
+def check_popen(args, stdin_str=None, *other_args, allowed_return_codes=(0,), **kwargs):
     """Like subprocess.Popen but raises an exception if the program cannot be found.
 
     Args:
         args: passed to Popen.
         stdin_str: a str/bytes that will be sent to std input via communicate().
         other_args: other arguments passed to Popen.
+        allowed_return_codes: return codes of the child process that don't raise CalledProcessError.
         kwargs: other kwargs passed to Popen.
     Raises:
-        CalledProcessError: on non zero return from the child process.
+        CalledProcessError: on a return code from the child process that isn't allowed.
         click.ClickException: if the program can't be found.
 
     """
@@ -58,14 +69,31 @@ def check_popen(args, stdin_str=None, *other_args, **kwargs):
         p = subprocess.Popen(args=args, stdin=subprocess.PIPE,
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                              *other_args, **kwargs)
-        stdout, stderr = p.communicate(stdin_str)
     except OSError:
         raise_uninstalled(args[0])
-    if p.returncode:
+    with _running_processes_lock:
+        _running_processes.add(p)
+    try:
+        stdout, stderr = p.communicate(stdin_str)
+    finally:
+        with _running_processes_lock:
+            _running_processes.discard(p)
+    if p.returncode not in allowed_return_codes:
         raise subprocess.CalledProcessError(p.returncode, args, stderr)
     return stdout
 
 
+def terminate_processes():
+    """Terminate all child processes that are currently running in check_popen()."""
+    with _running_processes_lock:
+        processes = list(_running_processes)
+    for p in processes:
+        try:
+            p.terminate()
+        except OSError:
+            pass  # The process has already exited.
+
+
 @contextlib.contextmanager
 def cd(path):
     """Change directory context manager.
@@ -82,20 +110,107 @@ def cd(path):
         os.chdir(prev_dir)
 
 
-def dispatch(work):
+def _cgroup_cpu_quota():
+    """Get the CPU quota imposed by the process's cgroup as a (fractional) number of CPUs, or None if there isn't one."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max', 'r') as f:  # cgroup v2.
+            quota, period = f.read().split()[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+    except (IOError, OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', 'r') as f:  # cgroup v1.
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us', 'r') as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def cpu_count():
+    """Get the number of CPUs that this process can use, respecting CPU affinity and container CPU quotas."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = multiprocessing.cpu_count()
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, max(1, int(math.ceil(quota))))
+    return count
+
+
+def dispatch(work, max_workers=None, max_pending=None, on_abort=None):
     """Dispatch a list of callables in multiple threads and yields their returns.
 
+    Callables are submitted as capacity frees up, so no more than max_pending of them are queued or running at once.
+    If a callable raises an exception (which is raised from the generator) or the caller closes the generator early,
+    no more work is submitted, queued callables are cancelled and on_abort is called before waiting for the callables
+    that are still running.
+
     Args:
-        work: the list of callables to execute.
+        work: the iterable of callables to execute.
+        max_workers (int): the number of threads to use, defaults to 5 per CPU.
+        max_pending (int): the maximum number of callables in flight, defaults to 2 per thread.
+        on_abort (callable): called when dispatch stops early, e.g. terminate_processes to stop running callables.
 
     Yields:
         the results of the callables as they are finished.
 
     """
-    with concurrent.futures.ThreadPoolExecutor(max_workers=multiprocessing.cpu_count()*5) as executor:
-        futures = {executor.submit(w): w for w in work}
-        for future in concurrent.futures.as_completed(futures):
-            yield future.result()
+    if max_workers is None:
+        max_workers = cpu_count() * 5
+    if max_pending is None:
+        max_pending = max_workers * 2
+    work = iter(work)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(w) for w in itertools.islice(work, max_pending)}
+        try:
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                pending.update(executor.submit(w) for w in itertools.islice(work, len(done)))
+                for future in done:
+                    yield future.result()
+        finally:
+            if pending:
+                for future in pending:
+                    future.cancel()
+                if on_abort is not None:
+                    on_abort()
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def process_pool():
+    """Get the process pool shared by all callers for CPU bound work, sized to the number of cores.
+
+    All of the workers are started by the first call, which should be made before any threads are dispatched, as
+    forking a process that is running other threads can deadlock the child. The pool is shut down at exit.
+
+    Returns:
+        concurrent.futures.ProcessPoolExecutor: the pool, created on the first call.
+
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            max_workers = cpu_count()
+            _process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+            for _ in range(max_workers):
+                _process_pool.submit(int)  # Workers are started on demand as work is submitted.
+            atexit.register(shutdown_process_pool)
+    return _process_pool
+
+
+def shutdown_process_pool():
+    """Stop the workers of the shared process pool, if it was created."""
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown()
 
 
 def async_do(call, *args, **kwargs):
@@ -178,6 +293,65 @@ def pick(choices, message):
     return choices[0]
 
 
+class PathMatcher(object):
+    """Matches relative file paths against include and exclude glob patterns.
+
+    The patterns are compiled into a single regular expression each, and directories can be checked to see whether any
+    file below them could possibly match so that scans can skip entire subtrees.
+
+    """
+
+    def __init__(self, include_patterns, exclude_patterns):
+        """Constructor.
+
+        Args:
+            include_patterns (list of str): glob patterns to include.
+            exclude_patterns (list of str): glob patterns to exclude. A pattern that is exactly the relative path of a
+                directory excludes that directory.
+
+        """
+        include_patterns = [os.path.normcase(p) for p in include_patterns]
+        exclude_patterns = [os.path.normcase(p) for p in exclude_patterns]
+        self._includes = self._compile(include_patterns)
+        self._excludes = self._compile(exclude_patterns)
+        # Excludes ending in * match everything below any directory whose path (with a trailing separator) they match.
+        self._subtree_excludes = self._compile([p for p in exclude_patterns if p.endswith('*')])
+        self._exclude_dirs = set([os.path.normpath(e) for e in exclude_patterns])
+        # The literal prefix of each include and whether anything can follow it.
+        self._include_prefixes = []
+        for p in include_patterns:
+            wildcard = next((i for i, c in enumerate(p) if c in '*?['), None)
+            self._include_prefixes.append((p, False) if wildcard is None else (p[:wildcard], True))
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None
+        return re.compile('|'.join('(?:{})'.format(fnmatch.translate(p)) for p in patterns))
+
+    def match(self, file):
+        """Return True if file matches any of the include patterns and none of the exclude patterns."""
+        file = os.path.normcase(file)
+        return (self._includes is not None and self._includes.match(file) is not None and
+                (self._excludes is None or self._excludes.match(file) is None))
+
+    def may_match_below(self, directory):
+        """Return False if no file below directory can match, in which case it can be skipped entirely."""
+        directory = os.path.normcase(directory)
+        if directory in self._exclude_dirs:
+            return False
+        prefix = directory + os.sep
+        if not any(p.startswith(prefix) or (wildcard and prefix.startswith(p)) for p, wildcard in self._include_prefixes):
+            return False
+        return self._subtree_excludes is None or self._subtree_excludes.match(prefix) is None
+
+
+@functools.lru_cache()
+def path_matcher(include_patterns, exclude_patterns):
+    """Get a (cached) PathMatcher for a tuple of include patterns and a tuple of exclude patterns."""
+    return PathMatcher(include_patterns, exclude_patterns)
+
+
 def scantree(base_path, include_patterns, exclude_patterns, exclude_hidden=False):
     """List files recursively that match any of the include glob patterns but are not in an excluded pattern.
 
@@ -192,18 +366,57 @@ def scantree(base_path, include_patterns, exclude_patterns, exclude_hidden=False
 
     """
     files = []
-    exclude_dirs = set([os.path.normpath(e) for e in exclude_patterns])
-    for dirName, subdirList, fileList in os.walk(base_path):
-        for i in builtins.range(len(subdirList) - 1, -1, -1):
-            sub = os.path.relpath(os.path.join(dirName, subdirList[i]), base_path)
-            if sub in exclude_dirs or (exclude_hidden and sub[0] == '.'):
-                del subdirList[i]
-        for f in fileList:
+    matcher = path_matcher(tuple(include_patterns), tuple(exclude_patterns))
+    for dir_name, subdir_list, file_list in os.walk(base_path):
+        rel_dir = os.path.relpath(dir_name, base_path)
+        prefix = '' if rel_dir == os.curdir else rel_dir + os.sep
+        subdir_list[:] = [d for d in subdir_list
+                          if not (exclude_hidden and not prefix and d[0] == '.') and matcher.may_match_below(prefix + d)]
+        for f in file_list:
             if (not exclude_hidden) or (f[0] != '.'):
-                file = os.path.relpath(os.path.join(dirName, f), base_path)
-                if any(fnmatch.fnmatch(file, i) for i in include_patterns):
-                    if all(not fnmatch.fnmatch(file, e) for e in exclude_patterns):
-                        files.append(file)
+                file = prefix + f
+                if matcher.match(file):
+                    files.append(file)
+    return files
+
+
+def filter_paths(paths, include_patterns, exclude_patterns, exclude_hidden=False):
+    """Filter a list of relative file paths the same way that scantree() filters the files it finds.
+
+    Args:
+        paths (list of str): '/' separated file paths relative to the repo root (e.g. from git ls-files).
+        include_patterns (str): list of glob patterns to include.
+        exclude_patterns (str): list of glob patterns to exclude.
+        exclude_hidden (bool): don't include hidden files if True.
+
+    Returns:
+        list of str: of file paths that match the input parameters.
+
+    """
+    files = []
+    matcher = path_matcher(tuple(include_patterns), tuple(exclude_patterns))
+    dir_allowed = {'': True}
+
+    def is_dir_allowed(directory):
+        try:
+            return dir_allowed[directory]
+        except KeyError:
+            parent, _, name = directory.rpartition(os.sep)
+            if parent:
+                allowed = is_dir_allowed(parent)
+            else:
+                allowed = not (exclude_hidden and name[0] == '.')
+            allowed = allowed and matcher.may_match_below(directory)
+            dir_allowed[directory] = allowed
+            return allowed
+
+    for path in paths:
+        file = path if os.sep == '/' else path.replace('/', os.sep)
+        directory, _, name = file.rpartition(os.sep)
+        if exclude_hidden and name[0] == '.':
+            continue
+        if is_dir_allowed(directory) and matcher.match(file):
+            files.append(file)
     return files
 
 
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""File change watchers for zazu style --watch."""
+import zazu.imports
+zazu.imports.lazy_import(locals(), [
+    'ctypes',
+    'ctypes.util',
+    'errno',
+    'os',
+    'select',
+    'struct',
+    'sys',
+    'time',
+])
+
+__author__ = 'Nicholas Wiles'
+__copyright__ = 'Copyright 2019'
+
+# inotify event masks, see inotify(7).
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT = struct.Struct('iIII')
+
+DEBOUNCE_SECONDS = 0.2
+MAX_DELAY_SECONDS = 2.0
+POLL_INTERVAL_SECONDS = 1.0
+
+
+def _is_hidden(rel_dir):
+    """Return True for the hidden directories at the top of the tree, which aren't styled (see zazu.util.scantree)."""
+    return os.sep not in rel_dir and rel_dir[0] == '.'
+
+
+def _walk_dirs(root, dir_filter, base=''):
+    """Yield the path relative to root of each directory below root (including '') that passes dir_filter.
+
+    Args:
+        root (str): the directory to walk.
+        dir_filter (callable): takes a directory path relative to the watched tree.
+        base (str): the path of root relative to the watched tree.
+
+    """
+    for dir_name, subdir_list, _ in os.walk(root):
+        rel_dir = os.path.relpath(dir_name, root)
+        prefix = '' if rel_dir == os.curdir else rel_dir + os.sep
+        subdir_list[:] = [d for d in subdir_list
+                          if not _is_hidden(os.path.join(base, prefix + d)) and dir_filter(os.path.join(base, prefix + d))]
+        yield prefix.rstrip(os.sep)
+
+
+class InotifyWatcher(object):
+    """Watches a tree for file changes using Linux inotify.
+
+    Only directories below root that pass dir_filter (and aren't hidden at the top of the tree) are watched, new
+    directories are watched as they are created.
+
+    """
+
+    def __init__(self, root, dir_filter):
+        """Start watching.
+
+        Args:
+            root (str): the directory to watch.
+            dir_filter (callable): takes a relative directory path and returns False if it shouldn't be watched.
+
+        Raises:
+            OSError: if inotify isn't available or the watch limit is reached.
+
+        """
+        self._root = root
+        self._dir_filter = dir_filter
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._dirs = {}
+        self._overflowed = False
+        try:
+            for d in _walk_dirs(root, dir_filter):
+                self._add_watch(d)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, rel_dir):
+        path = os.path.join(self._root, rel_dir).encode(sys.getfilesystemencoding())
+        wd = self._libc.inotify_add_watch(self._fd, path, _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return  # The directory was removed before it could be watched.
+            raise OSError(err, 'inotify_add_watch failed for {} ({})'.format(rel_dir, os.strerror(err)))
+        self._dirs[wd] = rel_dir
+
+    def _watch_new_dir(self, rel_dir, changed):
+        """Watch a new directory and everything below it, reporting files that were created before the watch began."""
+        for d in _walk_dirs(os.path.join(self._root, rel_dir), self._dir_filter, rel_dir):
+            d = os.path.join(rel_dir, d) if d else rel_dir
+            self._add_watch(d)
+            try:
+                entries = os.listdir(os.path.join(self._root, d))
+            except OSError:
+                continue
+            changed.update(os.path.join(d, e) for e in entries
+                           if os.path.isfile(os.path.join(self._root, d, e)))
+
+    def read(self, timeout):
+        """Wait for changes.
+
+        Args:
+            timeout (float): the maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            set of str: relative paths of files that were changed, created or removed, or None if events were lost and
+                the whole tree must be assumed to have changed.
+
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        changed = set()
+        if not ready:
+            return changed
+        data = os.read(self._fd, 1 << 16)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(sys.getfilesystemencoding())
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self._overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            try:
+                rel_dir = self._dirs[wd]
+            except KeyError:
+                continue
+            if not name:
+                continue
+            path = os.path.join(rel_dir, name) if rel_dir else name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not _is_hidden(path) and self._dir_filter(path):
+                    self._watch_new_dir(path, changed)
+            else:
+                changed.add(path)
+        if self._overflowed:
+            self._overflowed = False
+            return None
+        return changed
+
+    def close(self):
+        """Stop watching."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(object):
+    """Watches a tree for file changes by periodically comparing the size and modification time of every file."""
+
+    def __init__(self, root, dir_filter, interval=POLL_INTERVAL_SECONDS):
+        """Start watching.
+
+        Args:
+            root (str): the directory to watch.
+            dir_filter (callable): takes a relative directory path and returns False if it shouldn't be watched.
+            interval (float): seconds between scans of the tree.
+
+        """
+        self._root = root
+        self._dir_filter = dir_filter
+        self._interval = interval
+        self._stats = self._scan()
+
+    def _scan(self):
+        stats = {}
+        for d in _walk_dirs(self._root, self._dir_filter):
+            try:
+                entries = list(os.scandir(os.path.join(self._root, d)))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        st = entry.stat()
+                        stats[os.path.join(d, entry.name) if d else entry.name] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    pass
+        return stats
+
+    def read(self, timeout):
+        """Wait for changes, see InotifyWatcher.read()."""
+        time.sleep(self._interval if timeout is None else min(timeout, self._interval))
+        stats = self._scan()
+        changed = set(p for p, s in stats.items() if self._stats.get(p) != s)
+        changed.update(p for p in self._stats if p not in stats)
+        self._stats = stats
+        return changed
+
+    def close(self):
+        """Stop watching."""
+        pass
+
+
+def make_watcher(root, dir_filter):
+    """Make an InotifyWatcher, or a PollingWatcher if inotify can't be used."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root, dir_filter)
+        except OSError:
+            pass
+    return PollingWatcher(root, dir_filter)
+
+
+def debounced_changes(watcher, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+    """Yield sets of changed files, waiting for bursts of changes (e.g. an editor saving many files) to finish.
+
+    A set is yielded once no changes have been seen for debounce seconds, or max_delay seconds after its first change.
+    None is yielded if events were lost.
+
+    """
+    while True:
+        changed = watcher.read(None)
+        if changed is not None and not changed:
+            continue
+        deadline = time.time() + max_delay
+        while changed is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            more = watcher.read(min(debounce, remaining))
+            if more is None:
+                changed = None
+            elif not more:
+                break
+            else:
+                changed |= more
+        yield changed